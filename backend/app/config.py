@@ -1,6 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict
 
 
 class Settings(BaseSettings):
@@ -16,6 +17,48 @@ class Settings(BaseSettings):
     # OCR
     ocr_templates_path: str = "templates/icons"
     ocr_lite_mode: bool = True  # liteモード（parseq-tiny）で高速推論
+    ocr_inference_backend: str = "float"  # yomitokuの推論方式（float / int8: 動的量子化、精度ゲート合格済みの重みのみ使用）
+    ocr_quantized_weights: str = "models/yomitoku-int8.pt"  # int8: 量子化済みの重み（python -m app.ocr.quantization で作成）
+    ocr_model_artifact_dir: str = "models"  # シリアライズ済みのyomitoku（python -m app.ocr.model_artifact で作成、あれば起動時に使用）
+    ocr_preload: bool = True  # 起動時にyomitokuを読み込み、ウォームアップ推論を実行
+    ocr_workers: int = 1  # manual: OCRワーカースレッド数（それぞれがyomitokuを1つ保持）
+    ocr_pool_mode: str = "thread"  # OCRの実行方式（thread: スレッドプール / process: プロセスプール / fork: 専用のプロセスで読み込んでからforkしたプロセスプール）
+    ocr_process_workers: int = 2  # manual: process/forkモードのワーカープロセス数（それぞれがOCRProcessorを1つ保持）
+    ocr_concurrency: str = "manual"  # OCRワーカー数とtorchスレッド数の決め方（manual / latency / balanced / throughput、manual以外はワーカー数分のモデルを読み込む）
+    ocr_max_workers: int = 4  # latency/balanced/throughput: OCRワーカー数の上限（ワーカーごとにモデルを保持）
+    ocr_torch_threads: int = 0  # manual: 推論1件あたりのtorchスレッド数（0でコア数÷ワーカー数）
+    ocr_batch_concurrency: int = 4  # 一括解析で同時に解析する画像数（1リクエストあたり）
+    ocr_user_max_in_flight: int = 2  # ユーザーごとに同時に解析する画像数の上限
+    ocr_user_rate_per_minute: float = 30  # ユーザーごとの解析速度の上限（画像/分、トークンバケットの補充速度。0で無制限）
+    ocr_user_burst: int = 10  # ユーザーが待たずに解析できる画像数（トークンバケットの容量）
+    ocr_user_max_queued: int = 64  # ユーザーごとの解析の待ちの上限（超えると429）
+    ocr_user_weights: Dict[str, float] = {}  # ユーザーIDごとの重み（既定1、大きいほど多くの実行枠を割り当てる）
+    ocr_job_queue_size: int = 32  # 解析ジョブの待ちの上限（超えると429）
+    ocr_job_ttl_seconds: int = 600  # 解析ジョブの結果を保持する時間（秒）
+    ocr_job_db_path: str = "ocr_jobs.sqlite3"  # 解析ジョブの状態と結果の保存先（SQLite）
+    ocr_result_cache: bool = True  # 同じ画像の解析結果を再利用（画像の内容・レイアウト・処理のバージョンで引く）
+    ocr_result_cache_entries: int = 256  # 解析結果キャッシュのメモリ上の件数（0でメモリに持たない）
+    ocr_result_cache_dir: str = "cache/ocr_results"  # 解析結果キャッシュの保存先
+    ocr_result_cache_max_mb: int = 256  # 解析結果キャッシュのディスク使用量の上限（MB、0でディスクに保存しない）
+    ocr_raw_blocks: bool = False  # 解析ごとにOCR結果（画像内のテキスト）とアイコンの候補スコアを保存（抽出処理の再実行用、有効にした場合のみ）
+    ocr_raw_blocks_dir: str = "data/ocr_blocks"  # OCR結果の保存先（python -m app.ocr.raw_blocks reparse で再抽出）
+    ocr_raw_blocks_max_mb: int = 512  # OCR結果の保存先のディスク使用量の上限（MB、超えると古いものから削除、0で無制限）
+    ocr_raw_blocks_max_days: int = 30  # OCR結果を保存しておく日数（過ぎたものは削除、0で無制限）
+    ocr_icon_matcher: str = "exhaustive"  # アイコン認識方式（exhaustive / cascade / descriptor）
+    ocr_spectrum_cache_mb: int = 0  # exhaustive: テンプレートスペクトルのキャッシュ上限（MB、0で自動: threadは256、process / forkはワーカーごとに64）
+    ocr_cascade_top_k: int = 8  # cascade: 粗い段階で残す候補数
+    ocr_cascade_resolution: int = 16  # cascade: 粗い段階の縮小サイズ（ピクセル）
+    ocr_icon_localization: str = "layout"  # アイコン位置の決定方式（layout / strip）
+    ocr_scale_calibration: bool = True  # 端末ごとにテンプレートスケールを学習して探索範囲を絞る
+    ocr_icon_workers: int = 5  # アイコン認識の並列数（5位置を同時に照合、1で逐次処理）
+    ocr_icon_cache_size: int = 512  # 認識済みアイコンのハッシュキャッシュの件数（ヒットはそのキャラのテンプレートで確認、0で無効）
+    ocr_icon_cache_distance: int = 4  # 同じアイコンとみなすハッシュのハミング距離
+    ocr_roi_mode: bool = False  # 文字を読む領域（上部・戦績行）のみを切り出してOCR
+    ocr_roi_top_ratio: float = 0.4  # ROIモード: 上部の帯の高さ（画面比率）
+    ocr_cell_fast_path: bool = False  # 学習済みの端末はセル位置を直接読み、テキスト検出を省略
+    ocr_glyph_recognizer: bool = True  # 高速パス: 戦績の数値セルを軽量認識器（torch不要）で読む
+    ocr_glyph_font_path: str = ""  # 軽量認識器のテンプレートに使う日本語フォント（"分"を読む場合）
+    ocr_glyph_min_score: float = 0.6  # 軽量認識器の結果を採用する最低相関
 
     class Config:
         env_file = "../.env"
@@ -4,6 +4,7 @@ from ..database import get_supabase
 from ..auth.dependencies import get_current_user
 from .schemas import DeviceLayoutCreate, DeviceLayoutResponse, DeviceLayoutVoteRequest
 from .service import LayoutService
+from ..ocr.result_cache import invalidate_layout_version
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,6 +49,8 @@ async def save_layout(
     service = LayoutService(supabase)
     try:
         saved_layout = service.save_layout(layout)
+        # 同じ画像の再解析で修正したレイアウトを使うよう、OCR結果キャッシュのキーを更新する
+        invalidate_layout_version()
         return saved_layout
     except Exception as e:
         logger.error(f"Error saving layout: {e}")
@@ -70,6 +73,7 @@ async def vote_layout(
     service = LayoutService(supabase)
     try:
         updated_layout = service.vote_layout(vote_request.layout_id)
+        invalidate_layout_version()
         return updated_layout
     except Exception as e:
         logger.error(f"Error voting for layout: {e}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from decimal import Decimal
 
@@ -27,6 +27,7 @@ class DeviceLayoutResponse(BaseModel):
     screen_height: int
     icon_positions: List[IconPosition]
     vote_count: int
+    scale_factor: Optional[float] = Field(None, description="学習済みのテンプレートスケール補正係数（OCR用）")
     created_at: datetime
     updated_at: datetime
 
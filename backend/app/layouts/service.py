@@ -1,3 +1,5 @@
+import hashlib
+import json
 import logging
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
@@ -48,6 +50,7 @@ class LayoutService:
                 screen_height=layout_data['screen_height'],
                 icon_positions=icon_positions,
                 vote_count=layout_data['vote_count'],
+                scale_factor=layout_data.get('scale_factor'),
                 created_at=layout_data['created_at'],
                 updated_at=layout_data['updated_at']
             )
@@ -56,6 +59,17 @@ class LayoutService:
             logger.error(f"Error getting best layout: {e}")
             return None
 
+    def layouts_version(self) -> str:
+        """
+        全レイアウトの状態（ID・投票数・位置・更新日時）のハッシュ
+
+        レイアウトの作成・投票で変わる（OCR結果キャッシュのキーに含める）。
+        取得に失敗した場合は例外を送出する。
+        """
+        response = self.supabase.table('device_layouts').select('id,vote_count,icon_positions,updated_at').order('id').execute()
+        payload = json.dumps(response.data, sort_keys=True, default=str).encode()
+        return hashlib.sha256(payload).hexdigest()[:16]
+
     def find_similar_layout(self, layout_create: DeviceLayoutCreate, tolerance: float = 0.01) -> Optional[str]:
         """
         同じアスペクト比と位置の既存レイアウトを検索
@@ -147,6 +161,7 @@ class LayoutService:
                 screen_height=layout_data['screen_height'],
                 icon_positions=icon_positions,
                 vote_count=layout_data['vote_count'],
+                scale_factor=layout_data.get('scale_factor'),
                 created_at=layout_data['created_at'],
                 updated_at=layout_data['updated_at']
             )
@@ -196,6 +211,7 @@ class LayoutService:
                 screen_height=layout_data['screen_height'],
                 icon_positions=icon_positions,
                 vote_count=layout_data['vote_count'],
+                scale_factor=layout_data.get('scale_factor'),
                 created_at=layout_data['created_at'],
                 updated_at=layout_data['updated_at']
             )
@@ -204,6 +220,33 @@ class LayoutService:
             logger.error(f"Error voting for layout: {e}")
             raise
 
+    def update_scale_factor(self, layout_id: str, scale_factor: float) -> bool:
+        """
+        OCRで学習したテンプレートスケールの補正係数を保存
+
+        Args:
+            layout_id: レイアウトのID
+            scale_factor: アイコンサイズから求めたスケールに対する補正係数
+
+        Returns:
+            更新できた場合はTrue
+        """
+        try:
+            response = self.supabase.table('device_layouts').update({
+                'scale_factor': scale_factor
+            }).eq('id', layout_id).execute()
+
+            if not response.data:
+                logger.warning(f"Layout not found when saving scale factor: {layout_id}")
+                return False
+
+            logger.info(f"Saved scale factor for layout: ID={layout_id}, scale_factor={scale_factor:.3f}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error saving scale factor: {e}")
+            return False
+
     def save_layout(self, layout_create: DeviceLayoutCreate) -> DeviceLayoutResponse:
         """
         レイアウトを保存（既存の類似レイアウトがあれば投票、なければ新規作成）
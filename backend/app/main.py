@@ -1,14 +1,22 @@
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from concurrent.futures import ThreadPoolExecutor
 from .config import get_settings
 from .auth.router import router as auth_router
 from .matches.router import router as matches_router
 from .master_router import router as master_router
-from .ocr.router import router as ocr_router
+from .ocr.router import router as ocr_router, preload_ocr_processor, get_ocr_readiness, shutdown_ocr_processor, TEMPLATES_PATH
+from .ocr.router import start_job_queue, stop_job_queue, get_result_cache_stats, get_icon_cache_stats
+from .ocr.concurrency import get_concurrency_plan
+from .ocr.scheduler import get_scheduler
 from .stats.router import router as stats_router
 from .layouts.router import router as layouts_router
 
+logger = logging.getLogger(__name__)
+
 settings = get_settings()
 
 app = FastAPI(
@@ -17,15 +25,49 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# OCR用スレッドプール（4並列）
+# OCRワーカー数 × torchスレッド数（使えるコア数と ocr_concurrency から起動時に決める）
+ocr_concurrency = get_concurrency_plan()
+
+# OCR用スレッドプール（4並列、OCRワーカーがそれより多い場合はその数）
 # GILの制約はあるが、OCR処理はI/O待ちやネイティブライブラリ（C++）が多いため
 # スレッドプールでも並列化の恩恵がある
-ocr_process_pool = ThreadPoolExecutor(max_workers=4)
+ocr_process_pool = ThreadPoolExecutor(max_workers=max(4, ocr_concurrency.workers))
+
+# アイコン認識用スレッドプール（5位置の照合を並列実行）
+# cv2.matchTemplate / NumPyのFFTはGILを解放するため、OCR用とは別の上限で共有する
+icon_match_pool = ThreadPoolExecutor(max_workers=max(1, settings.ocr_icon_workers), thread_name_prefix="icon-match")
+
+# OCRワーカープロセス（ocr_pool_mode="process" / "fork" の場合のみ）
+# プロセスごとにOCRProcessorを持ち、GILを共有せずに解析する
+# fork: スレッドを持たない専用のプロセス（forkserver）でモデルを読み込んでからforkし、重みを書き込み時コピーで共有する
+#       （スレッドプールや起動処理のスレッドが動いているこのプロセスからはforkしない）
+ocr_worker_processes = None
+if settings.ocr_pool_mode in ("process", "fork"):
+    from .ocr.process_pool import OCRProcessPool
+    ocr_worker_processes = OCRProcessPool(str(TEMPLATES_PATH), ocr_concurrency.processes,
+                                          preload=settings.ocr_preload,
+                                          start_method="fork" if settings.ocr_pool_mode == "fork" else "spawn")
+
+@app.on_event("startup")
+async def startup_event():
+    """OCRモデルをバックグラウンドで読み込み、ウォームアップ推論を実行"""
+    start_job_queue()
+    if ocr_worker_processes is not None:
+        # ワーカープロセスを起動（読み込み・ウォームアップは各ワーカー、forkの場合は読み込みのみforkserver）
+        asyncio.get_running_loop().run_in_executor(ocr_process_pool, ocr_worker_processes.start)
+    elif settings.ocr_preload:
+        logger.info("[INFO] Preloading OCR models in background...")
+        asyncio.get_running_loop().run_in_executor(ocr_process_pool, preload_ocr_processor)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """アプリケーション終了時にスレッドプールをシャットダウン"""
+    await stop_job_queue()
     ocr_process_pool.shutdown(wait=True)
+    icon_match_pool.shutdown(wait=True)
+    shutdown_ocr_processor()
+    if ocr_worker_processes is not None:
+        ocr_worker_processes.stop()
 
 # CORS設定
 app.add_middleware(
@@ -66,3 +108,19 @@ async def root():
 async def health_check():
     """ヘルスチェックエンドポイント"""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """レディネスチェック（OCRモデルの読み込みとウォームアップが完了するまで503）
+
+    プリロードが無効な場合は遅延ロードのため200を返す（OCRワーカープロセスの再起動中を除く）。
+    """
+    # 解析結果キャッシュの初回の初期化（ディレクトリの走査）はイベントループ外で行う
+    result_cache = await asyncio.get_running_loop().run_in_executor(None, get_result_cache_stats)
+    status = {**get_ocr_readiness(), "concurrency": ocr_concurrency.to_dict(), "scheduler": get_scheduler().stats(),
+              "result_cache": result_cache, "icon_cache": get_icon_cache_stats()}
+    # ワーカープロセスの異常終了からの再起動中は、プリロードの設定に関わらず503
+    if (settings.ocr_preload or status.get("restarting")) and not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "failed" if status["error"] else "starting", **status})
+    return {"status": "ready", **status}
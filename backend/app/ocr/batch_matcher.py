@@ -0,0 +1,184 @@
+import cv2
+import numpy as np
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from .template_bank import TemplateBank
+
+# テンプレートスペクトルのキャッシュ上限（バイト）
+# FFTサイズはアイコン領域サイズ（≒端末の種類）で決まるため、数種類分を保持できれば十分
+SPECTRUM_CACHE_BYTES = 256 * 1024 * 1024
+# process / fork モードではワーカーごとにマッチャーを持つため、1プロセスあたりの上限を小さくする
+PROCESS_SPECTRUM_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def spectrum_cache_bytes() -> int:
+    """設定（ocr_spectrum_cache_mb、0で実行方式から自動）からキャッシュ上限を決める"""
+    from ..config import get_settings
+    settings = get_settings()
+    if settings.ocr_spectrum_cache_mb > 0:
+        return settings.ocr_spectrum_cache_mb * 1024 * 1024
+    if settings.ocr_pool_mode in ("process", "fork"):
+        return PROCESS_SPECTRUM_CACHE_BYTES
+    return SPECTRUM_CACHE_BYTES
+
+
+def _inverse_dft_matrices(fft_shape: Tuple[int, int], rows: int, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+    """有効範囲（先頭rows行×cols列）だけを求める逆実数DFTの行列
+
+    irfft2で全画素を逆変換してから切り出す代わりに、必要な位置だけを
+    行列積 Re(A @ X @ B) で求める。有効範囲が狭い大きめのスケールほど速い。
+    """
+    H, W = fft_shape
+    Wf = W // 2 + 1
+    A = np.exp(2j * np.pi * np.outer(np.arange(rows), np.arange(H)) / H) / H
+    # 実数FFTの片側スペクトルなので、直流成分とナイキスト成分以外は2倍
+    weights = np.full(Wf, 2.0)
+    weights[0] = 1.0
+    if W % 2 == 0:
+        weights[-1] = 1.0
+    B = weights[:, None] * np.exp(2j * np.pi * np.outer(np.arange(Wf), np.arange(cols)) / W) / W
+    return A.astype(np.complex64), B.astype(np.complex64)
+
+
+def _box_sum(integral: np.ndarray, h: int, w: int) -> np.ndarray:
+    """積分画像から h×w ウィンドウの総和を全有効位置について求める"""
+    return (integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w])
+
+
+class BatchedTemplateMatcher:
+    """同一サイズのテンプレートをまとめてFFTで正規化相互相関を計算するマッチャー
+
+    cv2.matchTemplate をテンプレート×スケールの数だけ呼ぶ代わりに、
+    アイコン領域のFFTを1回だけ計算し、テンプレート行列ごとに
+    まとめて相関を求める。スコアは TM_CCOEFF_NORMED と同じ定義。
+    """
+
+    def __init__(self, bank: TemplateBank, max_cache_bytes: int = SPECTRUM_CACHE_BYTES):
+        self.bank = bank
+        self.max_cache_bytes = max_cache_bytes
+        # テンプレートスペクトルと逆DFT行列を同じバイト上限のLRUで保持する
+        # ("spectra", FFTサイズ, スケール) -> スタックごとの共役スペクトル（complex64）
+        # ("idft", FFTサイズ, 有効行数, 有効列数) -> 逆DFT行列 (A, B)
+        self._cache: "OrderedDict[Tuple, Tuple[object, int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple, build):
+        """LRUキャッシュから取得し、なければ build() で作成して (値, バイト数) を保持する"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                return entry[0]
+
+        value, size = build()
+        if size > self.max_cache_bytes:
+            # 上限を超える場合はキャッシュせずにそのまま使う
+            return value
+
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key][0]
+            while self._cache and self._cache_bytes + size > self.max_cache_bytes:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted_size
+            self._cache[key] = (value, size)
+            self._cache_bytes += size
+        return value
+
+    def _template_spectra(self, fft_shape: Tuple[int, int], scales: Tuple[float, ...],
+                          stacks: List[Tuple[str, int, np.ndarray, np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """FFTサイズ・スケールごとのテンプレート共役スペクトルを取得（LRUキャッシュ）"""
+        def build():
+            spectra = []
+            for _, _, _, stack in stacks:
+                if stack.shape[1] > fft_shape[0] or stack.shape[2] > fft_shape[1]:
+                    spectra.append(None)
+                    continue
+                spec = np.fft.rfft2(stack.transpose(0, 3, 1, 2), s=fft_shape)
+                spectra.append(np.conj(spec).astype(np.complex64))
+            return spectra, sum(spec.nbytes for spec in spectra if spec is not None)
+
+        return self._cached(("spectra", fft_shape, scales), build)
+
+    def _inverse_dft(self, fft_shape: Tuple[int, int], rows: int, cols: int) -> Tuple[np.ndarray, np.ndarray]:
+        """有効範囲ごとの逆DFT行列を取得（LRUキャッシュ）"""
+        def build():
+            A, B = _inverse_dft_matrices(fft_shape, rows, cols)
+            return (A, B), A.nbytes + B.nbytes
+
+        return self._cached(("idft", fft_shape, rows, cols), build)
+
+    def score(self, icon_region: np.ndarray, char_type: Optional[str] = None,
+              scales: Optional[Tuple[float, ...]] = None) -> np.ndarray:
+        """全テンプレート×全スケールのスコアテンソルを返す
+
+        Args:
+            icon_region: アイコン領域（BGR）
+            char_type: "survivor" / "hunter" を指定するとそのタイプのみ計算
+            scales: 探索するスケール（省略時はバンクの既定スケール）
+
+        Returns:
+            (テンプレート数, スケール数) の配列。計算していない要素は0.0
+        """
+        scales = tuple(scales) if scales else self.bank.scales
+        scores = np.zeros((len(self.bank), len(scales)), dtype=np.float32)
+        if icon_region.size == 0:
+            return scores
+
+        region = icon_region.astype(np.float32)
+        if region.ndim == 2:
+            region = region[:, :, None]
+        H, W = region.shape[:2]
+        # FFTが高速なサイズに拡張（ゼロ埋め部分は有効範囲の相関に影響しない）
+        fft_shape = (cv2.getOptimalDFTSize(H), cv2.getOptimalDFTSize(W))
+
+        # 領域のスペクトルと積分画像は全テンプレートで共有
+        region_spec = np.fft.rfft2(region.transpose(2, 0, 1), s=fft_shape).astype(np.complex64)
+        integral = cv2.integral(region, sdepth=cv2.CV_64F).reshape(H + 1, W + 1, -1)
+        integral_sq = cv2.integral(region * region, sdepth=cv2.CV_64F).reshape(H + 1, W + 1, -1)
+        denominators = {}
+        stacks = self.bank.stacks_for(scales)
+        spectra = self._template_spectra(fft_shape, scales, stacks)
+
+        for (stack_type, scale_idx, indices, stack), stack_spec in zip(stacks, spectra):
+            if char_type is not None and stack_type != char_type:
+                continue
+            h, w = stack.shape[1:3]
+            # テンプレートがアイコン領域より大きい場合はスキップ
+            if h > H or w > W:
+                continue
+
+            # テンプレートはゼロ平均・単位ノルムなので、分母は領域側の局所分散のみ
+            if (h, w) not in denominators:
+                window_sum = _box_sum(integral, h, w)
+                window_sq = _box_sum(integral_sq, h, w)
+                variance = (window_sq - window_sum * window_sum / (h * w)).sum(axis=2)
+                std = np.sqrt(np.maximum(variance, 0.0))
+                # 分散がほぼ0の位置（単色領域）はスコア0とする
+                denominators[(h, w)] = np.where(std > 1e-3, 1.0 / np.maximum(std, 1e-3), 0.0).astype(np.float32)
+            inv_std = denominators[(h, w)]
+
+            # 巡回相関の有効範囲は折り返しの影響を受けない（テンプレート側は事前計算済み）
+            cross = np.einsum("nchw,chw->nhw", stack_spec, region_spec)
+            inv_rows, inv_cols = self._inverse_dft(fft_shape, H - h + 1, W - w + 1)
+            corr = np.matmul(inv_rows, np.matmul(cross, inv_cols)).real
+
+            ncc = corr * inv_std[None]
+            scores[indices, scale_idx] = ncc.reshape(len(indices), -1).max(axis=1)
+
+        return scores
+
+    def rank(self, scores: np.ndarray, char_type: Optional[str] = None) -> List[Tuple[str, Tuple[float, str]]]:
+        """スコアテンソルからキャラクターごとのベストスコアを降順に並べる
+
+        Returns:
+            [(キャラ名, (スコア, タイプ)), ...]（従来のsorted_scoresと同じ形式）
+        """
+        best = scores.max(axis=1) if scores.size else np.zeros(len(self.bank))
+        char_scores = {}
+        for idx in np.argsort(-best, kind="stable"):
+            if char_type is None or self.bank.types[idx] == char_type:
+                char_scores[self.bank.names[idx]] = (float(best[idx]), self.bank.types[idx])
+        return sorted(char_scores.items(), key=lambda x: x[1][0], reverse=True)
@@ -0,0 +1,157 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 行に属するテキストとみなす範囲（_get_row_text_data と同じ画面高さの±8%）
+ROW_TOLERANCE_RATIO = 0.08
+# 学習したセルの余白（テキストの高さに対する割合）。値の桁数が変わってもはみ出さないようにする
+CELL_PAD_X = 0.8
+CELL_PAD_Y = 0.15
+
+# 戦績の5項目
+ROW_FIELDS = ("kite_time", "decode_progress", "board_hits", "rescues", "heals")
+
+# 戦績行のラベル（位置が固定なので、学習時に読んだ文字列をそのまま使う）
+ROW_LABEL_KEYWORDS = ("解読", "進捗", "牽制", "への", "板", "命中", "援助", "救助", "治療")
+# 戦績の値（数字・%・秒）のみのセル。ニューラルOCRの誤認識（o→0、g→%など）も含める
+VALUE_PATTERN = re.compile(r"[\dOoGg%％sS秒分]+")
+
+# セルの種類
+CELL_TEXT = "text"    # 認識器で読む
+CELL_LABEL = "label"  # 学習時の文字列を使う
+CELL_VALUE = "value"  # 数値用の軽量認識器で読む（読めなければ認識器）
+
+# 画面比率の矩形 (x1, y1, x2, y2)
+RatioRect = Tuple[float, float, float, float]
+
+
+def _row_cell_kind(text: str) -> str:
+    clean = text.replace(" ", "").replace(",", "").replace(".", "")
+    if VALUE_PATTERN.fullmatch(clean):
+        return CELL_VALUE
+    if any(keyword in text for keyword in ROW_LABEL_KEYWORDS):
+        return CELL_LABEL
+    return CELL_TEXT
+
+
+def _bbox_rect(bbox) -> Tuple[float, float, float, float]:
+    xs = [point[0] for point in bbox]
+    ys = [point[1] for point in bbox]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _overlaps(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> bool:
+    """2つの矩形の重なりが小さい方の面積の半分以上か"""
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return False
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return inter_w * inter_h >= 0.5 * smaller
+
+
+class CellLayout:
+    """1種類の端末で文字が表示されるセルの位置
+
+    header: 画面に対する位置（勝敗・マップ名・日時・使用時間など）
+    row: アイコン行の中心からの相対位置と種類・ラベル文字列（どの行も同じ並び）
+    """
+
+    def __init__(self, header: List[RatioRect], row: List[Tuple[RatioRect, str, str]]):
+        self.header = header
+        self.row = row
+
+
+class CellLayoutRegistry:
+    """端末ごとのセル位置を、検出器付きの通常OCRの結果から学習して保持する
+
+    全項目を読み取れた結果からテキストの位置を記録し、以降の同じ端末の画像では
+    その位置を直接切り出して認識器のみで読む（検出器を使わない）。
+    """
+
+    def __init__(self):
+        self._layouts: Dict[str, CellLayout] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, device_key: str) -> bool:
+        return device_key in self._layouts
+
+    def learn(self, device_key: str, results: List, icon_boxes: List[Tuple[int, int, int, int]],
+              survivors: List[Dict], width: int, height: int) -> bool:
+        """通常OCRの結果からセル位置を学習
+
+        Args:
+            results: OCR結果 [(bbox, text, conf), ...]
+            icon_boxes: アイコン位置 [(x, y, w, h), ...]
+            survivors: 解析済みのサバイバー（"position" はicon_boxesの1始まりの番号）
+
+        Returns:
+            学習できた場合True（全項目を読み取れたサバイバー行が無い場合はFalse）
+        """
+        reference = next((s for s in survivors if all(s.get(f) is not None for f in ROW_FIELDS)), None)
+        if reference is None or not icon_boxes:
+            return False
+
+        tolerance = height * ROW_TOLERANCE_RATIO
+        survivor_centers = [icon_boxes[s["position"] - 1][1] + icon_boxes[s["position"] - 1][3] / 2
+                            for s in survivors]
+        _, ref_y, _, ref_h = icon_boxes[reference["position"] - 1]
+        ref_center = ref_y + ref_h / 2
+
+        header: List[RatioRect] = []
+        row: List[Tuple[RatioRect, str, str]] = []
+        for bbox, text, _ in results:
+            x1, y1, x2, y2 = _bbox_rect(bbox)
+            center_y = (y1 + y2) / 2
+            if abs(center_y - ref_center) < tolerance:
+                rect = (x1 / width, (y1 - ref_center) / height, x2 / width, (y2 - ref_center) / height)
+                row.append((rect, _row_cell_kind(text), text))
+            elif all(abs(center_y - c) >= tolerance for c in survivor_centers):
+                # サバイバー行以外（勝敗・マップ名・日時・使用時間、ハンター行など）は画面に対する位置
+                header.append((x1 / width, y1 / height, x2 / width, y2 / height))
+
+        with self._lock:
+            self._layouts[device_key] = CellLayout(header, row)
+        logger.info(f"[CELLS] Learned cell layout for {device_key}: {len(header)} header cells, {len(row)} cells per row")
+        return True
+
+    def forget(self, device_key: str):
+        with self._lock:
+            self._layouts.pop(device_key, None)
+
+    def cells(self, device_key: str, icon_boxes: List[Tuple[int, int, int, int]],
+              width: int, height: int) -> Optional[List[Tuple[List[List[int]], str, str]]]:
+        """セルの四角形（時計回りの4頂点）・種類・学習時の文字列を返す（未学習ならNone）"""
+        layout = self._layouts.get(device_key)
+        if layout is None:
+            return None
+
+        rects = [((x1 * width, y1 * height, x2 * width, y2 * height), CELL_TEXT, "")
+                 for x1, y1, x2, y2 in layout.header]
+        header_count = len(rects)
+        # 行のセルは全アイコン行に展開する（勝敗でハンター行の位置が変わるため）。
+        # 学習時のハンター行のように画面に対する位置として記録済みのセルと重なるものは除く
+        for _, icon_y, _, icon_h in icon_boxes:
+            center = icon_y + icon_h / 2
+            for (x1, y1, x2, y2), kind, text in layout.row:
+                rect = (x1 * width, center + y1 * height, x2 * width, center + y2 * height)
+                if not any(_overlaps(rect, header_rect) for header_rect, _, _ in rects[:header_count]):
+                    rects.append((rect, kind, text))
+
+        cells = []
+        for (x1, y1, x2, y2), kind, text in rects:
+            text_h = y2 - y1
+            pad_x = text_h * CELL_PAD_X
+            pad_y = text_h * CELL_PAD_Y
+            # 左右の余白で幅が高さより大きくなるため、認識器が縦書きとして回転させることもない
+            x1, x2 = x1 - pad_x, x2 + pad_x
+            # 画像外の頂点を含むと認識器が黙って除外するため、画像内に収める
+            x1, x2 = int(max(0, x1)), int(min(width, x2))
+            y1, y2 = int(max(0, y1 - pad_y)), int(min(height, y2 + pad_y))
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            cells.append(([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], kind, text))
+        return cells
@@ -0,0 +1,246 @@
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 推論方針
+PREFERENCE_LATENCY = "latency"        # 1件あたりの時間を優先（少ないワーカー × 多いtorchスレッド）
+PREFERENCE_BALANCED = "balanced"      # 中間（ワーカーあたり2スレッド）
+PREFERENCE_THROUGHPUT = "throughput"  # 処理件数を優先（コア数のワーカー × 1スレッド）
+PREFERENCE_MANUAL = "manual"          # ocr_workers / ocr_process_workers / ocr_torch_threads をそのまま使う
+PREFERENCES = (PREFERENCE_LATENCY, PREFERENCE_BALANCED, PREFERENCE_THROUGHPUT, PREFERENCE_MANUAL)
+
+# ベンチマークで1構成あたりに処理する画像数
+BENCHMARK_REQUESTS = 8
+
+
+class ConcurrencyPlan:
+    """OCRの並列数の割り当て
+
+    processes: OCRワーカープロセス数（threadモードでは1 = APIプロセス）
+    threads: プロセスあたりのOCRワーカースレッド数（それぞれがyomitokuを1つ保持）
+    torch_threads: 推論1件あたりのtorchスレッド数
+    """
+
+    def __init__(self, processes: int, threads: int, torch_threads: int, cores: int, preference: str):
+        self.processes = processes
+        self.threads = threads
+        self.torch_threads = torch_threads
+        self.cores = cores
+        self.preference = preference
+
+    @property
+    def workers(self) -> int:
+        """同時に推論するOCRワーカーの総数"""
+        return self.processes * self.threads
+
+    def to_dict(self) -> dict:
+        return {
+            "processes": self.processes,
+            "threads": self.threads,
+            "workers": self.workers,
+            "torch_threads": self.torch_threads,
+            "cores": self.cores,
+            "preference": self.preference,
+        }
+
+    def __repr__(self) -> str:
+        return (f"ConcurrencyPlan({self.workers} workers ({self.processes} process x {self.threads} thread) "
+                f"x {self.torch_threads} torch threads on {self.cores} cores, {self.preference})")
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """cgroupのCPU上限（コア数換算）。制限が無い・読めない場合はNone"""
+    try:
+        # cgroup v2: "<quota> <period>" または "max <period>"
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cores() -> int:
+    """このプロセスが使えるコア数（CPUアフィニティとcgroupのCPU上限の小さい方）"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        # 1.5コアの上限なら1ワーカー分しか使えないため切り捨てる
+        cores = min(cores, max(1, int(limit)))
+    return max(1, cores)
+
+
+def plan_concurrency(cores: int, preference: str, pool_mode: str = "thread", max_workers: int = 4,
+                     manual_workers: int = 1, manual_torch_threads: int = 0) -> ConcurrencyPlan:
+    """コア数と方針からOCRワーカー数とtorchスレッド数を決める
+
+    ワーカー数 × torchスレッド数がコア数を超えないようにする（超えると推論同士がコアを奪い合う）。
+    ワーカーはそれぞれモデルを保持するため、数は max_workers で制限する。
+    """
+    if preference not in PREFERENCES:
+        logger.warning(f"[WARNING] Unknown OCR concurrency preference '{preference}', using {PREFERENCE_MANUAL}")
+        preference = PREFERENCE_MANUAL
+
+    max_workers = max(1, max_workers)
+    if preference == PREFERENCE_MANUAL:
+        workers = max(1, manual_workers)
+        torch_threads = manual_torch_threads if manual_torch_threads > 0 else max(1, cores // workers)
+    elif preference == PREFERENCE_LATENCY:
+        workers = 1
+        torch_threads = cores
+    elif preference == PREFERENCE_THROUGHPUT:
+        workers = min(cores, max_workers)
+        torch_threads = max(1, cores // workers)
+    else:
+        workers = min(max(1, cores // 2), max_workers)
+        torch_threads = max(1, cores // workers)
+
+    if pool_mode in ("process", "fork"):
+        return ConcurrencyPlan(workers, 1, torch_threads, cores, preference)
+    return ConcurrencyPlan(1, workers, torch_threads, cores, preference)
+
+
+@lru_cache()
+def get_concurrency_plan() -> ConcurrencyPlan:
+    """設定から求めたOCRの並列数（起動時に1回だけ決める）"""
+    from ..config import get_settings
+
+    settings = get_settings()
+    manual_workers = settings.ocr_workers if settings.ocr_pool_mode == "thread" else settings.ocr_process_workers
+    plan = plan_concurrency(
+        available_cores(),
+        settings.ocr_concurrency,
+        pool_mode=settings.ocr_pool_mode,
+        max_workers=settings.ocr_max_workers,
+        manual_workers=manual_workers,
+        manual_torch_threads=settings.ocr_torch_threads,
+    )
+    logger.info(f"[INFO] OCR concurrency: {plan}")
+    if plan.workers > 1:
+        # ワーカーごとにyomitokuのモデルを読み込むため、モデルのメモリはワーカー数倍になる
+        shared = " (fork: weights shared copy-on-write)" if settings.ocr_pool_mode == "fork" else ""
+        logger.warning(f"[WARNING] OCR concurrency: {plan.workers} yomitoku analyzers will be loaded, "
+                       f"about {plan.workers}x the model memory of a single worker{shared}. "
+                       f"Set OCR_CONCURRENCY=manual with OCR_WORKERS=1 to keep one")
+    return plan
+
+
+def apply_torch_threads(torch_threads: int):
+    """このプロセスのtorchの演算スレッド数を設定（torchが無い場合は何もしない）"""
+    try:
+        import torch  # type: ignore
+    except ImportError:
+        return
+    if torch.get_num_threads() != torch_threads:
+        torch.set_num_threads(torch_threads)
+    try:
+        # 演算子間の並列はワーカーで行うため1にする（最初の並列処理の前にしか設定できない）
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def candidate_plans(cores: int, max_workers: int) -> List[Tuple[int, int]]:
+    """ベンチマークする (ワーカー数, torchスレッド数) の組み合わせ（積がコア数以下）"""
+    candidates = []
+    for workers in range(1, min(cores, max_workers) + 1):
+        torch_threads = max(1, cores // workers)
+        candidates.append((workers, torch_threads))
+        if torch_threads > 1:
+            # コアを余らせた構成（前後処理のPythonコードに1コア残す）も比べる
+            candidates.append((workers, torch_threads - 1))
+    return sorted(set(candidates))
+
+
+def benchmark(image: np.ndarray, requests: int = BENCHMARK_REQUESTS,
+              max_workers: Optional[int] = None) -> List[dict]:
+    """この環境で各構成のyomitokuの処理件数と1件あたりの時間を計測
+
+    アナライザーは最大ワーカー数分だけ作り、構成をまたいで使い回す。
+    """
+    from .processor import create_yomitoku_analyzer
+    from .worker import OCRWorkerPool
+
+    cores = available_cores()
+    candidates = candidate_plans(cores, max_workers or cores)
+    analyzers = [create_yomitoku_analyzer() for _ in range(max(w for w, _ in candidates))]
+
+    results = []
+    for workers, torch_threads in candidates:
+        apply_torch_threads(torch_threads)
+        available = iter(analyzers)
+        pool = OCRWorkerPool(lambda: next(available), size=workers)
+        # 各ワーカーで1回推論し、スレッドごとの初期化を計測から除く
+        pool.start(warmup_image=image)
+        pool.wait_started()
+
+        latencies = []
+
+        def timed(_):
+            start = time.perf_counter()
+            pool.analyze(image)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as clients:
+            list(clients.map(timed, range(requests)))
+        elapsed = time.perf_counter() - start
+        pool.stop()
+
+        result = {
+            "workers": workers,
+            "torch_threads": torch_threads,
+            "images_per_second": requests / elapsed,
+            "mean_latency": float(np.mean(latencies)),
+        }
+        results.append(result)
+        logger.info(f"[BENCH] {workers} workers x {torch_threads} torch threads: "
+                    f"{result['images_per_second']:.2f} img/s, {result['mean_latency']:.2f}s/img")
+    return results
+
+
+if __name__ == "__main__":
+    # python -m app.ocr.concurrency [画像] [構成あたりの画像数]
+    import cv2
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 1:
+        image = cv2.imread(sys.argv[1])
+        if image is None:
+            sys.exit(f"Failed to read image: {sys.argv[1]}")
+    else:
+        from .processor import OCRProcessor
+        image = OCRProcessor._warmup_image()
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else BENCHMARK_REQUESTS
+
+    results = benchmark(image, requests)
+    print(f"{'workers':>8} {'torch':>6} {'img/s':>8} {'s/img':>8}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['torch_threads']:>6} {r['images_per_second']:>8.2f} {r['mean_latency']:>8.2f}")
+    best_throughput = max(results, key=lambda r: r["images_per_second"])
+    best_latency = min(results, key=lambda r: r["mean_latency"])
+    for label, best in (("throughput", best_throughput), ("latency", best_latency)):
+        print(f"best {label}: OCR_CONCURRENCY=manual OCR_WORKERS={best['workers']} "
+              f"OCR_TORCH_THREADS={best['torch_threads']} "
+              f"({best['images_per_second']:.2f} img/s, {best['mean_latency']:.2f} s/img)")
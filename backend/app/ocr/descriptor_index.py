@@ -0,0 +1,120 @@
+import logging
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .template_bank import TemplateBank
+
+logger = logging.getLogger(__name__)
+
+# 記述子を計算する正規化サイズ（スケール差はここで吸収する）
+DESCRIPTOR_SIZE = 32
+# 色ヒストグラムのビン数（色相 × 彩度）
+HUE_BINS = 8
+SAT_BINS = 4
+# 勾配方向ヒストグラムのセル分割数とビン数
+GRID_CELLS = 4
+ORIENTATION_BINS = 8
+# 色と形状の重み
+COLOR_WEIGHT = 0.5
+GRADIENT_WEIGHT = 1.0
+
+# FLANN（KD木）のパラメータ
+FLANN_INDEX_KDTREE = 1
+FLANN_TREES = 4
+FLANN_CHECKS = 64
+
+
+def icon_descriptor(image: np.ndarray) -> np.ndarray:
+    """アイコン画像のスケール正規化済み記述子を計算
+
+    固定サイズに縮小した上で、HSV色ヒストグラムとセルごとの勾配方向ヒストグラムを連結する。
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    small = cv2.resize(image, (DESCRIPTOR_SIZE, DESCRIPTOR_SIZE), interpolation=cv2.INTER_AREA)
+
+    # 色ヒストグラム（色相×彩度）
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    color_hist = cv2.calcHist([hsv], [0, 1], None, [HUE_BINS, SAT_BINS], [0, 180, 0, 256]).ravel()
+    color_hist /= max(float(np.linalg.norm(color_hist)), 1e-6)
+
+    # 勾配方向ヒストグラム（セルごと、勾配強度で重み付け）
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    bins = (angle / (2 * np.pi) * ORIENTATION_BINS).astype(np.int32) % ORIENTATION_BINS
+    cell = DESCRIPTOR_SIZE // GRID_CELLS
+    cell_index = (np.arange(DESCRIPTOR_SIZE) // cell)
+    flat_index = ((cell_index[:, None] * GRID_CELLS + cell_index[None, :]) * ORIENTATION_BINS + bins).ravel()
+    grad_hist = np.bincount(flat_index, weights=magnitude.ravel(),
+                            minlength=GRID_CELLS * GRID_CELLS * ORIENTATION_BINS).astype(np.float32)
+    grad_hist /= max(float(np.linalg.norm(grad_hist)), 1e-6)
+
+    return np.concatenate([color_hist * COLOR_WEIGHT, grad_hist * GRADIENT_WEIGHT]).astype(np.float32)
+
+
+class DescriptorIndex:
+    """アイコン記述子の近傍探索インデックス
+
+    テンプレートの記述子を平均除去・単位ノルム化してKD木（FLANN）に登録する。
+    単位ベクトル同士の二乗距離 d から類似度 1 - d/2（コサイン類似度）を求めるため、
+    スコアは相関係数と同じく-1～1の範囲で、既存の閾値（0.40）と比較できる。
+    """
+
+    def __init__(self, bank: TemplateBank):
+        self.names = list(bank.names)
+        self.types = list(bank.types)
+        self.mean: Optional[np.ndarray] = None
+        # タイプ（None=全体） -> (FLANNインデックス, バンク内インデックス配列)
+        self._indices: Dict[Optional[str], Tuple[object, np.ndarray]] = {}
+
+        if not bank.originals:
+            return
+
+        descriptors = np.stack([icon_descriptor(original) for original in bank.originals])
+        self.mean = descriptors.mean(axis=0)
+        features = self._normalize(descriptors)
+
+        for char_type in (None, "survivor", "hunter"):
+            members = np.asarray(
+                [i for i, t in enumerate(self.types) if char_type is None or t == char_type], dtype=np.intp
+            )
+            if len(members) == 0:
+                continue
+            index = cv2.flann.Index(np.ascontiguousarray(features[members]),
+                                    dict(algorithm=FLANN_INDEX_KDTREE, trees=FLANN_TREES))
+            self._indices[char_type] = (index, members)
+
+        logger.info(f"[SUCCESS] Descriptor index built: {len(self.names)} icons, dim={features.shape[1]}")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _normalize(self, descriptors: np.ndarray) -> np.ndarray:
+        centered = descriptors - self.mean
+        norms = np.linalg.norm(centered, axis=-1, keepdims=True)
+        return (centered / np.maximum(norms, 1e-6)).astype(np.float32)
+
+    def query(self, icon_image: np.ndarray, k: int = 5,
+              char_type: Optional[str] = None) -> List[Tuple[str, Tuple[float, str]]]:
+        """アイコン画像に近いテンプレートをk件返す
+
+        Returns:
+            [(キャラ名, (類似度, タイプ)), ...]（類似度の降順）
+        """
+        entry = self._indices.get(char_type)
+        if entry is None or icon_image.size == 0:
+            return []
+        index, members = entry
+
+        feature = self._normalize(icon_descriptor(icon_image)[None])
+        knn = min(k, len(members))
+        neighbors, distances = index.knnSearch(feature, knn, params=dict(checks=FLANN_CHECKS))
+
+        results = []
+        for local_idx, dist in zip(neighbors[0], distances[0]):
+            bank_idx = members[int(local_idx)]
+            similarity = 1.0 - float(dist) / 2.0
+            results.append((self.names[bank_idx], (similarity, self.types[bank_idx])))
+        return sorted(results, key=lambda x: x[1][0], reverse=True)
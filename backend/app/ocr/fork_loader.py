@@ -0,0 +1,20 @@
+"""forkモードのワーカーの元になるプロセス（forkserver）が起動時に読み込むモジュール
+
+forkserver はサーバー本体（スレッドプール・イベントループ・起動処理のスレッドが動いている）とは別に
+起動する、スレッドを持たないプロセス。ここでOCRプロセッサを読み込んでおき、ワーカープロセスは
+このプロセスからforkして読み込み済みのメモリを書き込み時コピーで共有する。
+"""
+import logging
+import os
+
+from .process_pool import FORK_TEMPLATES_ENV, _preload_for_fork
+
+logger = logging.getLogger(__name__)
+
+_templates_path = os.environ.get(FORK_TEMPLATES_ENV)
+if _templates_path:
+    try:
+        _preload_for_fork(_templates_path)
+    except Exception as e:
+        # forkserver は止めず、ワーカーごとに読み込む（_init_forked_worker）
+        logger.error(f"[ERROR] Failed to preload OCR models for fork, workers will load them: {e}", exc_info=True)
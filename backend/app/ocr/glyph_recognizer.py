@@ -0,0 +1,140 @@
+import logging
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 戦績の値に現れる文字（"20s", "112%", "1" など）。"分" は日本語フォントを指定した場合のみ追加
+DEFAULT_GLYPHS = "0123456789%s"
+CJK_GLYPHS = "分"
+
+# 文字を比較する正規化サイズ（幅 × 高さ、縦横比は保つ）
+GLYPH_WIDTH = 12
+GLYPH_HEIGHT = 20
+# 1セルの最大文字数（これを超える場合は値のセルではないとみなす）
+MAX_GLYPHS = 8
+# 文字の高さに対してこれより小さい塊はノイズとして捨てる
+MIN_GLYPH_HEIGHT_RATIO = 0.3
+
+# テンプレートの描画に使うフォント（cv2組み込み）と線の太さ
+HERSHEY_FONTS = (
+    cv2.FONT_HERSHEY_SIMPLEX,
+    cv2.FONT_HERSHEY_DUPLEX,
+    cv2.FONT_HERSHEY_COMPLEX,
+    cv2.FONT_HERSHEY_TRIPLEX,
+)
+HERSHEY_THICKNESS = (2, 3, 4)
+RENDER_SIZE = 96
+
+
+def normalize_glyph(mask: np.ndarray) -> Optional[np.ndarray]:
+    """2値の文字画像を固定サイズ・ゼロ平均・単位ノルムのベクトルに変換
+
+    外接矩形で切り出し、縦横比を保ったまま GLYPH_WIDTH × GLYPH_HEIGHT の中央に配置する。
+    """
+    ys, xs = np.nonzero(mask)
+    if len(ys) == 0:
+        return None
+    glyph = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1].astype(np.float32)
+    h, w = glyph.shape
+    scale = min(GLYPH_HEIGHT / h, GLYPH_WIDTH / w)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    resized = cv2.resize(glyph, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    canvas = np.zeros((GLYPH_HEIGHT, GLYPH_WIDTH), dtype=np.float32)
+    top, left = (GLYPH_HEIGHT - new_h) // 2, (GLYPH_WIDTH - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    vector = canvas.ravel()
+    vector -= vector.mean()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else None
+
+
+def segment_glyphs(cell: np.ndarray) -> List[np.ndarray]:
+    """セル画像を2値化し、列方向の投影で文字ごとの2値画像に分割"""
+    gray = cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY) if cell.ndim == 3 else cell
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 背景（枠の画素の多数派）を0にする
+    border = np.concatenate([binary[0], binary[-1], binary[:, 0], binary[:, -1]])
+    if border.mean() > 0.5:
+        binary = 1 - binary
+
+    columns = binary.any(axis=0)
+    if not columns.any():
+        return []
+    # 列の True の連続区間が1文字
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], columns.astype(np.int8), [0]])))
+    spans = list(zip(edges[::2], edges[1::2]))
+
+    rows = np.flatnonzero(binary.any(axis=1))
+    text_height = rows[-1] - rows[0] + 1
+    glyphs = []
+    for x1, x2 in spans:
+        glyph = binary[:, x1:x2]
+        glyph_rows = np.flatnonzero(glyph.any(axis=1))
+        if glyph_rows[-1] - glyph_rows[0] + 1 < text_height * MIN_GLYPH_HEIGHT_RATIO:
+            continue
+        glyphs.append(glyph)
+    return glyphs
+
+
+class GlyphRecognizer:
+    """描画した文字テンプレートとの相関で数値セルを読む軽量認識器（torch不要）
+
+    セルを文字に分割し、全文字 × 全テンプレートの相関を1回の行列積で求める。
+    """
+
+    def __init__(self, font_path: Optional[str] = None):
+        vectors = []
+        labels = []
+
+        def register(char: str, image: np.ndarray):
+            vector = normalize_glyph(image > 0)
+            if vector is not None:
+                vectors.append(vector)
+                labels.append(char)
+
+        for char in DEFAULT_GLYPHS:
+            for font in HERSHEY_FONTS:
+                for thickness in HERSHEY_THICKNESS:
+                    canvas = np.zeros((RENDER_SIZE, RENDER_SIZE), dtype=np.uint8)
+                    cv2.putText(canvas, char, (RENDER_SIZE // 6, RENDER_SIZE * 3 // 4), font, 2.0, 255, thickness)
+                    register(char, canvas)
+
+        self.glyphs = DEFAULT_GLYPHS
+        if font_path:
+            try:
+                from PIL import Image, ImageDraw, ImageFont
+                font = ImageFont.truetype(font_path, RENDER_SIZE * 2 // 3)
+                for char in DEFAULT_GLYPHS + CJK_GLYPHS:
+                    image = Image.new("L", (RENDER_SIZE, RENDER_SIZE), 0)
+                    ImageDraw.Draw(image).text((RENDER_SIZE // 8, RENDER_SIZE // 8), char, fill=255, font=font)
+                    register(char, np.asarray(image))
+                self.glyphs = DEFAULT_GLYPHS + CJK_GLYPHS
+            except Exception as e:
+                logger.warning(f"[WARNING] Failed to render glyphs with font {font_path}: {e}")
+
+        self.templates = np.stack(vectors).astype(np.float32)
+        self.labels = np.asarray(labels)
+        logger.info(f"[SUCCESS] Glyph recognizer ready: {len(self.glyphs)} glyphs, {len(labels)} templates")
+
+    def read(self, cell: np.ndarray) -> Tuple[str, float]:
+        """セル画像の文字列と信頼度（全文字の相関の最小値）を返す
+
+        値のセルとして読めない場合は ("", 0.0)
+        """
+        if cell.size == 0:
+            return "", 0.0
+        glyphs = segment_glyphs(cell)
+        if not glyphs or len(glyphs) > MAX_GLYPHS:
+            return "", 0.0
+
+        vectors = [normalize_glyph(glyph) for glyph in glyphs]
+        if any(vector is None for vector in vectors):
+            return "", 0.0
+        scores = np.stack(vectors) @ self.templates.T
+        best = scores.argmax(axis=1)
+        text = "".join(self.labels[best])
+        return text, float(scores[np.arange(len(best)), best].min())
@@ -0,0 +1,98 @@
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# 知覚ハッシュの計算サイズ（DCTの入力）と使用する低周波成分の一辺
+HASH_INPUT_SIZE = 32
+HASH_SIZE = 8
+
+# キャッシュの既定値
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_DISTANCE = 4
+
+
+def icon_phash(image: np.ndarray) -> int:
+    """アイコン画像の知覚ハッシュ（64bit、pHash）
+
+    グレースケール・固定サイズに正規化した画像のDCT低周波成分を中央値で2値化する。
+    位置の数ピクセルのずれや圧縮ノイズではほとんどのビットが変わらない。
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (HASH_INPUT_SIZE, HASH_INPUT_SIZE), interpolation=cv2.INTER_AREA)
+    coefficients = cv2.dct(small.astype(np.float32))[:HASH_SIZE, :HASH_SIZE].ravel()
+    # 直流成分（明るさ）は除いて中央値を求める
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class IconHashCache:
+    """認識済みアイコンの知覚ハッシュ → (キャラ名, タイプ, スコア) のLRUキャッシュ
+
+    ハミング距離が max_distance 以下のハッシュを同じアイコンの候補とみなす
+    （似たキャラの衝突があるため、呼び出し側でテンプレート1枚の照合により確認する）。
+    アイコン照合用スレッドプールから同時に呼ばれるためロックで保護する。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0  # ヒットしたが照合で確認できなかった数
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, icon_hash: int, char_type: Optional[str] = None) -> Optional[Tuple[str, str, float]]:
+        """近いハッシュのエントリを返す（char_typeを指定するとそのタイプのみ）"""
+        with self._lock:
+            best_key = None
+            best_distance = self.max_distance + 1
+            for key in self._entries:
+                entry_hash, entry_type = key
+                if char_type is not None and entry_type != char_type:
+                    continue
+                distance = bin(entry_hash ^ icon_hash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        break
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key]
+
+    def reject(self):
+        """ヒットした候補が照合で確認できなかったことを記録"""
+        with self._lock:
+            self.rejected += 1
+
+    def store(self, icon_hash: int, char_name: str, char_type: str, score: float):
+        with self._lock:
+            key = (icon_hash, char_type)
+            self._entries[key] = (char_name, char_type, score)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """ヒット数・ミス数・確認できなかった数・ヒット率（確認済みのみ）・エントリ数"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "hit_rate": round((self.hits - self.rejected) / total, 3) if total else 0.0,
+        }
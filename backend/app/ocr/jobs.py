@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
+from .process_pool import OCRPoolUnavailableError
+from .scheduler import SchedulerFullError
+
+logger = logging.getLogger(__name__)
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+# 期限切れジョブの削除間隔（秒）
+PURGE_INTERVAL = 60
+
+
+class QueueFullError(Exception):
+    """ジョブキューが満杯（retry_after 秒後の再送を促す）"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"OCR job queue is full (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class JobStore:
+    """ジョブの状態と結果をSQLiteに保存する
+
+    画像は保存しない（再起動時に未完了だったジョブは失敗として扱う）。
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def create(self, job_id: str, user_id: Optional[str], ttl: float) -> Dict:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO ocr_jobs (id, user_id, status, created_at, updated_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, JOB_QUEUED, now, now, now + ttl),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, ttl: Optional[float] = None, **fields):
+        """状態を更新（ttl を指定すると有効期限を現在から延ばす。完了時に使う）"""
+        now = time.time()
+        fields["updated_at"] = now
+        if ttl is not None:
+            fields["expires_at"] = now + ttl
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE ocr_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """ジョブを取得（期限切れ・存在しない場合はNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, user_id, status, stage, result, error, created_at, updated_at, expires_at "
+                "FROM ocr_jobs WHERE id = ? AND expires_at > ?",
+                (job_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "user_id", "status", "stage", "result", "error", "created_at", "updated_at", "expires_at")
+        job = dict(zip(keys, row))
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def fail_unfinished(self, error: str) -> int:
+        """前回の起動で未完了だったジョブを失敗にする（画像が残っていないため再実行できない）"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE ocr_jobs SET status = ?, error = ?, updated_at = ? WHERE status IN (?, ?)",
+                (JOB_FAILED, error, time.time(), JOB_QUEUED, JOB_RUNNING),
+            )
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM ocr_jobs WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OCRJobQueue:
+    """OCRジョブの上限付きキュー
+
+    投入するとジョブIDをすぐに返し、ジョブごとのタスクで解析する。
+    解析の順番と同時実行数は run（run_ocr のユーザー間スケジューラー）が決めるため、
+    ここでは未完了のジョブ数のみを制限する。
+    満杯の場合は QueueFullError（HTTP 429）で、待ち時間の目安を返す。
+    """
+
+    def __init__(self, store: JobStore, run: Callable, max_queued: int, ttl: float, concurrency: int = 1):
+        self.store = store
+        self._run = run  # async run(contents, user_id, custom_layout, progress) -> 結果の辞書
+        self.max_queued = max(1, max_queued)
+        self.ttl = ttl
+        self.concurrency = max(1, concurrency)  # 同時に解析できる数（Retry-After の見積もり用）
+        self._jobs: Set[asyncio.Task] = set()
+        self._purge_task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 直近の処理時間（Retry-After の見積もり用）
+        self._average_seconds = 10.0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Condition()
+        interrupted = self.store.fail_unfinished("サーバーの再起動により中断されました")
+        if interrupted:
+            logger.warning(f"[WARNING] Marked {interrupted} unfinished OCR jobs as failed")
+        self._purge_task = asyncio.create_task(self._purge_loop())
+        logger.info(f"[INFO] OCR job queue started ({self.max_queued} slots)")
+
+    async def stop(self):
+        tasks = list(self._jobs) + ([self._purge_task] if self._purge_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._jobs.clear()
+        self._purge_task = None
+
+    def retry_after(self) -> int:
+        """キューが空くまでの目安（秒）"""
+        return max(1, int(len(self._jobs) * self._average_seconds / self.concurrency))
+
+    def submit(self, contents: bytes, user_id: Optional[str] = None,
+               custom_layout: Optional[List[Dict]] = None) -> Dict:
+        """ジョブを投入（満杯の場合は QueueFullError）"""
+        if len(self._jobs) >= self.max_queued:
+            raise QueueFullError(self.retry_after())
+        job_id = uuid.uuid4().hex
+        job = self.store.create(job_id, user_id, self.ttl)
+        task = asyncio.create_task(self._process(job_id, contents, user_id, custom_layout))
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """いずれかのジョブの状態が変わるまで待つ（タイムアウトした場合はFalse）"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _set_stage(self, job_id: str, stage: str):
+        # 最初の段階が届いた時点で解析が始まっている（それまではスケジューラーの順番待ち）
+        self.store.update(job_id, status=JOB_RUNNING, stage=stage)
+        asyncio.ensure_future(self._notify())
+
+    def _progress_callback(self, job_id: str) -> Callable[[str], None]:
+        """解析スレッドから処理段階を受け取り、イベントループ上で記録する"""
+        def report(stage: str):
+            self._loop.call_soon_threadsafe(self._set_stage, job_id, stage)
+        return report
+
+    async def _process(self, job_id: str, contents: bytes, user_id: Optional[str],
+                       custom_layout: Optional[List[Dict]]):
+        start = time.perf_counter()
+        try:
+            result = await self._run(contents, user_id, custom_layout, self._progress_callback(job_id))
+            self.store.update(job_id, ttl=self.ttl, status=JOB_DONE, result=result)
+        except asyncio.CancelledError:
+            raise
+        except SchedulerFullError:
+            self.store.update(job_id, ttl=self.ttl, status=JOB_FAILED,
+                              error="解析の待ちが多いため処理できませんでした。しばらくしてから再度お試しください")
+        except OCRPoolUnavailableError as e:
+            logger.warning(f"[WARNING] OCR job {job_id} not run: {e}")
+            self.store.update(job_id, ttl=self.ttl, status=JOB_FAILED,
+                              error="解析の準備中のため処理できませんでした。しばらくしてから再度お試しください"
+                              if e.starting else "解析を利用できません")
+        except Exception as e:
+            logger.error(f"OCRジョブエラー ({job_id}): {str(e)}", exc_info=True)
+            self.store.update(job_id, ttl=self.ttl, status=JOB_FAILED, error="画像の解析に失敗しました")
+        self._average_seconds = 0.8 * self._average_seconds + 0.2 * (time.perf_counter() - start)
+        await self._notify()
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(PURGE_INTERVAL)
+            purged = self.store.purge_expired()
+            if purged:
+                logger.info(f"[INFO] Purged {purged} expired OCR jobs")
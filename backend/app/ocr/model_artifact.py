@@ -0,0 +1,150 @@
+"""
+yomitokuのモデルのシリアライズ済みアーティファクト
+
+DocumentAnalyzer を実行時に作るとモデルの構築・事前学習済み重みの取得と読み込みが毎回行われ、
+ワーカーの起動（コールドスタート）が遅い。ビルド時に構築済みのアナライザーを
+「ネットワークを除いた本体（前後処理・設定・トークナイザー）」と「各ネットワークの重み」に分けて保存し、
+起動時は本体を復元してネットワークを meta デバイス上に構築（メモリ確保・初期化なし）、
+メモリマップした重みをそのまま割り当てる。
+
+lite / normal の構成ごとに1ファイル（models/yomitoku-lite.pt, models/yomitoku-normal.pt）。
+yomitoku・torchのバージョンが変わった場合は使わない（再ビルドが必要）。
+
+使い方（backendディレクトリで実行）:
+    python -m app.ocr.model_artifact [lite|normal|all]
+"""
+import importlib.metadata
+import itertools
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_ARTIFACT_VERSION = 1
+# ネットワーク（.model）を持つyomitokuのモジュール（DocumentAnalyzerからの属性パス）
+NETWORK_MODULES = ("text_detector", "text_recognizer", "layout.layout_parser", "layout.table_structure_recognizer")
+
+
+def model_artifact_path(lite_mode: bool) -> Path:
+    from ..config import get_settings
+    return Path(get_settings().ocr_model_artifact_dir) / f"yomitoku-{'lite' if lite_mode else 'normal'}.pt"
+
+
+def _versions() -> Dict[str, str]:
+    import torch  # type: ignore
+    return {"yomitoku": importlib.metadata.version("yomitoku"), "torch": torch.__version__}
+
+
+def _resolve(analyzer, path: str):
+    module = analyzer
+    for part in path.split("."):
+        module = getattr(module, part, None)
+    return module
+
+
+def _network_modules(analyzer) -> Dict[str, object]:
+    """ネットワークを持つモジュール {属性パス: モジュール}"""
+    modules = {path: _resolve(analyzer, path) for path in NETWORK_MODULES}
+    return {path: module for path, module in modules.items()
+            if module is not None and getattr(module, "model", None) is not None}
+
+
+def compile_model_artifact(lite_mode: bool, target: Optional[Path] = None) -> Path:
+    """構成（lite / normal）のアナライザーを構築して保存"""
+    import torch  # type: ignore
+    from .processor import construct_yomitoku_analyzer
+
+    target = Path(target) if target else model_artifact_path(lite_mode)
+    analyzer = construct_yomitoku_analyzer(lite_mode)
+    modules = _network_modules(analyzer)
+    networks = {path: module.model for path, module in modules.items()}
+
+    payload = {
+        "version": MODEL_ARTIFACT_VERSION,
+        "lite_mode": lite_mode,
+        **_versions(),
+        "classes": {path: type(network) for path, network in networks.items()},
+        "weights": {path: network.state_dict() for path, network in networks.items()},
+    }
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # 本体はネットワークを外した状態で保存する（重みは weights に1回だけ入れる）
+        for module in modules.values():
+            module.model = None
+        payload["skeleton"] = analyzer
+        torch.save(payload, target)
+    finally:
+        for path, module in modules.items():
+            module.model = networks[path]
+
+    logger.info(f"[SUCCESS] Saved {'lite' if lite_mode else 'normal'} model artifact to {target} "
+                f"({target.stat().st_size / 1e6:.1f}MB, {len(networks)} networks)")
+    return target
+
+
+def load_model_artifact(lite_mode: bool) -> Optional[Tuple[object, Dict]]:
+    """アーティファクトからアナライザーを復元
+
+    Returns:
+        (アナライザー, {"construction_seconds", "weight_load_seconds"})。無い・使えない場合はNone
+    """
+    path = model_artifact_path(lite_mode)
+    if not path.exists():
+        return None
+
+    import torch  # type: ignore
+    try:
+        start = time.perf_counter()
+        # 自分で作成したファイルのみを読む（アナライザー本体を含むため weights_only は使わない）
+        payload = torch.load(path, map_location="cpu", mmap=True, weights_only=False)
+        if (payload.get("version") != MODEL_ARTIFACT_VERSION or payload.get("lite_mode") != lite_mode
+                or any(payload.get(key) != value for key, value in _versions().items())):
+            logger.warning(f"[WARNING] Model artifact {path} was built for a different version - rebuild required")
+            return None
+
+        analyzer = payload["skeleton"]
+        modules = {path_key: _resolve(analyzer, path_key) for path_key in payload["classes"]}
+        construction_seconds = time.perf_counter() - start
+        weight_seconds = 0.0
+        networks = {}
+        for path_key, module in modules.items():
+            network_class, weights = payload["classes"][path_key], payload["weights"][path_key]
+            # meta デバイス上に構築する（メモリ確保・乱数初期化を行わない）
+            for device in ("meta", "cpu"):
+                build_start = time.perf_counter()
+                with torch.device(device):
+                    network = network_class(cfg=module._cfg)
+                load_start = time.perf_counter()
+                network.load_state_dict(weights, assign=device == "meta")
+                construction_seconds += load_start - build_start
+                weight_seconds += time.perf_counter() - load_start
+                # 初期化時に計算したバッファなど、重みに含まれないテンソルが残る場合は通常どおり構築する
+                if not any(t.is_meta for t in itertools.chain(network.parameters(), network.buffers())):
+                    break
+            networks[path_key] = network
+    except Exception as e:
+        logger.warning(f"[WARNING] Failed to load model artifact {path}: {e}")
+        return None
+
+    for path_key, module in modules.items():
+        network = networks[path_key].eval()
+        if hasattr(module, "tokenizer"):
+            network.tokenizer = module.tokenizer
+        module.model = network.to(module.device)
+
+    logger.info(f"[SUCCESS] Loaded yomitoku from {path} (construction {construction_seconds:.2f}s, "
+                f"weights {weight_seconds:.2f}s)")
+    return analyzer, {"construction_seconds": construction_seconds, "weight_load_seconds": weight_seconds}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    target_mode = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if target_mode not in ("lite", "normal", "all"):
+        sys.exit(__doc__)
+    for lite in (True, False):
+        if target_mode == "all" or target_mode == ("lite" if lite else "normal"):
+            compile_model_artifact(lite)
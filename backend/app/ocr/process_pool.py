@@ -0,0 +1,320 @@
+import gc
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ワーカープロセスの異常終了からプールを作り直すまでの待ち時間（秒）。起動直後に落ち続ける場合の連続再起動を抑える
+RESTART_DELAY = 1.0
+
+# forkモードでワーカーの元になるプロセス（forkserver）が起動時に読み込むモジュールと、
+# そのプロセスにテンプレートの場所を渡す環境変数
+FORK_LOADER_MODULE = f"{__package__}.fork_loader"
+FORK_TEMPLATES_ENV = "OCR_FORK_TEMPLATES_PATH"
+
+# ワーカープロセス内のOCRプロセッサ（プロセスごとに1つ）
+_worker_processor = None
+# forkserver でOCRプロセッサの読み込みにかかった時間（forkしたワーカーに引き継がれる）
+_preload_seconds: Optional[float] = None
+
+
+def _init_worker(templates_path: str, status_queue, preload: bool):
+    """ワーカープロセスの初期化: OCRプロセッサを読み込み、状態を親プロセスに通知"""
+    global _worker_processor
+    from .processor import OCRProcessor
+
+    supabase = None
+    try:
+        from ..database import get_supabase
+        supabase = get_supabase()
+    except Exception as e:
+        logger.warning(f"[WARNING] OCR worker {os.getpid()}: Supabase unavailable, using default layouts: {e}")
+
+    _worker_processor = OCRProcessor(templates_path=templates_path, supabase_client=supabase)
+    if preload:
+        _worker_processor.warm_up()
+    status_queue.put({"pid": os.getpid(), **_worker_processor.readiness()})
+
+
+def _preload_for_fork(templates_path: str):
+    """fork前にforkserver（fork_loader）でOCRプロセッサ（テンプレートバンクとyomitoku）を読み込む
+
+    子プロセスは読み込み済みのメモリを書き込み時コピーで共有する。
+    forkserver はスレッドを持たないため、スレッドの動いているプロセスからforkすることはない。
+    torchの演算スレッドも作らないよう、読み込みは1スレッドで行う（子プロセスで計画の値に戻す）。
+    gc.freeze で既存オブジェクトをGCの対象外にし、子プロセスのGCが
+    参照カウント以外のヘッダを書き換えてページが複製されるのを防ぐ。
+    """
+    global _worker_processor, _preload_seconds
+    from .processor import OCRProcessor, create_yomitoku_analyzer
+
+    start = time.perf_counter()
+    # Supabaseクライアント（HTTP接続）はfork後に子プロセスで作成する
+    _worker_processor = OCRProcessor(templates_path=templates_path, supabase_client=None)
+    _worker_processor.preload_analyzer(create_yomitoku_analyzer(torch_threads=1))
+    _preload_seconds = time.perf_counter() - start
+    logger.info(f"[SUCCESS] OCR models preloaded for fork ({_preload_seconds:.1f}s)")
+    gc.collect()
+    gc.freeze()
+
+
+def _init_forked_worker(status_queue, preload: bool, templates_path: str):
+    """forkしたワーカープロセスの初期化: forkserver が読み込んだOCRプロセッサをそのまま使う"""
+    if _worker_processor is None:
+        # forkserver での読み込みに失敗した場合は spawn と同じく各ワーカーで読み込む
+        _init_worker(templates_path, status_queue, preload)
+        return
+
+    from .concurrency import apply_torch_threads, get_concurrency_plan
+    apply_torch_threads(get_concurrency_plan().torch_threads)
+    try:
+        from ..database import get_supabase
+        _worker_processor.supabase = get_supabase()
+    except Exception as e:
+        logger.warning(f"[WARNING] OCR worker {os.getpid()}: Supabase unavailable, using default layouts: {e}")
+
+    if preload:
+        # ウォームアップ推論（torchのスレッドプールなど）はfork後に各プロセスで行う
+        _worker_processor.warm_up()
+    status_queue.put({"pid": os.getpid(), **_worker_processor.readiness(), "model_load_seconds": _preload_seconds})
+
+
+def memory_usage(pid: int) -> Optional[Dict[str, float]]:
+    """プロセスのメモリ使用量（MB）: 固有（USS）・共有・RSS・PSS
+
+    /proc/<pid>/smaps_rollup を読む（Linuxのみ。読めない場合はNone）
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "uss_mb": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+    }
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _process_shared(shm_name: str, shape: Tuple[int, ...], dtype: str,
+                    custom_layout: Optional[List[Dict]], image_key: Optional[str] = None) -> Dict:
+    """共有メモリ上のデコード済み画像を解析（画像はコピーもpickleもしない）"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        img = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        try:
+            return _worker_processor.process_decoded(img, custom_layout, image_key=image_key)
+        finally:
+            # 共有メモリを閉じる前にビューを解放する
+            del img
+    finally:
+        shm.close()
+
+
+class OCRPoolUnavailableError(Exception):
+    """ワーカープロセスが起動中（異常終了からの再起動中を含む）、または起動に失敗していて解析を受け付けられない（503）"""
+
+    def __init__(self, message: str, starting: bool):
+        super().__init__(message)
+        self.starting = starting
+
+
+class OCRProcessPool:
+    """プロセスごとにOCRProcessorを持つOCRワーカープール
+
+    Pythonレベルの解析処理（テキストの解析、アイコン照合）がプロセス間でGILを共有しないため、
+    コア数に応じてスループットが伸びる。画像は親プロセスでデコードし、
+    multiprocessing.shared_memory 経由で渡す。結果は process_image と同じ辞書。
+
+    start_method:
+        spawn: 各ワーカーがOCRProcessorを個別に読み込む
+        fork: forkserver（サーバー本体のスレッドを引き継がない専用のプロセス）で1回だけ読み込んでから
+              forkし、モデルの重みやテンプレートを書き込み時コピーで共有する（ワーカー数あたりのメモリが小さい）
+
+    ワーカープロセスが異常終了（OOMなど）してプールが BrokenProcessPool になった場合は、
+    再起動が終わるまで未起動と同じ扱い（check_ready が OCRPoolUnavailableError）にして作り直す。
+    """
+
+    def __init__(self, templates_path: str, workers: int, preload: bool = True, start_method: str = "spawn"):
+        self.templates_path = templates_path
+        self.workers = max(1, workers)
+        self.preload = preload
+        self.start_method = start_method
+        # fork はスレッドの動いているサーバー本体からではなく forkserver から行う
+        self._context = multiprocessing.get_context("forkserver" if start_method == "fork" else start_method)
+        self._status_queue = self._context.Queue()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started = threading.Event()
+        self.start_error: Optional[str] = None  # 起動に失敗した場合の例外
+        self.restarts = 0  # ワーカーの異常終了によるプールの作り直しの回数
+        self.last_failure: Optional[str] = None  # 直近の異常終了
+        self._restart_lock = threading.Lock()
+        self._stopping = False
+        self._statuses: Dict[int, Dict] = {}
+        self._status_thread = threading.Thread(target=self._collect_status, name="ocr-pool-status", daemon=True)
+        self._status_thread.start()
+
+    def _collect_status(self):
+        while True:
+            status = self._status_queue.get()
+            if status is None:
+                break
+            self._statuses[status["pid"]] = status
+            logger.info(f"[SUCCESS] OCR worker process {status['pid']} ready ({len(self._statuses)}/{self.workers})")
+
+    def start(self):
+        """全ワーカープロセスを起動
+
+        fork の場合は先に forkserver でOCRプロセッサを読み込む（時間がかかるためバックグラウンドで呼ぶ）。
+        失敗した場合は例外を start_error に記録し、以降の submit は OCRPoolUnavailableError になる。
+        """
+        if self._executor is not None or self.start_error is not None:
+            return
+        logger.info(f"[INFO] Starting {self.workers} OCR worker processes ({self.start_method})...")
+        try:
+            self._start_executor()
+        except Exception as e:
+            self.start_error = f"{type(e).__name__}: {e}"
+            logger.error(f"[ERROR] Failed to start OCR worker processes: {self.start_error}", exc_info=True)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            return
+        self._started.set()
+
+    def _start_executor(self):
+        if self.start_method == "fork":
+            # forkserver は最初のワーカーの起動時に FORK_LOADER_MODULE を読み込んでから起動し、以降のワーカーと
+            # 再起動後のワーカーはそこからforkする（共有メモリのトラッカーは親と同じものを引き継ぐ）
+            os.environ[FORK_TEMPLATES_ENV] = self.templates_path
+            self._context.set_forkserver_preload([FORK_LOADER_MODULE])
+            initializer, initargs = _init_forked_worker, (self._status_queue, self.preload, self.templates_path)
+        else:
+            initializer, initargs = _init_worker, (self.templates_path, self._status_queue, self.preload)
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._context,
+            initializer=initializer,
+            initargs=initargs,
+        )
+        # 起動中のワーカーが無い間は投入毎に1プロセス起動される（forkの場合は forkserver の読み込みを待つ）
+        for _ in range(self.workers):
+            self._executor.submit(_ping)
+
+    def _mark_broken(self, executor: ProcessPoolExecutor, error: BaseException):
+        """ワーカーの異常終了でプールが使えなくなった: 未起動の状態に戻し、バックグラウンドで作り直す"""
+        with self._restart_lock:
+            if self._executor is not executor or self._stopping:
+                # 同じプールの他の解析で検知済み、または停止中
+                return
+            self._started.clear()
+            self._executor = None
+            self._statuses.clear()
+            self.last_failure = f"{type(error).__name__}: {error}"
+        logger.error(f"[ERROR] OCR worker process died, restarting the pool: {self.last_failure}")
+        executor.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=self._restart, name="ocr-pool-restart", daemon=True).start()
+
+    def _restart(self):
+        time.sleep(RESTART_DELAY)
+        if self._stopping:
+            return
+        self.restarts += 1
+        self.start()
+
+    def check_ready(self):
+        """解析を投入できるか確認（起動中・再起動中・起動失敗なら OCRPoolUnavailableError、待たずに返す）"""
+        if self.start_error is not None:
+            raise OCRPoolUnavailableError(f"OCR worker processes failed to start: {self.start_error}", starting=False)
+        if not self._started.is_set():
+            if self.last_failure is not None:
+                raise OCRPoolUnavailableError(f"OCR worker processes are restarting after: {self.last_failure}",
+                                              starting=True)
+            raise OCRPoolUnavailableError("OCR worker processes are starting", starting=True)
+
+    def submit(self, img: np.ndarray, custom_layout: Optional[List[Dict]] = None,
+               image_key: Optional[str] = None) -> Future:
+        """デコード済み画像を共有メモリに置いて解析を投入（image_key は OCRProcessor.process_decoded と同じ）
+
+        起動が終わるまで待たずに OCRPoolUnavailableError を送出する（イベントループから呼ばれるため）。
+        """
+        self.check_ready()
+        executor = self._executor
+        if executor is None:
+            # check_ready の後にワーカーの異常終了を検知した
+            raise OCRPoolUnavailableError("OCR worker processes are restarting", starting=True)
+        img = np.ascontiguousarray(img)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+        view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+        view[...] = img
+        del view
+
+        try:
+            future = executor.submit(_process_shared, shm.name, img.shape, img.dtype.str, custom_layout, image_key)
+        except Exception as e:
+            shm.close()
+            shm.unlink()
+            if isinstance(e, BrokenProcessPool):
+                self._mark_broken(executor, e)
+                self.check_ready()
+            raise
+
+        def release(done: Future):
+            shm.close()
+            shm.unlink()
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self._mark_broken(executor, done.exception())
+
+        future.add_done_callback(release)
+        return future
+
+    def readiness(self) -> Dict:
+        """/ready エンドポイント用の状態（全ワーカーの集計とプロセスごとのメモリ使用量）"""
+        statuses = [dict(status, memory=memory_usage(pid)) for pid, status in self._statuses.items()]
+        load_times = [s["model_load_seconds"] for s in statuses if s.get("model_load_seconds") is not None]
+        warmup_times = [s["warmup_seconds"] for s in statuses if s.get("warmup_seconds") is not None]
+        errors = [s["error"] for s in statuses if s.get("error")]
+        if self.start_error is not None:
+            errors.insert(0, self.start_error)
+        started = self._started.is_set()
+        return {
+            "ready": started and len(statuses) == self.workers and all(s["ready"] for s in statuses),
+            "model_loaded": len(statuses) == self.workers and all(s["model_loaded"] for s in statuses),
+            "model_load_seconds": max(load_times) if load_times else None,
+            "warmup_seconds": max(warmup_times) if warmup_times else None,
+            "error": errors[0] if errors else None,
+            "start_method": self.start_method,
+            "starting": not started and self.start_error is None,
+            "restarting": not started and self.start_error is None and self.last_failure is not None,
+            "restarts": self.restarts,
+            "last_failure": self.last_failure,
+            "supervisor_memory": memory_usage(os.getpid()),
+            "workers": statuses,
+        }
+
+    def stop(self):
+        with self._restart_lock:
+            self._stopping = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._status_queue.put(None)
@@ -1,25 +1,191 @@
 import logging
 import cv2
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 import re
+import time
+from contextvars import ContextVar
+from concurrent.futures import Executor
 from pathlib import Path
+from .template_bank import TemplateBank, coarse_vector, STRIP_TEMPLATE_SIZE
+from .batch_matcher import BatchedTemplateMatcher, spectrum_cache_bytes
+from .descriptor_index import DescriptorIndex
+from .template_artifact import default_artifact_path, icon_template_files, load_template_artifact
+from .scale_calibration import ScaleCalibrator
+from .icon_cache import IconHashCache, icon_phash
+from .roi import roi_rectangles, stitch_regions, map_results_back
+from .cell_layout import CellLayoutRegistry, ROW_FIELDS, CELL_LABEL, CELL_VALUE
+from .glyph_recognizer import GlyphRecognizer
+from .worker import OCRWorkerPool
+from .concurrency import apply_torch_threads, get_concurrency_plan
+from .raw_blocks import get_raw_block_store, raw_block_key
 
 logger = logging.getLogger(__name__)
 
+# アイコン認識の採用閾値（最低40%以上）
+ICON_SCORE_THRESHOLD = 0.40
+# 2位との差がこれ未満の場合は信頼性が低いと判断
+SECOND_PLACE_MARGIN = 0.05
+
+# 処理段階（decode / ocr / icons / parse）の通知先。解析を実行するスレッドごとに process_image で設定する
+_stage_callback: ContextVar[Optional[Callable[[str], None]]] = ContextVar("ocr_stage_callback", default=None)
+
+
+def _report_stage(stage: str):
+    callback = _stage_callback.get()
+    if callback is not None:
+        callback(stage)
+
+
+# 再解析用に抽出処理の入力（OCR結果・アイコン位置・候補スコア）を記録する辞書。記録しない場合はNone
+_parse_record: ContextVar[Optional[Dict]] = ContextVar("ocr_parse_record", default=None)
+
+
+def _record_parse_input(**fields):
+    record = _parse_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+# リクエストごとのカスタムレイアウト（アイコン中心座標5件）。同じOCRProcessorを並列に使うためインスタンスには持たない
+_custom_layout: ContextVar[Optional[List[Dict]]] = ContextVar("ocr_custom_layout", default=None)
+
+def _analyzer_configs(lite_mode: bool, from_pretrained: bool = True) -> Dict:
+    if lite_mode:
+        configs = {
+            "ocr": {
+                "text_recognizer": {
+                    "model_name": "parseq-tiny",
+                    "device": "cpu",
+                },
+                "text_detector": {
+                    "device": "cpu",
+                },
+            },
+            # layout_analyzerを削除してLayoutParserとTableStructureRecognizerを無効化
+        }
+    else:
+        configs = {"ocr": {"text_recognizer": {}, "text_detector": {}}}
+    if not from_pretrained:
+        # 量子化済みの重みで置き換えるため、floatの事前学習済み重みは読まない
+        for module in configs["ocr"].values():
+            module["from_pretrained"] = False
+    return configs
+
+
+def construct_yomitoku_analyzer(lite_mode: bool, from_pretrained: bool = True):
+    """DocumentAnalyzerを構築（from_pretrained=False の場合、OCRモデルの事前学習済み重みは読まない）"""
+    from yomitoku import DocumentAnalyzer  # type: ignore
+
+    configs = _analyzer_configs(lite_mode, from_pretrained)
+    if lite_mode:
+        return DocumentAnalyzer(configs=configs)
+    return DocumentAnalyzer(configs=configs, device="cpu")
+
+
+def create_yomitoku_analyzer(backend: Optional[str] = None, require_gate: bool = True,
+                             torch_threads: Optional[int] = None):
+    """設定に応じたyomitokuのアナライザーを作成（torchのスレッド数も並列数の計画に合わせる）
+
+    シリアライズ済みのアーティファクト（python -m app.ocr.model_artifact）があればそこから復元する。
+    構築と重みの読み込みの時間は analyzer.load_timings に記録する。
+
+    Args:
+        backend: 推論方式（float / int8、Noneなら設定値）
+        require_gate: int8の場合、精度ゲートに合格した重みのみ使う
+        torch_threads: torchの演算スレッド数（Noneなら並列数の計画の値）
+    """
+    from ..config import get_settings
+    from .model_artifact import load_model_artifact
+    from .quantization import load_quantized_weights, quantized_weights_approved, quantized_weights_path
+
+    settings = get_settings()
+    backend = backend or settings.ocr_inference_backend
+    lite_mode = settings.ocr_lite_mode
+    apply_torch_threads(torch_threads or get_concurrency_plan().torch_threads)
+    mode = "lite mode, layout_analyzer disabled" if lite_mode else "normal mode"
+
+    quantized = None
+    if backend == "int8":
+        weights = quantized_weights_path()
+        if not weights.exists():
+            logger.warning(f"[WARNING] Quantized weights {weights} not found, using float models")
+        elif require_gate and not quantized_weights_approved(weights):
+            logger.warning(f"[WARNING] Quantized weights {weights} have not passed the accuracy gate, using float models")
+        else:
+            quantized = weights
+
+    loaded = load_model_artifact(lite_mode)
+    if loaded is not None:
+        analyzer, timings = loaded
+        timings["source"] = "artifact"
+    else:
+        logger.info(f"[INFO] Initializing yomitoku ({mode})...")
+        start = time.perf_counter()
+        analyzer = construct_yomitoku_analyzer(lite_mode, from_pretrained=quantized is None)
+        # 事前学習済み重みの取得・読み込みは構築に含まれる
+        timings = {"source": "pretrained", "construction_seconds": time.perf_counter() - start,
+                   "weight_load_seconds": None}
+
+    timings["backend"] = "float"
+    if quantized is not None:
+        start = time.perf_counter()
+        if load_quantized_weights(analyzer, quantized):
+            timings["weight_load_seconds"] = (timings["weight_load_seconds"] or 0.0) + time.perf_counter() - start
+            timings["backend"] = "int8"
+        elif loaded is None:
+            # 事前学習済み重みを読まずに構築したため作り直す
+            logger.warning("[WARNING] Falling back to float models")
+            start = time.perf_counter()
+            analyzer = construct_yomitoku_analyzer(lite_mode)
+            timings.update(construction_seconds=time.perf_counter() - start, weight_load_seconds=None)
+
+    analyzer.load_timings = timings
+    logger.info(f"[SUCCESS] yomitoku loaded ({timings['backend']}, {timings['source']})")
+    return analyzer
+
+
 class OCRProcessor:
-    def __init__(self, templates_path: str = None, supabase_client=None):
+    def __init__(self, templates_path: str = None, supabase_client=None, icon_pool: Optional[Executor] = None):
         self.templates_path = templates_path or "templates/icons"
         self.supabase = supabase_client  # Supabaseクライアント（レイアウト取得用）
+        self.icon_pool = icon_pool  # アイコン認識用スレッドプール（Noneなら逐次処理）
 
-        # yomitokuは遅延ロード（初回OCR実行時に初期化）
-        self._yomitoku_analyzer = None
+        # yomitokuはOCRワーカー（イベントループとアナライザーを所有するスレッド）ごとに遅延ロード
+        # （初回OCR実行時、または起動時の warm_up で初期化）
+        self.ocr_workers = OCRWorkerPool(self._create_yomitoku_analyzer, size=get_concurrency_plan().threads)
+        self.warmup_seconds: Optional[float] = None      # ウォームアップ推論の時間
+        self.warmup_error: Optional[str] = None
         logger.info("[INFO] OCRProcessor initialized (yomitoku will be loaded on first use)")
 
         # キャラアイコンのテンプレート画像（必須）
         self.survivor_templates = {}  # サバイバーアイコン
         self.hunter_templates = {}    # ハンターアイコン
+        self.template_bank = TemplateBank()  # リサイズ・正規化済みテンプレート
         self._load_icon_templates()
+        self.icon_matcher = BatchedTemplateMatcher(self.template_bank, spectrum_cache_bytes())
+        self.descriptor_index = DescriptorIndex(self.template_bank)  # スケール非依存の記述子インデックス
+        self.scale_calibrator = ScaleCalibrator()  # 端末ごとの学習済みテンプレートスケール
+
+        # 認識済みアイコンの知覚ハッシュキャッシュ（ヒット時はテンプレートマッチングを省略）
+        from ..config import get_settings
+        settings = get_settings()
+        self.icon_cache = None
+        if settings.ocr_icon_cache_size > 0:
+            self.icon_cache = IconHashCache(settings.ocr_icon_cache_size, settings.ocr_icon_cache_distance)
+
+        # 学習済みスケールを丸める格子のテンプレート行列を事前に作成（スケール学習は exhaustive のみ）
+        if settings.ocr_scale_calibration and settings.ocr_icon_matcher == "exhaustive" and len(self.template_bank):
+            self.template_bank.prepare_grid()
+
+        # 端末ごとの文字セルの位置（テキスト検出を省略する高速パス用）
+        self.cell_layouts = CellLayoutRegistry()
+        self.glyph_recognizer = None  # 数値セル用の軽量認識器
+        if settings.ocr_cell_fast_path and settings.ocr_glyph_recognizer:
+            self.glyph_recognizer = GlyphRecognizer(settings.ocr_glyph_font_path or None)
+
+        # OCR結果とアイコンの候補スコアの保存先（抽出処理の再実行用）
+        self.raw_blocks = get_raw_block_store()
 
         # マップ名リスト
         self.map_names = [
@@ -34,71 +200,106 @@ class OCRProcessor:
             "survivor_y_start": 0.43,       # サバイバーエリア開始（画面の19.5%）
             "survivor_y_end": 0.95,         # サバイバーエリア終了（画面の57.5%）
             "icon_y_offset_ratio": 0.02,    # アイコンY座標のオフセット（画面高さの2%下に）
-            "use_auto_detect": False,        # 自動検出を無効化（固定座標を使用）
         }
 
-    @property
-    def yomitoku_analyzer(self):
-        """yomitokuの遅延ロード"""
-        if self._yomitoku_analyzer is None:
-            from yomitoku import DocumentAnalyzer  # type: ignore
-            from ..config import get_settings
+    def _create_yomitoku_analyzer(self):
+        """yomitokuのアナライザーを作成（各OCRワーカーのスレッドで1回だけ呼ばれる）"""
+        return create_yomitoku_analyzer()
 
-            settings = get_settings()
+    def preload_analyzer(self, analyzer=None):
+        """現在のスレッドでyomitokuを読み込み（または指定したアナライザーを）OCRワーカーに使わせる
 
-            if settings.ocr_lite_mode:
-                logger.info("[INFO] Initializing yomitoku (lite mode, layout_analyzer disabled)...")
-                configs = {
-                    "ocr": {
-                        "text_recognizer": {
-                            "model_name": "parseq-tiny",
-                            "device": "cpu",
-                        },
-                        "text_detector": {
-                            "device": "cpu",
-                        },
-                    },
-                    # layout_analyzerを削除してLayoutParserとTableStructureRecognizerを無効化
-                }
-                self._yomitoku_analyzer = DocumentAnalyzer(configs=configs)
-            else:
-                logger.info("[INFO] Initializing yomitoku (normal mode)...")
-                self._yomitoku_analyzer = DocumentAnalyzer(device='cpu')
+        fork前に読み込んでおき、子プロセスでモデルの重みを共有するために使う
+        （OCRワーカーのスレッドは子プロセスで初めて起動する）。
+        """
+        if analyzer is None:
+            analyzer = self._create_yomitoku_analyzer()
+        self.ocr_workers = OCRWorkerPool(lambda: analyzer, size=1)
 
-            logger.info("[SUCCESS] yomitoku loaded")
-        return self._yomitoku_analyzer
+    @property
+    def is_ready(self) -> bool:
+        """モデルの読み込みとウォームアップ推論が完了しているか"""
+        return self.ocr_workers.loaded and self.warmup_seconds is not None
+
+    def warm_up(self):
+        """各OCRワーカーでyomitokuを読み込み、合成画像で1回推論してウォームアップ
+
+        初回推論時の初期化処理（カーネルの準備など）を起動時に済ませておき、
+        最初のリクエストが遅くならないようにする。
+        """
+        img = self._warmup_image()
+        self.ocr_workers.start(warmup_image=img)
+        self.ocr_workers.wait_started()
+
+        errors = [worker.error for worker in self.ocr_workers.workers if worker.error]
+        if errors:
+            self.warmup_error = errors[0]
+            logger.error(f"[ERROR] OCR warm-up failed: {self.warmup_error}")
+            return
+
+        start = time.perf_counter()
+        # アイコン照合（FFT・テンプレートのスペクトル）も1回実行しておく
+        if len(self.template_bank):
+            self._rank_icon_candidates(img, 40, 40, 60, 60, char_type="survivor")
+        self.warmup_seconds = time.perf_counter() - start + max(
+            worker.warmup_seconds or 0.0 for worker in self.ocr_workers.workers
+        )
+        self.warmup_error = None
+        logger.info(f"[SUCCESS] OCR warm-up finished ({self.warmup_seconds:.2f}s, "
+                    f"model load {self.ocr_workers.load_seconds:.1f}s)")
+
+    @staticmethod
+    def _warmup_image() -> np.ndarray:
+        """ウォームアップ用の合成画像（結果画面と同程度のサイズに数字と記号を描画）"""
+        img = np.full((590, 1280, 3), 40, dtype=np.uint8)
+        lines = ["VICTORY 4:17", "45%  20s  1  2  3", "112%  1:20  0  1  2"]
+        for row, text in enumerate(lines):
+            cv2.putText(img, text, (160, 120 + row * 150), cv2.FONT_HERSHEY_DUPLEX, 1.6, (230, 230, 230), 2, cv2.LINE_AA)
+        return img
+
+    def readiness(self) -> Dict:
+        """/ready エンドポイント用の状態"""
+        return {
+            "ready": self.is_ready,
+            "model_loaded": self.ocr_workers.loaded,
+            "model_load_seconds": self.ocr_workers.load_seconds,
+            "model_load_timings": self.ocr_workers.load_timings,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.warmup_error,
+        }
 
     def _load_icon_templates(self):
-        """キャラアイコンのテンプレート画像を読み込み（必須）"""
+        """キャラアイコンのテンプレート画像を読み込み（必須）
+
+        コンパイル済みアーティファクト（templates/icons.bank）があればメモリマップで読み込み、
+        無ければ（またはPNGと一致しなければ）PNGをデコードしてTemplateBankを構築する。
+        """
         base_dir = Path(self.templates_path)
 
-        # サバイバーアイコンを読み込み
-        survivor_dir = base_dir / "survivors"
-        if survivor_dir.exists():
-            self._load_templates_from_dir(survivor_dir, self.survivor_templates, "survivor")
-
-        # ハンターアイコンを読み込み
-        hunter_dir = base_dir / "hunters"
-        if hunter_dir.exists():
-            self._load_templates_from_dir(hunter_dir, self.hunter_templates, "hunter")
-
-        # 旧形式の互換性: templates/icons直下にある場合はサバイバーとして扱う
-        if base_dir.exists():
-            for pattern in ["*.png", "*.PNG"]:
-                for icon_file in base_dir.glob(pattern):
-                    char_name = icon_file.stem
-                    if char_name not in self.survivor_templates and char_name not in self.hunter_templates:
-                        try:
-                            with open(icon_file, 'rb') as f:
-                                image_data = f.read()
-                            nparr = np.frombuffer(image_data, np.uint8)
-                            template = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        bank = load_template_artifact(default_artifact_path(base_dir), base_dir)
+        if bank is not None:
+            self.template_bank = bank
+            for char_name, char_type, original in zip(bank.names, bank.types, bank.originals):
+                target = self.survivor_templates if char_type == "survivor" else self.hunter_templates
+                target[char_name] = original
+            logger.info(f"[SUCCESS] Loaded {len(self.survivor_templates)} survivor and {len(self.hunter_templates)} hunter icons (compiled)")
+            return
+
+        # survivors/ → hunters/ → 直下（旧形式、サバイバーとして扱う）の順に読み込み
+        for char_name, char_type, icon_file in icon_template_files(base_dir):
+            try:
+                with open(icon_file, 'rb') as f:
+                    image_data = f.read()
+                nparr = np.frombuffer(image_data, np.uint8)
+                template = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            except Exception as e:
+                logger.warning(f"[WARNING] Failed to load {char_type} {char_name}: {e}")
+                continue
 
-                            if template is not None:
-                                # オリジナル画像のみ保持（リサイズは必要時に実行）
-                                self.survivor_templates[char_name] = template
-                        except Exception as e:
-                            logger.warning(f"[WARNING] Failed to load {char_name}: {e}")
+            if template is not None:
+                # オリジナル画像を保持（リサイズはTemplateBankで事前に実行）
+                target = self.survivor_templates if char_type == "survivor" else self.hunter_templates
+                target[char_name] = template
 
         total = len(self.survivor_templates) + len(self.hunter_templates)
         if total > 0:
@@ -106,103 +307,131 @@ class OCRProcessor:
         else:
             logger.warning("[WARNING] No character icons found")
 
-    def _load_templates_from_dir(self, directory: Path, templates_dict: dict, char_type: str):
-        """指定ディレクトリからテンプレートを読み込む"""
-        for pattern in ["*.png", "*.PNG"]:
-            for icon_file in directory.glob(pattern):
-                char_name = icon_file.stem
-
-                if char_name in templates_dict:
-                    continue
-
-                try:
-                    with open(icon_file, 'rb') as f:
-                        image_data = f.read()
-                    nparr = np.frombuffer(image_data, np.uint8)
-                    template = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                except Exception as e:
-                    logger.warning(f"[WARNING] Failed to load {char_type} {char_name}: {e}")
-                    continue
+        # 全スケールのテンプレートを事前にリサイズ・正規化（リクエスト毎の準備処理を無くす）
+        self.template_bank = TemplateBank.build(self.survivor_templates, self.hunter_templates)
 
-                if template is not None:
-                    # オリジナル画像のみ保持（リサイズは必要時に実行）
-                    templates_dict[char_name] = template
-    
-    def process_image(self, image_bytes: bytes, custom_layout: Optional[List[Dict]] = None) -> Dict:
+    def process_image(self, image_bytes: bytes, custom_layout: Optional[List[Dict]] = None,
+                      progress: Optional[Callable[[str], None]] = None, image_key: Optional[str] = None) -> Dict:
         """画像から試合データを抽出
 
         Args:
             image_bytes: 画像データ
             custom_layout: カスタムレイアウト（オプション）
                            [{"x_ratio": 0.23, "y_ratio": 0.33, "size_ratio": 0.062}, ...]
+            progress: 処理段階（decode / ocr / icons / parse）を受け取るコールバック（オプション）
+            image_key: 画像のハッシュ（raw_block_key、計算済みの場合。省略時は必要なら計算する）
 
         Returns:
             試合データ辞書
         """
+        token = _stage_callback.set(progress)
+        try:
+            _report_stage("decode")
+            if image_key is None and self.raw_blocks is not None:
+                image_key = raw_block_key(image_bytes)
+            return self.process_decoded(self.decode_image(image_bytes), custom_layout, image_key=image_key)
+        finally:
+            _stage_callback.reset(token)
+
+    @staticmethod
+    def decode_image(image_bytes: bytes) -> np.ndarray:
+        """画像データをBGR画像にデコード"""
         nparr = np.frombuffer(image_bytes, np.uint8)
         img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
         if img is None:
             raise Exception("画像の読み込みに失敗しました")
+        return img
+
+    def process_decoded(self, img: np.ndarray, custom_layout: Optional[List[Dict]] = None,
+                        image_key: Optional[str] = None) -> Dict:
+        """デコード済みの画像から試合データを抽出（process_image と同じ結果）
 
-        # カスタムレイアウトを一時的に保存
-        _original_custom_layout = getattr(self, '_custom_layout', None)
+        image_key（画像バイト列のハッシュ）を渡すと、OCR結果とアイコンの候補スコアを保存する（reparse 用）
+        """
+        if image_key is None or self.raw_blocks is None:
+            return self._process_decoded(img, custom_layout)
+
+        record: Dict = {}
+        token = _parse_record.set(record)
+        try:
+            match_data = self._process_decoded(img, custom_layout)
+        finally:
+            _parse_record.reset(token)
+        self.raw_blocks.save(image_key, record, match_data)
+        return match_data
+
+    def reparse(self, record: Dict) -> Tuple[Dict, bool]:
+        """保存済みのOCR結果とアイコンの候補スコアから試合データを再抽出（OCR・アイコン照合なし）
+
+        Returns:
+            (試合データ, アイコンの候補が古いか)。再抽出で勝敗が変わりハンター位置が保存時と異なる場合、
+            候補は保存時のハンター位置で照合したものなので True（正しい結果には再解析が必要）
+        """
+        width, height = record["image_size"]
+        match_data, sorted_results = self._parse_text_fields(record["blocks"], width, height)
+        hunter_index = len(record["icon_boxes"]) - 1 if match_data["result"] == "敗北" else 0
+        survivors, detected_hunter = self._survivors_from_slots(
+            sorted_results, record["icon_boxes"], record["slot_candidates"], record["hunter_index"], height
+        )
+        return self._finish_match_data(match_data, survivors, detected_hunter), hunter_index != record["hunter_index"]
+
+    def _process_decoded(self, img: np.ndarray, custom_layout: Optional[List[Dict]] = None) -> Dict:
+        # カスタムレイアウトはこの解析の間だけ有効
+        token = _custom_layout.set(custom_layout or None)
         if custom_layout:
-            self._custom_layout = custom_layout
             logger.info(f"[CUSTOM LAYOUT] Using provided layout with {len(custom_layout)} positions")
 
         try:
-            # OCR実行
-            results = self._run_yomitoku_ocr(img)
+            from ..config import get_settings
+            settings = get_settings()
+
+            icon_layout = None
+            if settings.ocr_roi_mode or settings.ocr_cell_fast_path:
+                # アイコン位置を先に検出（OCR領域の決定とサバイバー認識で再利用）
+                layout_info: Dict = {}
+                icon_positions = self._detect_icon_positions(img, layout_info=layout_info)
+                icon_layout = (icon_positions, layout_info)
+
+            if settings.ocr_cell_fast_path:
+                # 高速パス: 学習済みのセルを認識器のみで読む
+                results = self._run_cell_ocr(img, *icon_layout)
+                if results is not None:
+                    match_data = self._parse_match_data(results, img, icon_layout=icon_layout)
+                    if self._is_complete(match_data):
+                        return match_data
+                    logger.info("[CELLS] Some fields are empty - falling back to full OCR")
+
+            if settings.ocr_roi_mode:
+                # 必要な領域のみOCR
+                results = self._run_roi_ocr(img, icon_layout[0], settings.ocr_roi_top_ratio)
+            else:
+                # OCR実行
+                results = self._run_yomitoku_ocr(img)
 
             # データ構造化
-            match_data = self._parse_match_data(results, img)
+            match_data = self._parse_match_data(results, img, icon_layout=icon_layout)
+
+            if settings.ocr_cell_fast_path and self._is_complete(match_data):
+                # 全項目を読み取れた結果からセル位置を学習（次回から高速パス）
+                icon_positions, layout_info = icon_layout
+                self.cell_layouts.learn(layout_info["key"], results, icon_positions,
+                                        match_data["survivors"], img.shape[1], img.shape[0])
 
             return match_data
         finally:
             # カスタムレイアウトをクリア
-            if custom_layout:
-                self._custom_layout = _original_custom_layout
+            _custom_layout.reset(token)
 
     def _run_yomitoku_ocr(self, img: np.ndarray) -> List:
         """yomitokuでOCR実行"""
+        _report_stage("ocr")
         try:
             # yomitokuで解析
             logger.debug("[DEBUG] Starting yomitoku analysis...")
 
-            # イベントループが既に実行中かチェック
-            import asyncio
-            try:
-                loop = asyncio.get_running_loop()
-                # 既に実行中の場合は、nest_asyncioを試す
-                logger.debug("[DEBUG] Event loop already running, trying nest_asyncio...")
-                try:
-                    import nest_asyncio
-                    nest_asyncio.apply()
-                    logger.debug("[DEBUG] nest_asyncio applied successfully")
-                    results = self.yomitoku_analyzer(img)
-                except ImportError:
-                    # nest_asyncioが無い場合は、新しいスレッドで実行
-                    logger.debug("[DEBUG] nest_asyncio not available, running in thread...")
-                    import concurrent.futures
-                    import threading
-
-                    def run_in_thread():
-                        # 新しいイベントループを作成
-                        new_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(new_loop)
-                        try:
-                            return self.yomitoku_analyzer(img)
-                        finally:
-                            new_loop.close()
-
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(run_in_thread)
-                        results = future.result(timeout=60)
-            except RuntimeError:
-                # イベントループが実行中でない場合は通常実行
-                logger.debug("[DEBUG] No event loop running, executing normally...")
-                results = self.yomitoku_analyzer(img)
+            # OCRワーカー（所有するイベントループ上）で実行
+            results = self.ocr_workers.analyze(img)
 
             # デバッグ: 結果の構造を確認
             logger.debug(f"[DEBUG] yomitoku result type: {type(results)}")
@@ -320,10 +549,122 @@ class OCRProcessor:
             traceback.print_exc()
             raise Exception(f"OCR処理に失敗しました: {e}")
 
-    def _parse_match_data(self, results: List, img: np.ndarray) -> Dict:
-        """OCR結果から試合データを抽出"""
+    def _run_roi_ocr(self, img: np.ndarray, icon_positions: List[Tuple[int, int, int, int]],
+                     top_ratio: float) -> List:
+        """文字を読む領域のみを切り出してOCR実行
+
+        上部の帯（勝敗・マップ名・日時・使用時間）とアイコン行の右側（戦績）を縦に並べた
+        1枚の画像に対してyomitokuを1回実行し、bboxを元画像の座標に戻す。
+        結果の形式は _run_yomitoku_ocr と同じなので、以降の解析処理はそのまま使える。
+        """
+        _report_stage("ocr")
+        height, width = img.shape[:2]
+        rects = roi_rectangles(width, height, icon_positions, top_ratio=top_ratio)
+        composite, placements = stitch_regions(img, rects)
+        logger.info(f"[ROI] OCR on {len(rects)} regions: {composite.shape[1]}x{composite.shape[0]} "
+                    f"({composite.shape[0] * composite.shape[1] / (width * height):.0%} of the screenshot)")
+
+        results = map_results_back(self._run_yomitoku_ocr(composite), placements)
+        if not results:
+            # 領域の推定が外れている可能性があるので全体でやり直す
+            logger.warning("[WARNING] No text found in ROI - falling back to full-frame OCR")
+            return self._run_yomitoku_ocr(img)
+        return results
+
+    def _run_cell_ocr(self, img: np.ndarray, icon_positions: List[Tuple[int, int, int, int]],
+                      layout_info: Dict) -> Optional[List]:
+        """学習済みのセル位置を切り出し、テキスト検出器を使わずに読む
+
+        ラベルのセルは学習時の文字列、戦績の数値セルは軽量認識器で読み、
+        残り（と軽量認識器で読めなかったセル）のみyomitokuの認識器でまとめて読む。
+
+        Returns:
+            _run_yomitoku_ocr と同じ形式の結果。未学習・認識器を使えない場合はNone
+        """
+        _report_stage("ocr")
+        from ..config import get_settings
+        min_score = get_settings().ocr_glyph_min_score
+
         height, width = img.shape[:2]
+        cells = self.cell_layouts.cells(layout_info["key"], icon_positions, width, height)
+        if not cells:
+            return None
+
+        results = []
+        pending = []
+        for quad, kind, text in cells:
+            if kind == CELL_LABEL:
+                results.append((quad, text, 1.0))
+                continue
+            if kind == CELL_VALUE and self.glyph_recognizer is not None:
+                (x1, y1), (x2, y2) = quad[0], quad[2]
+                value, score = self.glyph_recognizer.read(img[y1:y2, x1:x2])
+                if value and score >= min_score:
+                    results.append((quad, value, score))
+                    continue
+            pending.append(quad)
 
+        if pending:
+            try:
+                # 残りのセルを1回のバッチで認識（liteモードではparseq-tiny）
+                rec_results, _ = self.ocr_workers.call(lambda worker: worker.ensure_analyzer().text_recognizer(img, pending))
+            except AttributeError:
+                logger.warning("[WARNING] yomitoku text recognizer not available - cell fast path disabled")
+                return None
+            except Exception as e:
+                logger.warning(f"[WARNING] Cell recognition failed: {e}")
+                return None
+
+            if len(rec_results.contents) != len(pending):
+                # 認識器が一部のセルを除外した場合は位置の対応が取れない
+                return None
+
+            results.extend(
+                (quad, text, score)
+                for quad, text, score in zip(pending, rec_results.contents, rec_results.scores)
+                if text
+            )
+
+        logger.info(f"[CELLS] Read {len(results)}/{len(cells)} cells without text detection "
+                    f"({len(pending)} by the text recognizer)")
+        return results
+
+    def _is_complete(self, match_data: Dict) -> bool:
+        """勝敗・マップ名・日時・使用時間とサバイバー全員の戦績を読み取れたか"""
+        if match_data["result"] == "不明":
+            return False
+        if not (match_data["map_name"] and match_data["played_at"] and match_data["duration"]):
+            return False
+        survivors = match_data["survivors"]
+        return len(survivors) == 4 and all(
+            survivor.get(field) is not None for survivor in survivors for field in ROW_FIELDS
+        )
+
+    def _parse_match_data(self, results: List, img: np.ndarray,
+                          icon_layout: Optional[Tuple[List[Tuple[int, int, int, int]], Dict]] = None) -> Dict:
+        """OCR結果から試合データを抽出
+
+        Args:
+            icon_layout: 検出済みの (アイコン位置, レイアウト情報)。省略時はサバイバー認識時に検出する
+        """
+        _report_stage("parse")
+        height, width = img.shape[:2]
+        _record_parse_input(image_size=(width, height), blocks=results)
+
+        match_data, sorted_results = self._parse_text_fields(results, width, height)
+
+        # サバイバー情報を抽出（画像認識ベース）
+        # 試合結果を渡して位置調整に使用
+        survivors, detected_hunter = self._extract_survivors(sorted_results, img, match_data["result"],
+                                                             icon_layout=icon_layout)
+        return self._finish_match_data(match_data, survivors, detected_hunter)
+
+    def _parse_text_fields(self, results: List, width: int, height: int) -> Tuple[Dict, List]:
+        """OCR結果から勝敗・マップ名・日時・使用時間を抽出（画像を使わない）
+
+        Returns:
+            (試合データ, Y座標でソートしたOCR結果)
+        """
         match_data = {
             "result": None,
             "map_name": None,
@@ -423,9 +764,10 @@ class OCRProcessor:
                         logger.debug(f"  [DURATION] {match_data['duration']}")
                         break
 
-        # サバイバー情報を抽出（画像認識ベース）
-        # 試合結果を渡して位置調整に使用
-        survivors, detected_hunter = self._extract_survivors(sorted_results, img, match_data["result"])
+        return match_data, sorted_results
+
+    def _finish_match_data(self, match_data: Dict, survivors: List[Dict], detected_hunter: Optional[str]) -> Dict:
+        """抽出したサバイバー・ハンターを試合データにまとめる"""
         match_data["survivors"] = survivors
 
         # ハンター情報を設定
@@ -440,99 +782,345 @@ class OCRProcessor:
 
         return match_data
     
-    def _extract_survivors(self, results: List, img: np.ndarray, match_result: str = None) -> Tuple[List[Dict], Optional[str]]:
+    def _extract_survivors(self, results: List, img: np.ndarray, match_result: str = None,
+                           icon_layout: Optional[Tuple[List[Tuple[int, int, int, int]], Dict]] = None
+                           ) -> Tuple[List[Dict], Optional[str]]:
         """サバイバー4人の情報とハンター情報を抽出（画像認識ベース）
 
+        icon_layout に検出済みの (アイコン位置, レイアウト情報) を渡すと位置検出を省略する。
+
         Returns:
             Tuple[List[Dict], Optional[str]]: (サバイバーリスト, ハンター名)
         """
         height, width = img.shape[:2]
-        survivors = []
-        detected_hunter = None
-
-        # 1. キャラアイコンの位置を検出（画面サイズ対応）
-        # 試合結果を渡して、敗北時の位置調整を行う
-        icon_positions = self._detect_icon_positions(img, match_result)
 
         logger.debug(f"[START] Survivor recognition... (Screen size: {width}x{height})")
 
-        # 2. 各位置でアイコンを認識
-        for position, icon_data in enumerate(icon_positions, 1):
-            # ハンター位置を判定
-            # 勝利時: Position 1がハンター
-            # 敗北時: Position 5がハンター
-            if match_result == "敗北":
-                is_hunter_position = (position == 5)
-            else:
-                is_hunter_position = (position == 1)
+        # 1. 帯状領域探索モード: アイコン列全体を1回探索して位置と候補を同時に求める
+        #    （ROI / 高速パスで位置を検出済みの場合はその位置を使い、探索し直さない）
+        located = None
+        layout_info = None
+        if icon_layout is None and _custom_layout.get() is None:
+            from ..config import get_settings
+            if get_settings().ocr_icon_localization == "strip":
+                located = self._locate_icons_in_strip(img)
 
-            logger.debug(f"Position {position} (Expected: {'Hunter' if is_hunter_position else 'Survivor'}):")
+        if located:
+            icon_boxes, slot_candidates = located
+        else:
+            # キャラアイコンの位置を検出（画面サイズ対応）
+            # 試合結果を渡して、敗北時の位置調整を行う
+            if icon_layout is not None:
+                icon_positions, layout_info = icon_layout
+            else:
+                layout_info = {}
+                icon_positions = self._detect_icon_positions(img, match_result, layout_info=layout_info)
 
             # 座標データを展開
-            if len(icon_data) == 4:
-                icon_x, icon_y, icon_w, icon_h = icon_data
-            else:
-                # 古い形式（互換性）
-                icon_x, icon_y = icon_data
-                icon_w = icon_h = int(width * self.layout['icon_size_ratio'])
+            icon_boxes = []
+            for icon_data in icon_positions:
+                if len(icon_data) == 4:
+                    icon_boxes.append(tuple(icon_data))
+                else:
+                    # 古い形式（互換性）
+                    icon_x, icon_y = icon_data
+                    icon_size = int(width * self.layout['icon_size_ratio'])
+                    icon_boxes.append((icon_x, icon_y, icon_size, icon_size))
+            slot_candidates = None
+
+        # ハンター位置を判定
+        # 勝利時: Position 1がハンター
+        # 敗北時: Position 5がハンター
+        hunter_index = len(icon_boxes) - 1 if match_result == "敗北" else 0
+
+        # 2. 全位置のスコアをまとめて計算し、重複の無い組み合わせを決定
+        if slot_candidates is None:
+            device_key = self._calibration_key(layout_info)
+            slot_candidates = self._score_icon_slots(img, icon_boxes, hunter_index, device_key=device_key)
+            self._persist_scale_factor(layout_info, device_key)
+        else:
+            # 帯状領域の候補は両タイプを含むため、位置の役割でフィルタ
+            slot_candidates = [
+                [c for c in candidates if c[1][1] == ("hunter" if slot == hunter_index else "survivor")]
+                for slot, candidates in enumerate(slot_candidates)
+            ]
+        _record_parse_input(icon_boxes=icon_boxes, hunter_index=hunter_index, slot_candidates=slot_candidates)
+        return self._survivors_from_slots(results, icon_boxes, slot_candidates, hunter_index, height)
 
-            survivor = {
-                "position": position,
-                "character": None,
-                "kite_time": None,
-                "decode_progress": None,
-                "board_hits": 0,
-                "rescues": 0,
-                "heals": 0
-            }
+    def _survivors_from_slots(self, results: List, icon_boxes: List[Tuple[int, int, int, int]],
+                              slot_candidates: List[List[Tuple[str, Tuple[float, str]]]], hunter_index: int,
+                              height: int) -> Tuple[List[Dict], Optional[str]]:
+        """位置ごとの候補スコアからキャラクターを決定し、各行の戦績を読み取る（画像を使わない）
 
-            # アイコンを画像認識
-            char_name, char_type = self._match_character_icon(
-                img,
-                icon_x,
-                icon_y,
-                width=icon_w,
-                height=icon_h
-            )
+        Returns:
+            Tuple[List[Dict], Optional[str]]: (サバイバーリスト, ハンター名)
+        """
+        survivors = []
+        detected_hunter = None
+        assignments = self._assign_icon_slots(slot_candidates, hunter_index)
 
-            # ハンター位置の特別処理
+        for position, ((icon_x, icon_y, icon_w, icon_h), (char_name, char_type)) in enumerate(zip(icon_boxes, assignments), 1):
+            is_hunter_position = (position - 1 == hunter_index)
+            logger.debug(f"Position {position} (Expected: {'Hunter' if is_hunter_position else 'Survivor'}):")
+
+            # ハンター位置はサバイバーリストに含めない
             if is_hunter_position:
-                if char_type == "hunter":
+                if char_name:
                     logger.debug(f"  [INFO] Hunter detected: {char_name} - skipping survivor list")
                     detected_hunter = char_name
                 else:
-                    # ハンター位置で認識されたがサバイバーと判定された場合
                     # ハンターアイコンテンプレートが不足している可能性が高い
-                    logger.debug(f"  [INFO] Position {position} recognized as survivor '{char_name}' - assuming this is hunter (icon template missing)")
-                    logger.debug(f"  [INFO] Skipping position {position} (hunter position)")
-                # ハンター位置は常にスキップ
+                    logger.debug(f"  [INFO] Skipping position {position} (hunter position, icon not recognized)")
                 continue
 
-            if char_name:
-                survivor["character"] = char_name
-                survivor["type"] = char_type  # ハンターかサバイバーか
-            else:
+            if not char_name:
                 logger.debug(f"  [FAILED] Could not recognize character icon (position: x={icon_x}, y={icon_y})")
+                continue
 
-            # サバイバーの場合のみデータを取得
-            if char_type == "survivor":
-                # その行のテキストデータを取得
-                row_data = self._get_row_text_data(results, icon_y + icon_h // 2, height)
-                # 数値データを抽出
-                survivor.update(row_data)
+            survivor = {
+                "position": position,
+                "character": char_name,
+                "type": char_type,
+                "kite_time": None,
+                "decode_progress": None,
+                "board_hits": 0,
+                "rescues": 0,
+                "heals": 0
+            }
 
-            # サバイバーのみ追加（ハンターは除外）
-            if survivor["character"] and char_type == "survivor":
-                survivors.append(survivor)
-            elif char_type == "hunter":
-                logger.debug(f"  [INFO] Hunter detected: {char_name} - skipping survivor list")
+            # その行のテキストデータを取得
+            row_data = self._get_row_text_data(results, icon_y + icon_h // 2, height)
+            # 数値データを抽出
+            survivor.update(row_data)
+            survivors.append(survivor)
 
         logger.info(f"[SUCCESS] Recognized {len(survivors)} survivors\n")
         if detected_hunter:
             logger.info(f"[SUCCESS] Hunter detected: {detected_hunter}\n")
 
         return survivors, detected_hunter
-    
+
+    def _score_icon_slots(self, img: np.ndarray, icon_boxes: List[Tuple[int, int, int, int]],
+                          hunter_index: int, device_key: Optional[str] = None) -> List[List[Tuple[str, Tuple[float, str]]]]:
+        """全アイコン位置の候補スコアを計算（位置 × キャラクターのスコア行列）
+
+        サバイバー位置はサバイバーのテンプレートのみ、ハンター位置はハンターのテンプレートのみと照合する。
+        icon_pool があれば位置ごとの照合を並列に実行し、結果は位置の順に集める。
+
+        Returns:
+            位置ごとの [(キャラ名, (スコア, タイプ)), ...]（スコアの降順）
+        """
+        _report_stage("icons")
+        jobs = [
+            (img, box, "hunter" if slot == hunter_index else "survivor", device_key)
+            for slot, box in enumerate(icon_boxes)
+        ]
+        if self.icon_pool is not None and len(jobs) > 1:
+            futures = [self.icon_pool.submit(self._score_icon_slot, *job) for job in jobs]
+            results = [future.result() for future in futures]
+        else:
+            results = [self._score_icon_slot(*job) for job in jobs]
+
+        slot_candidates = []
+        for sorted_scores, factor in results:
+            # スケールの学習は完了順に依らないよう位置の順に反映
+            if factor is not None:
+                self.scale_calibrator.observe(device_key, factor)
+            slot_candidates.append(sorted_scores)
+        return slot_candidates
+
+    def _score_icon_slot(self, img: np.ndarray, icon_box: Tuple[int, int, int, int], char_type: str,
+                         device_key: Optional[str] = None) -> Tuple[List[Tuple[str, Tuple[float, str]]], Optional[float]]:
+        """1位置分の候補スコアを計算
+
+        知覚ハッシュが近いアイコンを認識済みであれば、そのキャラのテンプレート1枚だけで照合して確認し、
+        閾値以上ならその結果を返す。無い場合・確認できない場合はテンプレートマッチングで照合する。
+
+        Returns:
+            ([(キャラ名, (スコア, タイプ)), ...], 観測したスケール補正係数（無ければNone）)
+        """
+        icon_x, icon_y, icon_w, icon_h = icon_box
+
+        # 同じアイコンを認識済みならキャッシュの結果を使う
+        icon_hash = None
+        icon_image = img[max(0, icon_y):icon_y + icon_h, max(0, icon_x):icon_x + icon_w]
+        if self.icon_cache is not None and icon_image.size:
+            icon_hash = icon_phash(icon_image)
+            cached = self.icon_cache.lookup(icon_hash, char_type)
+            if cached is not None:
+                char_name, cached_type, _ = cached
+                score = self._verify_cached_icon(img, icon_box, char_name)
+                if score >= ICON_SCORE_THRESHOLD:
+                    logger.debug(f"  [CACHE] Icon at ({icon_x}, {icon_y}): {char_name} ({score:.2%})")
+                    return [(char_name, (score, cached_type))], None
+                # 知覚ハッシュが似た別のキャラ（衝突）: 全テンプレートで照合し直す
+                self.icon_cache.reject()
+                logger.debug(f"  [CACHE] Icon at ({icon_x}, {icon_y}): cached {char_name} not confirmed "
+                             f"({score:.2%}) - full matching")
+
+        sorted_scores, factor = self._match_icon_slot(img, icon_box, char_type, device_key)
+
+        # 2位と十分な差がある認識結果のみキャッシュする
+        if icon_hash is not None and sorted_scores:
+            best_name, (best_score, best_type) = sorted_scores[0]
+            second_score = sorted_scores[1][1][0] if len(sorted_scores) > 1 else 0.0
+            if best_score >= ICON_SCORE_THRESHOLD and best_score - second_score >= SECOND_PLACE_MARGIN:
+                self.icon_cache.store(icon_hash, best_name, best_type, best_score)
+        return sorted_scores, factor
+
+    def _verify_cached_icon(self, img: np.ndarray, icon_box: Tuple[int, int, int, int], char_name: str) -> float:
+        """キャッシュのキャラのテンプレートのみで照合したスコア（全スケールの最大、未登録なら0）"""
+        scaled_templates = self.template_bank.get(char_name)
+        if not scaled_templates:
+            return 0.0
+        icon_x, icon_y, icon_w, icon_h = icon_box
+        # _rank_icon_candidates と同じ10%のパディングで切り出す
+        padding = int(icon_w * 0.1)
+        icon_region = img[max(0, icon_y - padding):icon_y + icon_h + padding,
+                          max(0, icon_x - padding):icon_x + icon_w + padding]
+        if icon_region.size == 0:
+            return 0.0
+        return self._match_template_with_scales(icon_region.astype(np.float32), scaled_templates)
+
+    def _match_icon_slot(self, img: np.ndarray, icon_box: Tuple[int, int, int, int], char_type: str,
+                         device_key: Optional[str] = None) -> Tuple[List[Tuple[str, Tuple[float, str]]], Optional[float]]:
+        """1位置分をテンプレートマッチングで照合
+
+        device_key を指定すると、端末ごとの学習済みスケール（無ければ期待スケール周辺）から探索し、
+        閾値に届かない場合のみ探索範囲を広げる。
+        """
+        icon_x, icon_y, icon_w, icon_h = icon_box
+        reference_size = self.template_bank.reference_size
+        bands = [None]
+        if device_key is not None:
+            bands = self.scale_calibrator.bands(device_key, icon_w, reference_size, snap=self.template_bank.snap)
+
+        sorted_scores = None
+        for scales in bands:
+            sorted_scores, best_scale = self._rank_icon_candidates(
+                img, icon_x, icon_y, icon_w, icon_h, char_type=char_type, scales=scales
+            )
+            if sorted_scores and sorted_scores[0][1][0] >= ICON_SCORE_THRESHOLD:
+                if device_key is not None and best_scale is not None:
+                    # 実際に一致したスケールと期待スケールの比
+                    return sorted_scores, best_scale * reference_size / icon_w
+                break
+            if scales is not None:
+                logger.debug(f"  [SCALE] Icon at ({icon_x}, {icon_y}): no match in scales {scales} - widening search")
+        return sorted_scores or [], None
+
+    def _calibration_key(self, layout_info: Optional[Dict]) -> Optional[str]:
+        """スケール学習に使う端末キーを決定（学習が無効・対象外の場合はNone）
+
+        学習済みスケールは一括テンプレートマッチング（exhaustive）でのみ使用する。
+        """
+        from ..config import get_settings
+        settings = get_settings()
+        if not layout_info or not settings.ocr_scale_calibration or settings.ocr_icon_matcher != "exhaustive":
+            return None
+
+        device_key = layout_info["key"]
+        db_layout = layout_info.get("db_layout")
+        if db_layout is not None and db_layout.scale_factor:
+            # データベースに保存済みの補正係数から開始
+            self.scale_calibrator.seed(device_key, db_layout.scale_factor)
+        return device_key
+
+    def _persist_scale_factor(self, layout_info: Optional[Dict], device_key: Optional[str]):
+        """学習した補正係数をレイアウトに保存（データベースのレイアウトを使った場合のみ）"""
+        if device_key is None or not self.supabase:
+            return
+        db_layout = layout_info.get("db_layout")
+        factor = self.scale_calibrator.pending_persist(device_key)
+        if db_layout is None or factor is None:
+            return
+        try:
+            from ..layouts.service import LayoutService
+            if LayoutService(self.supabase).update_scale_factor(db_layout.id, factor):
+                self.scale_calibrator.mark_persisted(device_key, factor)
+                logger.info(f"[SUCCESS] Saved scale factor {factor:.3f} to layout {db_layout.id}")
+        except Exception as e:
+            logger.warning(f"[WARNING] Failed to save scale factor: {e}")
+
+    def _assign_icon_slots(self, slot_candidates: List[List[Tuple[str, Tuple[float, str]]]],
+                           hunter_index: int) -> List[Tuple[Optional[str], Optional[str]]]:
+        """同じキャラクターが重複しないように各位置のキャラクターを決定
+
+        閾値以上の候補の中から、スコア合計が最大になる重複無しの組み合わせを選ぶ。
+        各位置で必要な候補は上位（サバイバー数）件のみなので、全組み合わせを調べても数百通りで済む。
+
+        Returns:
+            位置ごとの (キャラ名, タイプ)。認識できない位置は (None, None)
+        """
+        assignments: List[Tuple[Optional[str], Optional[str]]] = [(None, None)] * len(slot_candidates)
+
+        # ハンター位置: 最高スコアのハンターを採用
+        survivor_slots = []
+        for slot, candidates in enumerate(slot_candidates):
+            if slot != hunter_index:
+                survivor_slots.append(slot)
+                continue
+            if candidates:
+                assignments[slot] = self._select_icon_candidate(candidates)
+
+        # サバイバー位置: 閾値以上の上位候補（+ 認識不可）から重複の無い最良の組み合わせを探索
+        options = []
+        for slot in survivor_slots:
+            candidates = slot_candidates[slot]
+            self._select_icon_candidate(candidates)  # 閾値・2位との差のログ出力
+            top = [(name, score, char_type) for name, (score, char_type) in candidates[:len(survivor_slots)]
+                   if score >= ICON_SCORE_THRESHOLD]
+            options.append(top + [(None, 0.0, None)])
+
+        best_total = -1.0
+        best_choice = None
+
+        def search(depth: int, used: set, total: float, chosen: list):
+            nonlocal best_total, best_choice
+            if depth == len(options):
+                if total > best_total:
+                    best_total = total
+                    best_choice = list(chosen)
+                return
+            for name, score, char_type in options[depth]:
+                if name is not None and name in used:
+                    continue
+                chosen.append((name, char_type))
+                search(depth + 1, used | {name} if name else used, total + score, chosen)
+                chosen.pop()
+
+        search(0, set(), 0.0, [])
+
+        for slot, (name, char_type) in zip(survivor_slots, best_choice or []):
+            if name and slot_candidates[slot] and slot_candidates[slot][0][0] != name:
+                logger.debug(f"  [ASSIGN] Position {slot + 1}: '{slot_candidates[slot][0][0]}' is used elsewhere, assigned '{name}'")
+            assignments[slot] = (name, char_type)
+
+        return assignments
+
+    def _select_icon_candidate(self, sorted_scores: List[Tuple[str, Tuple[float, str]]]) -> Tuple[Optional[str], Optional[str]]:
+        """スコア順の候補から閾値と2位との差をチェックして1件を選ぶ"""
+        if not sorted_scores:
+            return None, None
+
+        best_char, (best_score, char_type) = sorted_scores[0]
+
+        # 閾値チェック（最低40%以上）
+        if best_score < ICON_SCORE_THRESHOLD:
+            logger.debug(f"  [FAILED] Score below threshold: {best_score:.2%} < 40%")
+            return None, None
+
+        # 2位との差が小さすぎる場合は信頼性が低いと判断
+        if len(sorted_scores) > 1:
+            second_score = sorted_scores[1][1][0]
+            score_diff = best_score - second_score
+            if score_diff < SECOND_PLACE_MARGIN:  # 5%未満の差
+                logger.warning(f"  [WARNING] Small difference from 2nd place: {score_diff:.2%} (1st: {best_score:.2%}, 2nd: {second_score:.2%})")
+                # それでも採用するが警告を出す
+
+        logger.debug(f"  [RECOGNIZED] [{char_type.upper()}] {best_char} (confidence: {best_score:.2%})")
+        return best_char, char_type
+
     def _get_row_text_data(self, results: List, target_y: int, img_height: int) -> Dict:
         """
         指定Y座標付近のテキストデータから数値情報を抽出
@@ -730,22 +1318,21 @@ class OCRProcessor:
 
         return data
     
-    def _match_template_with_scales(self, icon_region: np.ndarray, original: np.ndarray, scales: List[float]) -> float:
-        """複数スケールでテンプレートマッチングを実行し、最高スコアを返す"""
+    def _match_template_with_scales(self, icon_region: np.ndarray, scaled_templates: List[Tuple[float, np.ndarray]]) -> float:
+        """事前準備済みの複数スケールでテンプレートマッチングを実行し、最高スコアを返す
+
+        Args:
+            icon_region: アイコン領域（float32）
+            scaled_templates: TemplateBankの [(スケール, 正規化済みテンプレート), ...]
+        """
         max_score = 0.0
-        orig_h, orig_w = original.shape[:2]
 
-        for scale in scales:
-            new_size = (int(orig_w * scale), int(orig_h * scale))
-            # サイズが適切な範囲かチェック
-            if not (30 <= new_size[0] <= 150 and 30 <= new_size[1] <= 150):
-                continue
+        for scale, template in scaled_templates:
             # テンプレートがアイコン領域より大きい場合はスキップ
-            if new_size[1] > icon_region.shape[0] or new_size[0] > icon_region.shape[1]:
+            if template.shape[0] > icon_region.shape[0] or template.shape[1] > icon_region.shape[1]:
                 continue
 
             try:
-                template = cv2.resize(original, new_size)
                 result = cv2.matchTemplate(icon_region, template, cv2.TM_CCOEFF_NORMED)
                 _, max_val, _, _ = cv2.minMaxLoc(result)
                 if max_val > max_score:
@@ -755,20 +1342,68 @@ class OCRProcessor:
 
         return max_score
 
-    def _match_character_icon(self, img: np.ndarray, x: int, y: int, width: int = 100, height: int = 100) -> Tuple[Optional[str], Optional[str]]:
+    def _match_icon_cascade(self, icon_region: np.ndarray, icon_box: np.ndarray, top_k: int, resolution: int,
+                            char_type: Optional[str] = None) -> Optional[List[Tuple[str, Tuple[float, str]]]]:
+        """粗密2段階でアイコンを認識
+
+        1段目: 縮小グレースケール画像で全テンプレートを1スケールだけ比較し、上位K件に絞る
+        2段目: 上位K件のみ従来の複数スケールTM_CCOEFF_NORMEDで照合
+
+        Args:
+            icon_region: パディング込みのアイコン領域
+            icon_box: パディング無しのアイコン領域（1段目用）
+            top_k: 2段目に残す候補数
+            resolution: 1段目の縮小サイズ
+            char_type: "survivor" / "hunter" を指定するとそのタイプのテンプレートのみと照合
+
+        Returns:
+            [(キャラ名, (スコア, タイプ)), ...]。1段目の差が小さく絞り込めない場合はNone
+        """
+        members = np.asarray([i for i, t in enumerate(self.template_bank.types)
+                              if char_type is None or t == char_type], dtype=np.intp)
+        if icon_box.size == 0 or len(members) <= top_k:
+            return None
+
+        # 1段目: 縮小画像の正規化相関（1回の行列積）
+        coarse_scores = self.template_bank.coarse_vectors(resolution)[members] @ coarse_vector(icon_box, resolution)
+        order = np.argsort(-coarse_scores, kind="stable")
+        candidates = members[order[:top_k]]
+
+        # 候補外の最上位との差が小さい場合は絞り込みが曖昧なので全探索にフォールバック
+        margin = coarse_scores[order[0]] - coarse_scores[order[top_k]]
+        if margin < SECOND_PLACE_MARGIN:
+            logger.debug(f"  [CASCADE] Ambiguous stage-one margin: {margin:.2%} - falling back to exhaustive search")
+            return None
+
+        # 2段目: 候補のみ複数スケールで照合
+        icon_region = icon_region.astype(np.float32)
+        char_scores = {}
+        for idx in candidates:
+            char_name = self.template_bank.names[idx]
+            max_score_for_char = self._match_template_with_scales(icon_region, self.template_bank.scaled[idx])
+            char_scores[char_name] = (max_score_for_char, self.template_bank.types[idx])
+
+        logger.debug(f"  [CASCADE] Stage two on {len(candidates)}/{len(members)} templates")
+        return sorted(char_scores.items(), key=lambda x: x[1][0], reverse=True)
+
+    def _rank_icon_candidates(self, img: np.ndarray, x: int, y: int, width: int, height: int,
+                              char_type: Optional[str] = None, scales: Optional[Tuple[float, ...]] = None
+                              ) -> Tuple[Optional[List[Tuple[str, Tuple[float, str]]]], Optional[float]]:
         """
-        指定座標周辺のキャラアイコンを画像マッチングで識別
-        ハンターとサバイバーの両方をチェックして、最もマッチするものを返す
+        指定座標周辺のアイコンに対する候補キャラクターをスコア順に返す
 
         Args:
             img: 元画像
             x, y: アイコンの左上座標
             width, height: アイコン領域のサイズ
+            char_type: "survivor" / "hunter" を指定するとそのタイプのテンプレートのみと照合
+            scales: 一括テンプレートマッチングで探索するスケール（省略時は既定の全スケール）
 
         Returns:
-            (キャラクター名, タイプ): タイプは"hunter"または"survivor"
+            ([(キャラ名, (スコア, タイプ)), ...], 1位が一致したスケール)。
+            テンプレート未読み込みなどの場合は (None, None)、スケールが分からない方式ではスケールはNone
         """
-        if not self.survivor_templates and not self.hunter_templates:
+        if not len(self.template_bank):
             logger.warning("[WARNING] Icon templates not loaded")
             return None, None
 
@@ -784,52 +1419,37 @@ class OCRProcessor:
         if icon_region.size == 0:
             return None, None
 
-        # 各キャラクターのベストスコアを記録 (キャラ名: (スコア, タイプ))
-        char_scores = {}
-
-        # マッチング用のスケール（必要時にリサイズ）
-        scales = [0.5, 0.7, 0.9, 1.0, 1.1, 1.3, 1.5]
-
-        # サバイバーをチェック
-        for char_name, original in self.survivor_templates.items():
-            max_score_for_char = self._match_template_with_scales(
-                icon_region, original, scales
-            )
-            char_scores[char_name] = (max_score_for_char, "survivor")
+        from ..config import get_settings
+        settings = get_settings()
 
-        # ハンターをチェック
-        for char_name, original in self.hunter_templates.items():
-            max_score_for_char = self._match_template_with_scales(
-                icon_region, original, scales
+        # キャラクターごとのベストスコアを降順に並べる (キャラ名, (スコア, タイプ))
+        sorted_scores = None
+        icon_box = img[max(0, y):y + height, max(0, x):x + width]
+        if settings.ocr_icon_matcher == "cascade":
+            sorted_scores = self._match_icon_cascade(
+                icon_region, icon_box, settings.ocr_cascade_top_k, settings.ocr_cascade_resolution,
+                char_type=char_type
             )
-            char_scores[char_name] = (max_score_for_char, "hunter")
-
-        # スコアが最も高いキャラクターを選択
-        if not char_scores:
-            return None, None
-
-        # スコアでソート (スコアの数値でソート)
-        sorted_scores = sorted(char_scores.items(), key=lambda x: x[1][0], reverse=True)
-
-        best_char, (best_score, char_type) = sorted_scores[0]
-
-        # 閾値チェック（最低40%以上）
-        if best_score < 0.40:
-            logger.debug(f"  [FAILED] Score below threshold: {best_score:.2%} < 40%")
-            return None, None
-
-        # 2位との差が小さすぎる場合は信頼性が低いと判断
-        if len(sorted_scores) > 1:
-            second_score = sorted_scores[1][1][0]
-            score_diff = best_score - second_score
-            if score_diff < 0.05:  # 5%未満の差
-                logger.warning(f"  [WARNING] Small difference from 2nd place: {score_diff:.2%} (1st: {best_score:.2%}, 2nd: {second_score:.2%})")
-                # それでも採用するが警告を出す
-
-        logger.debug(f"  [RECOGNIZED] [{char_type.upper()}] {best_char} (confidence: {best_score:.2%})")
-        return best_char, char_type
-    
-    def _detect_icon_positions(self, img: np.ndarray, match_result: str = None) -> List[Tuple[int, int]]:
+        elif settings.ocr_icon_matcher == "descriptor":
+            # 記述子1回の計算とk近傍探索のみ（スケール探索なし）
+            sorted_scores = self.descriptor_index.query(icon_box, char_type=char_type) or None
+
+        if sorted_scores is not None:
+            return sorted_scores, None
+
+        # 全テンプレート×全スケールのスコアを1回のバッチ計算で求める
+        scales = tuple(scales) if scales else self.template_bank.scales
+        score_tensor = self.icon_matcher.score(icon_region, char_type=char_type, scales=scales)
+        sorted_scores = self.icon_matcher.rank(score_tensor, char_type=char_type)
+
+        best_scale = None
+        if sorted_scores:
+            best_idx = self.template_bank.index_of(sorted_scores[0][0])
+            best_scale = scales[int(np.argmax(score_tensor[best_idx]))]
+        return sorted_scores, best_scale
+
+    def _detect_icon_positions(self, img: np.ndarray, match_result: str = None,
+                               layout_info: Optional[Dict] = None) -> List[Tuple[int, int]]:
         """
         画像内のキャラアイコンの位置を検出（画面サイズ対応）
 
@@ -839,18 +1459,23 @@ class OCRProcessor:
         Args:
             img: 入力画像
             match_result: 試合結果（敗北時はハンターが最後に表示）
+            layout_info: 指定すると使用したレイアウトの情報を格納する
+                （"key": スケール学習用の端末キー, "db_layout": データベースのレイアウト）
 
         Returns:
             [(x, y, width, height), ...] のリスト（5箇所）
         """
         height, width = img.shape[:2]
         aspect_ratio = width / height
+        if layout_info is None:
+            layout_info = {}
+        device_key = ScaleCalibrator.device_key(width, height)
 
         # アスペクト比に基づいて画面タイプを判定
         logger.debug(f"[SCREEN] Size: {width}x{height}, Aspect ratio: {aspect_ratio:.3f}")
 
         # カスタムレイアウトを優先的に使用
-        custom_layout = getattr(self, '_custom_layout', None)
+        custom_layout = _custom_layout.get()
         if custom_layout and len(custom_layout) == 5:
             logger.info("[CUSTOM LAYOUT] Using provided custom layout")
             positions = []
@@ -867,6 +1492,7 @@ class OCRProcessor:
                 positions.append((x, y, icon_size, icon_size))
 
             logger.debug(f"[SCREEN TYPE] Custom layout")
+            layout_info["key"] = f"custom:{device_key}"
 
             if match_result == "敗北":
                 logger.debug(f"[POSITION] Detecting 5 positions (defeat: survivors 1-4, then hunter)")
@@ -904,6 +1530,8 @@ class OCRProcessor:
                 positions.append((x, y, icon_size, icon_size))
 
             logger.debug(f"[SCREEN TYPE] Database layout (aspect_ratio: {db_layout.aspect_ratio})")
+            layout_info["key"] = f"db:{db_layout.id}"
+            layout_info["db_layout"] = db_layout
 
             if match_result == "敗北":
                 logger.debug(f"[POSITION] Detecting 5 positions (defeat: survivors 1-4, then hunter)")
@@ -918,6 +1546,34 @@ class OCRProcessor:
         # Y座標オフセットを取得（デフォルトは0）
         y_offset = int(height * self.layout.get('icon_y_offset_ratio', 0.0))
 
+        y_positions_ratio, x_ratio, icon_size_ratio, screen_type = self._fallback_layout(aspect_ratio)
+
+        # 相対座標から実座標に変換
+        icon_size = int(width * icon_size_ratio)
+        x_start = int(width * x_ratio)
+
+        logger.debug(f"[SCREEN TYPE] {screen_type}")
+        layout_info["key"] = f"fallback:{device_key}"
+
+        if match_result == "敗北":
+            logger.debug(f"[POSITION] Detecting 5 positions (defeat: survivors 1-4, then hunter)")
+        else:
+            logger.debug(f"[POSITION] Detecting 5 positions (victory: hunter, then survivors 1-4)")
+
+        positions = []
+        for y_ratio in y_positions_ratio:
+            y = int(height * y_ratio + y_offset)
+            x = x_start
+            positions.append((x, y, icon_size, icon_size))
+
+        return positions
+
+    def _fallback_layout(self, aspect_ratio: float) -> Tuple[List[float], float, float, str]:
+        """アスペクト比ベースの既定レイアウト
+
+        Returns:
+            (Y座標の比率リスト, X座標の比率, アイコンサイズの比率, 画面タイプ)
+        """
         # アスペクト比に応じてY座標、X座標、アイコンサイズを調整
         if aspect_ratio > 2.0:
             # iPhone等の横長画面（2556x1179など）
@@ -939,72 +1595,76 @@ class OCRProcessor:
             icon_size_ratio = 0.04
             screen_type = "Other (medium)"
 
-        # 相対座標から実座標に変換
-        icon_size = int(width * icon_size_ratio)
-        x_start = int(width * x_ratio)
+        return y_positions_ratio, x_ratio, icon_size_ratio, screen_type
 
-        logger.debug(f"[SCREEN TYPE] {screen_type}")
+    def _locate_icons_in_strip(self, img: np.ndarray) -> Optional[Tuple[List[Tuple[int, int, int, int]], List[List[Tuple[str, Tuple[float, str]]]]]]:
+        """
+        アイコン列の帯状領域全体を各テンプレートで1回ずつ探索し、位置とキャラクターを同時に求める
 
-        if match_result == "敗北":
-            logger.debug(f"[POSITION] Detecting 5 positions (defeat: survivors 1-4, then hunter)")
-        else:
-            logger.debug(f"[POSITION] Detecting 5 positions (victory: hunter, then survivors 1-4)")
+        帯状領域は self.layout["icon_x_ratio"] とアスペクト比別の既定レイアウトのX範囲を合わせたもの。
+        帯状領域をテンプレートの固定サイズに合わせて縮小するため、テンプレート側のリサイズは不要。
+        応答マップのピークがアイコンの位置、ピークでのスコアが各キャラクターの候補となる。
 
-        positions = []
-        for y_ratio in y_positions_ratio:
-            y = int(height * y_ratio + y_offset)
-            x = x_start
-            positions.append((x, y, icon_size, icon_size))
-
-        return positions
-    
-    def _auto_detect_icons(self, img: np.ndarray, x_min: int, x_max: int, 
-                          y_min: int, y_max: int) -> List[Tuple[int, int, int, int]]:
-        """
-        輪郭検出でアイコン位置を自動検出
-        
         Returns:
-            [(x, y, width, height), ...] のリスト
+            ([(x, y, width, height), ...], 位置ごとの候補リスト)。5箇所見つからない場合はNone
         """
-        # 検出エリアを切り出し
-        roi = img[y_min:y_max, x_min:x_max]
-        
-        # グレースケール化
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-        
-        # エッジ検出
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # 輪郭検出
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # アイコンらしい矩形を抽出
-        icon_candidates = []
-        for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            
-            # フィルタリング条件
-            area = w * h
-            aspect_ratio = w / h if h > 0 else 0
-            
-            # アイコンの条件:
-            # - 面積が適切（画像の0.3%~3%）
-            # - アスペクト比が正方形に近い（0.8~1.2）
-            # - X座標が左側
-            img_area = roi.shape[0] * roi.shape[1]
-            
-            if (0.003 < area / img_area < 0.03 and
-                0.8 < aspect_ratio < 1.2 and
-                x < roi.shape[1] * 0.3):  # 左側30%以内
-                
-                # 元画像での座標に変換
-                abs_x = x_min + x
-                abs_y = y_min + y
-                icon_candidates.append((abs_x, abs_y, w, h))
-        
-        # Y座標でソート（上から順）
-        icon_candidates.sort(key=lambda c: c[1])
-        
-        # 最大4個まで
-        return icon_candidates[:4]
+        if not len(self.template_bank):
+            return None
 
+        height, width = img.shape[:2]
+        y_positions_ratio, x_ratio, icon_size_ratio, _ = self._fallback_layout(width / height)
+        expected_size = width * icon_size_ratio
+        margin = expected_size * 0.5
+
+        # 帯状領域（X: 設定と既定レイアウトの和、Y: 既定レイアウトの上端～下端）
+        x1 = int(max(0, min(self.layout["icon_x_ratio"][0], x_ratio) * width - margin))
+        x2 = int(min(width, max(self.layout["icon_x_ratio"][1], x_ratio + icon_size_ratio) * width + margin))
+        y1 = int(max(0, y_positions_ratio[0] * height - margin))
+        y2 = int(min(height, y_positions_ratio[-1] * height + expected_size + height * 0.02 + margin))
+
+        # テンプレートの固定サイズに合わせて帯状領域を縮小
+        factor = STRIP_TEMPLATE_SIZE / expected_size
+        strip = cv2.resize(img[y1:y2, x1:x2], None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if strip.shape[0] < STRIP_TEMPLATE_SIZE or strip.shape[1] < STRIP_TEMPLATE_SIZE:
+            return None
+        strip = strip.astype(np.float32)
+
+        # 全テンプレートの応答マップ（OpenCV内部で並列化される）
+        responses = np.stack([
+            cv2.matchTemplate(strip, template, cv2.TM_CCOEFF_NORMED)
+            for template in self.template_bank.strip_templates
+        ])
+        best_map = responses.max(axis=0)
+
+        # ピーク検出（アイコン1個分の範囲を抑制しながら上位5箇所）
+        suppress = int(STRIP_TEMPLATE_SIZE * 0.6)
+        peaks = []
+        work = best_map.copy()
+        for _ in range(5):
+            _, peak_score, _, (px, py) = cv2.minMaxLoc(work)
+            if peak_score < ICON_SCORE_THRESHOLD:
+                break
+            peaks.append((px, py))
+            work[max(0, py - suppress):py + suppress + 1, max(0, px - suppress):px + suppress + 1] = -1.0
+
+        if len(peaks) < 5:
+            logger.info(f"[STRIP] Found only {len(peaks)} icon peaks - falling back to layout")
+            return None
+
+        # 上から順に並べ、元画像の座標に戻す
+        peaks.sort(key=lambda p: p[1])
+        icon_size = int(round(STRIP_TEMPLATE_SIZE / factor))
+        icon_boxes = []
+        slot_candidates = []
+        for px, py in peaks:
+            icon_boxes.append((x1 + int(round(px / factor)), y1 + int(round(py / factor)), icon_size, icon_size))
+            # ピーク近傍（±1ピクセル）での各テンプレートの最高スコア
+            window = responses[:, max(0, py - 1):py + 2, max(0, px - 1):px + 2]
+            scores = window.reshape(len(responses), -1).max(axis=1)
+            candidates = {}
+            for idx in np.argsort(-scores, kind="stable"):
+                candidates.setdefault(self.template_bank.names[idx], (float(scores[idx]), self.template_bank.types[idx]))
+            slot_candidates.append(sorted(candidates.items(), key=lambda x: x[1][0], reverse=True))
+
+        logger.info(f"[STRIP] Located {len(icon_boxes)} icons in strip x={x1}-{x2}, y={y1}-{y2}")
+        return icon_boxes, slot_candidates
@@ -0,0 +1,253 @@
+"""
+yomitokuのint8動的量子化と精度ゲート
+
+検出器・認識器の Linear / LSTM 層の重みをint8にして保存し、ocr_inference_backend="int8" のときは
+floatの事前学習済み重みの代わりに読み込む（推論が速くなり、ワーカーあたりのメモリが減る）。
+量子化で項目の抽出精度が下がっていないことを正解付きのスクリーンショットで確認し、
+合格マーカーが現在の重みと一致する場合のみ使用する（一致しなければfloatで推論する）。
+
+正解ディレクトリには画像（.png / .jpg）と、同じ名前の .json に process_image の結果のうち
+確認したい項目を置く。例: {"result": "勝利", "map_name": "軍需工場", "hunter_character": "復讐者", "survivors": [{"character": "祭司"}]}
+
+使い方（backendディレクトリで実行）:
+    python -m app.ocr.quantization build
+    python -m app.ocr.quantization gate <正解ディレクトリ> [許容する正解率の低下]
+"""
+import hashlib
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 量子化するyomitokuのモジュール（DocumentAnalyzerの属性名）
+QUANTIZED_MODULES = ("text_detector", "text_recognizer")
+QUANTIZED_FORMAT_VERSION = 1
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg")
+
+
+def quantized_weights_path() -> Path:
+    from ..config import get_settings
+    return Path(get_settings().ocr_quantized_weights)
+
+
+def gate_marker_path(weights_path: Path) -> Path:
+    return weights_path.with_suffix(".gate.json")
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def quantize_module(model):
+    """Linear / LSTM / GRU の重みをint8にする（活性は推論時に動的に量子化）
+
+    畳み込みは動的量子化の対象外のため、検出器（DBNet）では一部の層のみが変わる。
+    """
+    import torch  # type: ignore
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8
+    )
+
+
+def _model_names(analyzer) -> Dict[str, str]:
+    return {name: getattr(analyzer, name)._cfg.hf_hub_repo for name in QUANTIZED_MODULES}
+
+
+def _parameter_bytes(model) -> int:
+    """モデルの重みのバイト数（量子化済みの層はstate_dictの量子化テンソルで数える）"""
+    import torch  # type: ignore
+    total = 0
+    for value in model.state_dict().values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        total += sum(t.numel() * t.element_size() for t in tensors if isinstance(t, torch.Tensor))
+    return total
+
+
+def save_quantized_weights(analyzer, path: Path) -> Dict[str, Tuple[int, int]]:
+    """floatのアナライザーを量子化して重みを保存
+
+    Returns:
+        {モジュール名: (量子化前のバイト数, 量子化後のバイト数)}
+    """
+    import torch  # type: ignore
+
+    sizes = {}
+    state_dicts = {}
+    for name in QUANTIZED_MODULES:
+        module = getattr(analyzer, name)
+        before = _parameter_bytes(module.model)
+        module.model = quantize_module(module.model).eval()
+        state_dicts[name] = module.model.state_dict()
+        sizes[name] = (before, _parameter_bytes(module.model))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({
+        "version": QUANTIZED_FORMAT_VERSION,
+        "torch": torch.__version__,
+        "models": _model_names(analyzer),
+        "state_dicts": state_dicts,
+    }, path)
+    # 重みが変わったため、以前の合格マーカーは無効
+    gate_marker_path(path).unlink(missing_ok=True)
+    return sizes
+
+
+def load_quantized_weights(analyzer, path: Path) -> bool:
+    """量子化済みの重みを読み込み、アナライザーのモデルを置き換える
+
+    アナライザーは事前学習済みの重みを読まずに（from_pretrained=False で）作っておく。
+    モデルや形式が一致しない場合はFalse。
+    """
+    import torch  # type: ignore
+
+    # 自分で作成したファイルのみを読む（量子化テンソルを含むため weights_only は使わない）
+    payload = torch.load(path, map_location="cpu", weights_only=False)
+    if payload.get("version") != QUANTIZED_FORMAT_VERSION or payload.get("models") != _model_names(analyzer):
+        logger.warning(f"[WARNING] Quantized weights {path} were built for different models - rebuild required")
+        return False
+
+    for name in QUANTIZED_MODULES:
+        module = getattr(analyzer, name)
+        model = quantize_module(module.model)
+        model.load_state_dict(payload["state_dicts"][name])
+        module.model = model.eval()
+    return True
+
+
+def quantized_weights_approved(path: Path) -> bool:
+    """量子化済みの重みがあり、その重みで精度ゲートに合格しているか"""
+    marker = gate_marker_path(path)
+    if not path.exists() or not marker.exists():
+        return False
+    try:
+        gate = json.loads(marker.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return gate.get("passed") is True and gate.get("weights_sha256") == _file_sha256(path)
+
+
+def _flatten(data, prefix: str = "") -> Iterator[Tuple[str, object]]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}{key}.")
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            yield from _flatten(value, f"{prefix}{index}.")
+    else:
+        yield prefix.rstrip("."), data
+
+
+def field_matches(expected: Dict, actual: Dict) -> Tuple[int, int]:
+    """正解の各項目のうち、抽出結果と一致した数 (一致数, 項目数)"""
+    actual_fields = dict(_flatten(actual))
+    expected_fields = list(_flatten(expected))
+    matched = sum(1 for key, value in expected_fields if actual_fields.get(key) == value)
+    return matched, len(expected_fields)
+
+
+def load_golden_set(golden_dir: Path) -> List[Tuple[Path, Dict]]:
+    """正解ディレクトリから (画像のパス, 正解) のリストを読む"""
+    samples = []
+    for image_path in sorted(golden_dir.iterdir()):
+        if image_path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        expected_path = image_path.with_suffix(".json")
+        if not expected_path.exists():
+            logger.warning(f"[WARNING] No expected result for {image_path.name}, skipped")
+            continue
+        samples.append((image_path, json.loads(expected_path.read_text(encoding="utf-8"))))
+    return samples
+
+
+def evaluate_backend(backend: str, samples: List[Tuple[Path, Dict]], templates_path: str) -> Dict:
+    """指定した推論方式のOCRProcessorで正解セットを処理し、項目の正解率と処理時間を返す"""
+    from .processor import OCRProcessor, create_yomitoku_analyzer
+
+    processor = OCRProcessor(templates_path=templates_path)
+    # 評価用の画像のOCR結果は再抽出用に保存しない
+    processor.raw_blocks = None
+    processor.preload_analyzer(create_yomitoku_analyzer(backend, require_gate=False))
+    processor.warm_up()
+
+    matched = total = 0
+    failures = []
+    elapsed = []
+    for image_path, expected in samples:
+        start = time.perf_counter()
+        actual = processor.process_image(image_path.read_bytes())
+        elapsed.append(time.perf_counter() - start)
+        ok, count = field_matches(expected, actual)
+        matched += ok
+        total += count
+        if ok < count:
+            failures.append(image_path.name)
+
+    processor.ocr_workers.stop()
+    return {
+        "accuracy": matched / total if total else 0.0,
+        "fields": total,
+        "mean_seconds": sum(elapsed) / len(elapsed) if elapsed else 0.0,
+        "failures": failures,
+    }
+
+
+def run_gate(golden_dir: Path, tolerance: float = 0.0, templates_path: str = "templates/icons") -> bool:
+    """float と int8 の抽出結果を正解セットで比較し、int8 の正解率が下がっていなければ合格マーカーを書く"""
+    weights = quantized_weights_path()
+    if not weights.exists():
+        logger.error(f"[ERROR] Quantized weights {weights} not found - run `python -m app.ocr.quantization build` first")
+        return False
+    samples = load_golden_set(golden_dir)
+    if not samples:
+        logger.error(f"[ERROR] No golden samples in {golden_dir}")
+        return False
+
+    baseline = evaluate_backend("float", samples, templates_path)
+    quantized = evaluate_backend("int8", samples, templates_path)
+    passed = quantized["accuracy"] >= baseline["accuracy"] - tolerance
+    logger.info(f"[GATE] float: {baseline['accuracy']:.1%} of {baseline['fields']} fields, {baseline['mean_seconds']:.2f}s/img")
+    logger.info(f"[GATE] int8:  {quantized['accuracy']:.1%} of {quantized['fields']} fields, {quantized['mean_seconds']:.2f}s/img")
+    if quantized["failures"]:
+        logger.info(f"[GATE] int8 mismatches: {', '.join(quantized['failures'])}")
+
+    marker = gate_marker_path(weights)
+    if passed:
+        marker.write_text(json.dumps({
+            "passed": True,
+            "weights_sha256": _file_sha256(weights),
+            "images": len(samples),
+            "tolerance": tolerance,
+            "float": baseline,
+            "int8": quantized,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        logger.info(f"[SUCCESS] Accuracy gate passed - int8 weights approved ({marker})")
+    else:
+        marker.unlink(missing_ok=True)
+        logger.error("[ERROR] Accuracy gate failed - int8 weights will not be used")
+    return passed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+
+    if command == "build":
+        from .processor import create_yomitoku_analyzer
+        target = quantized_weights_path()
+        sizes = save_quantized_weights(create_yomitoku_analyzer("float"), target)
+        for name, (before, after) in sizes.items():
+            logger.info(f"[SUCCESS] {name}: {before / 1e6:.1f}MB -> {after / 1e6:.1f}MB")
+        logger.info(f"[SUCCESS] Saved quantized weights to {target} - run the accuracy gate before enabling int8")
+    elif command == "gate" and len(sys.argv) > 2:
+        tolerance = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+        sys.exit(0 if run_gate(Path(sys.argv[2]), tolerance) else 1)
+    else:
+        sys.exit(__doc__)
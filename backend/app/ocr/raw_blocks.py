@@ -0,0 +1,258 @@
+"""
+OCR結果（テキストブロック）とアイコンの候補スコアの保存・再解析
+
+解析ごとに、正規化済みのテキストブロック (bbox, text, confidence)・アイコン位置・
+位置ごとのアイコン候補スコアと、その時の抽出結果を画像のハッシュをキーに列形式の .npz で保存する。
+抽出処理（_parse_match_data / _get_row_text_data など）を修正した後は、yomitokuもテンプレート照合も
+実行せずに保存済みのデータから再抽出できる（過去の結果の再計算・抽出処理の回帰確認）。
+
+アイコン位置と候補スコアは保存時の勝敗で決まったハンター位置のものを使うため、
+再抽出で勝敗が変わりハンター位置が変わる画像は再解析（OCR）が必要（icons_stale として報告する）。
+
+使い方（backendディレクトリで実行）:
+    python -m app.ocr.raw_blocks reparse [結果の出力先.ndjson]
+"""
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RAW_BLOCKS_VERSION = 1
+# 位置ごとに保存するアイコン候補の数
+CANDIDATES_PER_SLOT = 8
+# 変更を一覧表示する最大件数（CLI）
+MAX_REPORTED_CHANGES = 20
+
+
+def raw_block_key(image_bytes: bytes) -> str:
+    """保存のキー（画像バイト列のSHA-256）"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _text_dtype(values: List[str]) -> str:
+    return f"<U{max([len(v) for v in values] + [1])}"
+
+
+def encode_record(record: Dict, match_data: Dict) -> Dict[str, np.ndarray]:
+    """解析中に記録した入力と抽出結果を列形式の配列にする
+
+    record: {"image_size": (幅, 高さ), "blocks": [(bbox, text, conf), ...],
+             "icon_boxes": [(x, y, w, h), ...], "hunter_index": int,
+             "slot_candidates": [[(キャラ名, (スコア, タイプ)), ...], ...]}
+    候補は位置ごとにスコア上位 CANDIDATES_PER_SLOT 件のみ保存する（組み合わせの決定で使うのは上位のみ）。
+    """
+    blocks = record.get("blocks", [])
+    texts = [str(text) for _, text, _ in blocks]
+    block_array = np.zeros(len(blocks), dtype=[("bbox", "<f4", (4, 2)), ("text", _text_dtype(texts)), ("conf", "<f4")])
+    for i, (bbox, _, conf) in enumerate(blocks):
+        block_array[i] = (np.asarray(bbox, dtype=np.float32).reshape(4, 2), texts[i], conf)
+
+    candidates = [
+        (slot, name, score, char_type)
+        for slot, slot_scores in enumerate(record.get("slot_candidates", []))
+        for name, (score, char_type) in slot_scores[:CANDIDATES_PER_SLOT]
+    ]
+    candidate_array = np.array(candidates, dtype=[
+        ("slot", "<i2"), ("name", _text_dtype([c[1] for c in candidates])),
+        ("score", "<f4"), ("type", _text_dtype([c[3] for c in candidates])),
+    ])
+
+    width, height = record["image_size"]
+    return {
+        "meta": np.array([RAW_BLOCKS_VERSION, width, height, record.get("hunter_index", 0)], dtype=np.int32),
+        "blocks": block_array,
+        "icon_boxes": np.array(record.get("icon_boxes", []), dtype=np.int32).reshape(-1, 4),
+        "candidates": candidate_array,
+        "result": np.array(json.dumps(match_data, ensure_ascii=False)),
+    }
+
+
+def decode_record(arrays) -> Dict:
+    """encode_record の逆（再抽出の入力と保存時の抽出結果）"""
+    _, width, height, hunter_index = arrays["meta"].tolist()
+    boxes = [tuple(box) for box in arrays["icon_boxes"].tolist()]
+    slot_candidates: List[List[Tuple[str, Tuple[float, str]]]] = [[] for _ in boxes]
+    for slot, name, score, char_type in arrays["candidates"].tolist():
+        slot_candidates[slot].append((name, (score, char_type)))
+    return {
+        "image_size": (width, height),
+        "blocks": arrays["blocks"].tolist(),
+        "icon_boxes": boxes,
+        "hunter_index": hunter_index,
+        "slot_candidates": slot_candidates,
+        "result": json.loads(str(arrays["result"])),
+    }
+
+
+class RawBlockStore:
+    """画像のハッシュごとに <directory>/<キーの先頭2文字>/<キー>.npz として保存する
+
+    保存時に、合計サイズが max_bytes を超えた分と max_age_seconds より古いものを
+    保存日時の古い順に削除する（0は無制限）。ファイルの一覧は最初の保存時に読み込む。
+    """
+
+    def __init__(self, directory, max_bytes: int = 0, max_age_seconds: float = 0):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._index: "Optional[OrderedDict[str, Tuple[int, float]]]" = None  # キー -> (サイズ, 保存時刻)（古い順）
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.npz"
+
+    def _load_index(self):
+        entries = []
+        for path in self.directory.glob("*/*.npz"):
+            if path.name.endswith(".tmp.npz"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        self._index = OrderedDict()
+        self._bytes = 0
+        for mtime, key, size in sorted(entries):
+            self._index[key] = (size, mtime)
+            self._bytes += size
+
+    def save(self, key: str, record: Dict, match_data: Dict):
+        """記録を保存（失敗しても解析は続ける）"""
+        if "image_size" not in record:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp.npz")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez_compressed(tmp, **encode_record(record, match_data))
+            tmp.replace(path)
+            size = path.stat().st_size
+        except (OSError, ValueError) as e:
+            logger.warning(f"[WARNING] Failed to save raw OCR blocks ({key[:12]}): {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        if self.max_bytes <= 0 and self.max_age_seconds <= 0:
+            return
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            previous = self._index.pop(key, None)
+            self._bytes += size - (previous[0] if previous else 0)
+            self._index[key] = (size, time.time())
+            self._evict()
+
+    def _evict(self):
+        """上限を超えた分・保存期間を過ぎたものを古い順に削除"""
+        expires = time.time() - self.max_age_seconds if self.max_age_seconds > 0 else None
+        while self._index:
+            key, (size, saved_at) = next(iter(self._index.items()))
+            over_size = self.max_bytes > 0 and self._bytes > self.max_bytes
+            expired = expires is not None and saved_at < expires
+            if not over_size and not expired:
+                break
+            self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            self._path(key).unlink(missing_ok=True)
+
+    def load(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays["meta"][0]) != RAW_BLOCKS_VERSION:
+                return None
+            return decode_record(arrays)
+
+    def keys(self) -> Iterator[str]:
+        for path in sorted(self.directory.glob("*/*.npz")):
+            if not path.name.endswith(".tmp.npz"):
+                yield path.stem
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.keys())
+
+
+@lru_cache()
+def get_raw_block_store() -> Optional[RawBlockStore]:
+    """設定の保存先（保存が無効の場合はNone）"""
+    from ..config import get_settings
+    settings = get_settings()
+    if not settings.ocr_raw_blocks:
+        return None
+    return RawBlockStore(
+        settings.ocr_raw_blocks_dir,
+        max_bytes=settings.ocr_raw_blocks_max_mb * 1024 * 1024,
+        max_age_seconds=settings.ocr_raw_blocks_max_days * 86400,
+    )
+
+
+def _changed_fields(before: Dict, after: Dict) -> List[str]:
+    return sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+
+
+def reparse_all(processor, store: RawBlockStore, output: Optional[Path] = None) -> Dict:
+    """保存済みの全画像を現在の抽出処理で再抽出し、保存時の結果との差分を集計"""
+    total = changed = stale = 0
+    changes = []
+    start = time.perf_counter()
+    out = open(output, "w", encoding="utf-8") if output else None
+    try:
+        for key in store.keys():
+            record = store.load(key)
+            if record is None:
+                continue
+            result, icons_stale = processor.reparse(record)
+            total += 1
+            stale += icons_stale
+            fields = _changed_fields(record["result"], result)
+            if fields:
+                changed += 1
+                if len(changes) < MAX_REPORTED_CHANGES:
+                    changes.append((key, fields))
+            if out:
+                out.write(json.dumps({"image_hash": key, "result": result, "changed": fields,
+                                      "icons_stale": icons_stale}, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "images": total,
+        "changed": changed,
+        "icons_stale": stale,
+        "seconds": elapsed,
+        "images_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "changes": changes,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "reparse":
+        sys.exit(__doc__)
+
+    from .processor import OCRProcessor
+    store = get_raw_block_store() or RawBlockStore("data/ocr_blocks")
+    processor = OCRProcessor(templates_path="templates/icons")
+    # 1画像ごとの抽出ログを抑える
+    logging.getLogger("app.ocr.processor").setLevel(logging.ERROR)
+
+    summary = reparse_all(processor, store, Path(sys.argv[2]) if len(sys.argv) > 2 else None)
+    for key, fields in summary["changes"]:
+        print(f"{key[:16]}  changed: {', '.join(fields)}")
+    print(f"{summary['images']} images in {summary['seconds']:.2f}s ({summary['images_per_second']:.0f} img/s), "
+          f"{summary['changed']} changed, {summary['icons_stale']} need re-OCR (hunter position changed)")
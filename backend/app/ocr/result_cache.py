@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 解析結果の形式・抽出処理のバージョン（process_image の結果が変わる修正をしたら上げる）
+PROCESSOR_VERSION = 1
+# 結果に影響する設定（変わるとキャッシュのキーが変わる）
+RESULT_SETTINGS = (
+    "ocr_lite_mode", "ocr_inference_backend", "ocr_icon_matcher", "ocr_cascade_top_k", "ocr_cascade_resolution",
+    "ocr_icon_localization", "ocr_roi_mode", "ocr_roi_top_ratio", "ocr_cell_fast_path", "ocr_glyph_recognizer",
+    "ocr_glyph_min_score",
+)
+
+# データベースのレイアウトの状態を取得し直すまでの時間（秒）
+# このプロセスでの保存・投票はすぐに反映し（invalidate_layout_version）、他のインスタンスでの変更はこの時間内に反映する
+LAYOUT_VERSION_TTL = 30
+
+# (レイアウトの状態, 取得した時刻)
+_layout_version: Optional[Tuple[str, float]] = None
+
+
+def layout_version(supabase) -> Optional[str]:
+    """データベースのレイアウトの状態（キャッシュのキーに含める）
+
+    既定の解析はデータベースのレイアウトでアイコン位置を決めるため、レイアウトが修正されたら
+    同じ画像でも別のキーにする。Supabaseクライアントが無ければ "-"、取得に失敗した場合は
+    None（キャッシュを使わない）。データベースへの問い合わせを行うためイベントループ外で呼ぶ。
+    """
+    global _layout_version
+    if supabase is None:
+        return "-"
+    cached = _layout_version
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < LAYOUT_VERSION_TTL:
+        return cached[0]
+
+    from ..layouts.service import LayoutService
+    try:
+        version = LayoutService(supabase).layouts_version()
+    except Exception as e:
+        logger.warning(f"[WARNING] Failed to read layout version, bypassing OCR result cache: {e}")
+        return None
+    _layout_version = (version, now)
+    return version
+
+
+def invalidate_layout_version():
+    """レイアウトの保存・投票後に呼ぶ（次の解析でレイアウトの状態を取得し直す）"""
+    global _layout_version
+    _layout_version = None
+
+
+def processor_fingerprint(templates_path) -> str:
+    """解析結果に影響するもの（処理のバージョン・設定・アイコンテンプレート）のハッシュ"""
+    from ..config import get_settings
+    from .template_artifact import icon_template_files
+
+    settings = get_settings()
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "version": PROCESSOR_VERSION,
+        "settings": {name: getattr(settings, name) for name in RESULT_SETTINGS},
+    }, sort_keys=True).encode())
+    for char_name, char_type, path in icon_template_files(Path(templates_path)):
+        stat = path.stat()
+        digest.update(f"{char_type}/{char_name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class OCRResultCache:
+    """画像の内容から引く解析結果のキャッシュ（メモリのLRU + サイズ上限付きのディスク）
+
+    キーは画像のハッシュ（raw_blocks.raw_block_key と共通）・カスタムレイアウト・
+    データベースのレイアウトの状態（layout_version）・processor_fingerprint のSHA-256。
+    同じスクリーンショットの再アップロードはOCRを実行せずに結果を返す。
+    ディスクは <directory>/<キーの先頭2文字>/<キー>.json に保存し、合計サイズが上限を超えると
+    最後に使われたのが古いものから削除する。
+    """
+
+    def __init__(self, directory, fingerprint: str, memory_entries: int = 256, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # キー -> ファイルサイズ（古い順）
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self):
+        """ディスク上のエントリを最終使用時刻の古い順に読み込む"""
+        if self.disk_max_bytes <= 0:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def key(self, image_hash: str, custom_layout: Optional[List[Dict]] = None, layouts: str = "-") -> str:
+        digest = hashlib.sha256(image_hash.encode())
+        digest.update(json.dumps(custom_layout, sort_keys=True).encode() if custom_layout else b"-")
+        # カスタムレイアウトの場合はデータベースのレイアウトを使わない
+        digest.update(b"-" if custom_layout else layouts.encode())
+        digest.update(self.fingerprint.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(data)
+            in_disk = key in self._disk
+
+        if in_disk:
+            path = self._path(key)
+            try:
+                data = path.read_text(encoding="utf-8")
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._remember(key, data)
+                return json.loads(data)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict):
+        data = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, data)
+        if self.disk_max_bytes <= 0:
+            return
+
+        path = self._path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"[WARNING] Failed to write OCR result cache entry: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            size = len(data.encode("utf-8"))
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _remember(self, key: str, data: str):
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions += 1
+            self._path(key).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else None,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk),
+                "disk_mb": round(self._disk_bytes / 1e6, 2),
+                "evictions": self.evictions,
+                "fingerprint": self.fingerprint,
+            }
+
+
+# 複数のスレッドから同時に初期化しないようにする
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache(templates_path: str) -> Optional[OCRResultCache]:
+    """解析結果のキャッシュ（無効の場合はNone、初回はディレクトリを走査するためイベントループ外で呼ぶ）"""
+    with _result_cache_lock:
+        return _create_result_cache(templates_path)
+
+
+@lru_cache()
+def _create_result_cache(templates_path: str) -> Optional[OCRResultCache]:
+    from ..config import get_settings
+
+    settings = get_settings()
+    if not settings.ocr_result_cache:
+        return None
+    cache = OCRResultCache(
+        settings.ocr_result_cache_dir,
+        processor_fingerprint(templates_path),
+        memory_entries=settings.ocr_result_cache_entries,
+        disk_max_bytes=settings.ocr_result_cache_max_mb * 1024 * 1024,
+    )
+    logger.info(f"[INFO] OCR result cache: {cache.stats()['disk_entries']} entries on disk ({cache.fingerprint})")
+    return cache
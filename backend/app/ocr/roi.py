@@ -0,0 +1,81 @@
+import numpy as np
+from typing import List, Tuple
+
+# 結果画面で文字を読む領域（画面比率）
+# 勝敗バナー・マップ名・日時・使用時間は上部、戦績はアイコン行の右側にある
+TOP_BAND_RATIO = 0.4
+# 行のテキストを集める範囲（_get_row_text_data の許容範囲と同じ画面高さの±8%）
+ROW_TOLERANCE_RATIO = 0.08
+# 切り出した領域同士の間隔（ピクセル）。テキスト検出が領域をまたいで行を繋げないようにする
+REGION_GAP = 32
+
+Rect = Tuple[int, int, int, int]
+
+
+def roi_rectangles(width: int, height: int, icon_boxes: List[Tuple[int, int, int, int]],
+                   top_ratio: float = TOP_BAND_RATIO, row_tolerance: float = ROW_TOLERANCE_RATIO) -> List[Rect]:
+    """OCRが必要な領域を重なりの無い矩形 (x1, y1, x2, y2) のリストで返す
+
+    上部の帯（全幅）と、アイコン行ごとの帯（アイコンの左端から右端まで）を求め、
+    重なる部分は1つにまとめる。上部の帯と重なる行の部分は上部の帯に含まれる。
+    """
+    top = int(height * top_ratio)
+    rects: List[Rect] = [(0, 0, width, top)] if top > 0 else []
+
+    tolerance = int(height * row_tolerance)
+    rows = []
+    row_x = width
+    for icon_x, icon_y, icon_w, icon_h in icon_boxes:
+        center_y = icon_y + icon_h // 2
+        y1 = max(top, center_y - tolerance)
+        y2 = min(height, center_y + tolerance)
+        if y2 > y1:
+            rows.append((y1, y2))
+        row_x = min(row_x, max(0, icon_x))
+
+    # 重なる行の帯を結合
+    merged: List[List[int]] = []
+    for y1, y2 in sorted(rows):
+        if merged and y1 <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], y2)
+        else:
+            merged.append([y1, y2])
+    rects.extend((row_x, y1, width, y2) for y1, y2 in merged)
+    return rects
+
+
+def stitch_regions(img: np.ndarray, rects: List[Rect],
+                   gap: int = REGION_GAP) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """矩形領域を縦に並べた1枚の画像を作る（1回のOCRでまとめて処理するため）
+
+    Returns:
+        (合成画像, [(合成画像内のY座標, 元画像のX座標, 元画像のY座標, 高さ), ...])
+    """
+    out_width = max(x2 - x1 for x1, _, x2, _ in rects)
+    out_height = sum(y2 - y1 for _, y1, _, y2 in rects) + gap * (len(rects) - 1)
+    composite = np.zeros((out_height, out_width) + img.shape[2:], dtype=img.dtype)
+
+    placements = []
+    offset = 0
+    for x1, y1, x2, y2 in rects:
+        composite[offset:offset + y2 - y1, :x2 - x1] = img[y1:y2, x1:x2]
+        placements.append((offset, x1, y1, y2 - y1))
+        offset += y2 - y1 + gap
+    return composite, placements
+
+
+def map_results_back(results: List, placements: List[Tuple[int, int, int, int]]) -> List:
+    """合成画像上のOCR結果 [(bbox, text, conf), ...] を元画像の座標に戻す
+
+    テキストの中心が含まれる領域の位置ずれを各頂点に加える。どの領域にも含まれない
+    （間隔部分の）結果は捨てる。
+    """
+    mapped = []
+    for bbox, text, conf in results:
+        center_y = (bbox[0][1] + bbox[2][1]) / 2
+        for comp_y, src_x, src_y, region_h in placements:
+            if comp_y <= center_y < comp_y + region_h:
+                dy = src_y - comp_y
+                mapped.append(([[x + src_x, y + dy] for x, y in bbox], text, conf))
+                break
+    return mapped
@@ -1,12 +1,20 @@
 import asyncio
 import logging
+import threading
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from typing import List, Dict, Optional
+from fastapi.responses import StreamingResponse
+from typing import Callable, List, Dict, Optional
 from pathlib import Path
 from ..auth.dependencies import get_current_user
 from ..matches.schemas import AnalyzeResponse, SurvivorData
 from ..database import get_supabase
 from .processor import OCRProcessor
+from .jobs import JobStore, OCRJobQueue, QueueFullError, FINISHED_STATES
+from .process_pool import OCRPoolUnavailableError
+from .scheduler import SchedulerFullError, get_scheduler
+from .result_cache import get_result_cache, layout_version
+from .raw_blocks import get_raw_block_store, raw_block_key
 import json
 
 logger = logging.getLogger(__name__)
@@ -16,24 +24,285 @@ router = APIRouter(prefix="/api/matches", tags=["ocr"])
 # ファイルサイズ制限（10MB）
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# backend/app/ocr/router.py から backend/templates/icons への相対パス
+TEMPLATES_PATH = Path(__file__).parent.parent.parent / "templates" / "icons"
+
+# ユーザーIDの無い解析（CLIなど）をスケジューラーでまとめて扱うキー
+ANONYMOUS_USER = "anonymous"
+
+# OCRワーカープロセスの起動中に返す Retry-After（秒）
+OCR_STARTING_RETRY_AFTER = 10
+
 # OCRプロセッサをシングルトンで初期化（起動時に1回のみ）
-# backendディレクトリからの相対パス
 _ocr_processor = None
+# 起動時のプリロードとリクエストが同時に初期化しないようにする
+_ocr_processor_lock = threading.Lock()
 
 
 def get_ocr_processor(supabase=None) -> OCRProcessor:
     """OCRプロセッサを取得（遅延初期化）"""
     global _ocr_processor
     if _ocr_processor is None:
-        # backend/app/ocr/router.py から backend/templates/icons への相対パス
-        templates_path = Path(__file__).parent.parent.parent / "templates" / "icons"
-        _ocr_processor = OCRProcessor(templates_path=str(templates_path), supabase_client=supabase)
-    elif supabase and _ocr_processor.supabase is None:
+        with _ocr_processor_lock:
+            if _ocr_processor is None:
+                from ..main import icon_match_pool
+                _ocr_processor = OCRProcessor(templates_path=str(TEMPLATES_PATH), supabase_client=supabase,
+                                              icon_pool=icon_match_pool)
+    if supabase and _ocr_processor.supabase is None:
         # Supabaseクライアントが設定されていない場合は設定
         _ocr_processor.supabase = supabase
     return _ocr_processor
 
 
+def preload_ocr_processor():
+    """OCRプロセッサを初期化し、yomitokuの読み込みとウォームアップを行う（起動時にバックグラウンドで実行）"""
+    get_ocr_processor().warm_up()
+
+
+def shutdown_ocr_processor():
+    """OCRワーカースレッドを停止"""
+    if _ocr_processor is not None:
+        _ocr_processor.ocr_workers.stop()
+
+
+async def run_ocr(contents: bytes, supabase=None, custom_layout: Optional[List[Dict]] = None,
+                  progress: Optional[Callable[[str], None]] = None, user_id: Optional[str] = None) -> Dict:
+    """画像を解析（OCRの実行方式の違いを吸収する）
+
+    thread: スレッドプールで共有のOCRプロセッサを実行
+    process: 画像をデコードしてワーカープロセスに共有メモリで渡す
+
+    同じ画像・レイアウト（データベースのレイアウトの状態を含む）の結果がキャッシュにあればそれを返す。
+    無ければユーザー間の公平スケジューラーで実行枠を確保してから解析する
+    （ユーザーごとの待ちが上限を超えると SchedulerFullError、
+    OCRワーカープロセスが起動中・起動失敗の場合は OCRPoolUnavailableError）。
+    progress には処理段階（decode / ocr / icons / parse）が通知される
+    （processモードではワーカー内の段階は通知されず、decode と ocr のみ）。
+    """
+    from ..main import ocr_process_pool, ocr_worker_processes
+    loop = asyncio.get_event_loop()
+    # キャッシュの初期化（初回のディレクトリ走査・テンプレートの指紋）・キーのハッシュ・ディスクの読み込みは
+    # イベントループ外で行う。解析で埋まっているOCR用スレッドプールを待たないよう既定のエグゼキューターを使う
+    cache, cache_key, cached, image_key = await loop.run_in_executor(
+        None, _lookup_result_cache, contents, custom_layout, supabase
+    )
+    if cached is not None:
+        logger.info(f"[CACHE] OCR result cache hit ({cache_key[:12]})")
+        return cached
+
+    if ocr_worker_processes is not None:
+        # 起動中（forkの読み込み中など）・起動失敗の間は実行枠を確保せずに OCRPoolUnavailableError
+        ocr_worker_processes.check_ready()
+
+    async with get_scheduler().slot(user_id or ANONYMOUS_USER):
+        if ocr_worker_processes is not None:
+            if progress:
+                progress("decode")
+            img = await loop.run_in_executor(ocr_process_pool, OCRProcessor.decode_image, contents)
+            if progress:
+                progress("ocr")
+            try:
+                result = await asyncio.wrap_future(ocr_worker_processes.submit(img, custom_layout, image_key))
+            except BrokenProcessPool as e:
+                # 解析中にワーカーが異常終了した（プールは再起動中）
+                raise OCRPoolUnavailableError(f"OCR worker process died: {e}", starting=True) from e
+        else:
+            ocr = get_ocr_processor(supabase)
+            result = await loop.run_in_executor(ocr_process_pool, ocr.process_image, contents, custom_layout, progress,
+                                                image_key)
+
+    if cache:
+        await loop.run_in_executor(None, cache.put, cache_key, result)
+    return result
+
+
+def _lookup_result_cache(contents: bytes, custom_layout: Optional[List[Dict]], supabase):
+    """画像のハッシュを求めて解析結果のキャッシュを引く（イベントループ外で呼ぶ）
+
+    画像のハッシュ（raw_block_key）はキャッシュのキーとOCR結果の保存で共通に使い、1回だけ計算する。
+
+    Returns:
+        (キャッシュ, キー, キャッシュの結果, 画像のハッシュ)。キャッシュが無効・使えない場合はキャッシュ・キー・結果がNone、
+        キャッシュもOCR結果の保存も無効の場合は画像のハッシュもNone
+    """
+    cache = get_result_cache(str(TEMPLATES_PATH))
+    image_key = raw_block_key(contents) if cache is not None or get_raw_block_store() is not None else None
+    if cache is None:
+        return None, None, None, image_key
+    layouts = "-"
+    if not custom_layout:
+        # データベースのレイアウトが変わったら同じ画像でも解析し直す（状態が取得できなければキャッシュを使わない）
+        layouts = layout_version(supabase)
+        if layouts is None:
+            return None, None, None, image_key
+    cache_key = cache.key(image_key, custom_layout, layouts)
+    return cache, cache_key, cache.get(cache_key), image_key
+
+
+def _too_many_requests(retry_after: int) -> HTTPException:
+    """解析の待ちが多い場合の 429（Retry-After 秒後に再送）"""
+    return HTTPException(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        detail="解析の待ちが多いため受け付けられません。しばらくしてから再度お試しください",
+    )
+
+
+def _ocr_unavailable(error: OCRPoolUnavailableError) -> HTTPException:
+    """OCRワーカープロセスが使えない場合の 503（起動中は Retry-After 付き）"""
+    if error.starting:
+        return HTTPException(
+            status_code=503,
+            headers={"Retry-After": str(OCR_STARTING_RETRY_AFTER)},
+            detail="解析の準備中です。しばらくしてから再度お試しください",
+        )
+    logger.error(f"[ERROR] OCR unavailable: {error}")
+    return HTTPException(status_code=503, detail="解析を利用できません（OCRワーカーの起動に失敗しました）")
+
+
+def to_analyze_response(result: Dict) -> AnalyzeResponse:
+    """OCRの結果をレスポンスに変換"""
+    survivors = []
+    for s in result.get("survivors", []):
+        survivors.append(SurvivorData(
+            character_name=s.get("character"),
+            position=s.get("position"),
+            kite_time=s.get("kite_time"),
+            decode_progress=s.get("decode_progress"),
+            board_hits=s.get("board_hits") or 0,
+            rescues=s.get("rescues") or 0,
+            heals=s.get("heals") or 0
+        ))
+
+    return AnalyzeResponse(
+        result=result.get("result"),
+        map_name=result.get("map_name"),
+        duration=result.get("duration"),
+        hunter_character=result.get("hunter_character"),
+        played_at=result.get("played_at"),
+        survivors=survivors
+    )
+
+
+async def _read_batch_file(file: UploadFile) -> bytes:
+    """一括解析の1ファイルを読み込み
+
+    ファイルが不正な場合は HTTPException（detail をそのファイルのエラーとして返す）
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="画像ファイルではありません")
+
+    contents = await file.read()
+    if len(contents) > MAX_FILE_SIZE:
+        logger.warning(f"ファイルサイズ超過: {len(contents)} bytes")
+        raise HTTPException(status_code=400, detail="ファイルサイズが大きすぎます（最大10MB）")
+    return contents
+
+
+async def _analyze_batch_contents(contents: bytes, semaphore: asyncio.Semaphore, supabase=None,
+                                  user_id: Optional[str] = None) -> AnalyzeResponse:
+    """一括解析の1画像を解析（同時実行数は semaphore で制限）"""
+    async with semaphore:
+        return to_analyze_response(await run_ocr(contents, supabase, user_id=user_id))
+
+
+async def _cancel_tasks(tasks: List[asyncio.Task]):
+    """未完了の解析を取り消し、スケジューラーの実行枠・待ちが片付くまで待つ"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def parse_custom_layout(layout: str) -> List[Dict]:
+    """JSON文字列のカスタムレイアウトをパース（不正な場合は400）"""
+    try:
+        custom_layout = json.loads(layout)
+        if not isinstance(custom_layout, list) or len(custom_layout) != 5:
+            raise ValueError("レイアウトは5要素の配列である必要があります")
+    except (json.JSONDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"無効なレイアウト形式: {str(e)}")
+    return custom_layout
+
+
+def _batch_semaphore() -> asyncio.Semaphore:
+    from ..config import get_settings
+    return asyncio.Semaphore(max(1, get_settings().ocr_batch_concurrency))
+
+
+# 非同期の解析ジョブ（起動時に start_job_queue で作成）
+_job_queue: Optional[OCRJobQueue] = None
+# SSEで状態が変わらない間に送るキープアライブの間隔（秒）。プロキシのアイドルタイムアウト対策
+JOB_EVENTS_KEEPALIVE = 15
+
+
+def start_job_queue():
+    """解析ジョブのキューを起動（イベントループ上で呼ぶ）"""
+    global _job_queue
+    from ..config import get_settings
+    from ..main import ocr_concurrency
+    settings = get_settings()
+
+    async def run(contents: bytes, user_id: Optional[str], custom_layout: Optional[List[Dict]],
+                  progress: Callable[[str], None]) -> Dict:
+        result = await run_ocr(contents, get_supabase(), custom_layout, progress, user_id=user_id)
+        return to_analyze_response(result).model_dump()
+
+    _job_queue = OCRJobQueue(
+        JobStore(settings.ocr_job_db_path),
+        run,
+        max_queued=settings.ocr_job_queue_size,
+        ttl=settings.ocr_job_ttl_seconds,
+        concurrency=ocr_concurrency.workers,
+    )
+    _job_queue.start()
+
+
+async def stop_job_queue():
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue.store.close()
+
+
+def _job_response(job: Dict) -> Dict:
+    """ジョブの状態（利用者に返す項目）"""
+    return {key: value for key, value in job.items() if key != "user_id"}
+
+
+def _get_user_job(job_id: str, current_user) -> Dict:
+    job = _job_queue.get(job_id) if _job_queue is not None else None
+    if job is None or job["user_id"] != str(current_user.id):
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません（期限切れの可能性があります）")
+    return job
+
+
+def get_result_cache_stats() -> Optional[Dict]:
+    """解析結果キャッシュのヒット率など（無効の場合はNone）"""
+    cache = get_result_cache(str(TEMPLATES_PATH))
+    return cache.stats() if cache else None
+
+
+def get_icon_cache_stats() -> Optional[Dict]:
+    """アイコンの知覚ハッシュキャッシュの統計（無効・未初期化の場合はNone）
+
+    ワーカープロセスの場合はキャッシュがプロセスごとにあるため集計しない（None）。
+    """
+    from ..main import ocr_worker_processes
+    if ocr_worker_processes is not None or _ocr_processor is None or _ocr_processor.icon_cache is None:
+        return None
+    return _ocr_processor.icon_cache.stats()
+
+
+def get_ocr_readiness() -> Dict:
+    """OCRの準備状態（プロセッサ未初期化の場合は未準備）"""
+    from ..main import ocr_worker_processes
+    if ocr_worker_processes is not None:
+        return ocr_worker_processes.readiness()
+    if _ocr_processor is None:
+        return {"ready": False, "model_loaded": False, "model_load_seconds": None, "model_load_timings": None,
+                "warmup_seconds": None, "error": None}
+    return _ocr_processor.readiness()
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_image(
     file: UploadFile = File(...),
@@ -62,36 +331,17 @@ async def analyze_image(
                 detail=f"ファイルサイズが大きすぎます（最大10MB）"
             )
 
-        # OCR処理（重い処理なのでプロセスプールで実行）
-        from ..main import ocr_process_pool
-        loop = asyncio.get_event_loop()
-        ocr = get_ocr_processor(supabase)
-        result = await loop.run_in_executor(ocr_process_pool, ocr.process_image, contents)
-
-        # サバイバーデータを変換
-        survivors = []
-        for s in result.get("survivors", []):
-            survivors.append(SurvivorData(
-                character_name=s.get("character"),
-                position=s.get("position"),
-                kite_time=s.get("kite_time"),
-                decode_progress=s.get("decode_progress"),
-                board_hits=s.get("board_hits") or 0,
-                rescues=s.get("rescues") or 0,
-                heals=s.get("heals") or 0
-            ))
-
-        return AnalyzeResponse(
-            result=result.get("result"),
-            map_name=result.get("map_name"),
-            duration=result.get("duration"),
-            hunter_character=result.get("hunter_character"),
-            played_at=result.get("played_at"),
-            survivors=survivors
-        )
+        # OCR処理（重い処理なのでワーカーで実行）
+        result = await run_ocr(contents, supabase, user_id=str(current_user.id))
+
+        return to_analyze_response(result)
 
     except HTTPException:
         raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e.retry_after)
+    except OCRPoolUnavailableError as e:
+        raise _ocr_unavailable(e)
     except Exception as e:
         logger.error(f"OCR処理エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="画像の解析に失敗しました。別の画像をお試しください")
@@ -105,53 +355,86 @@ async def analyze_multiple_images(
 ):
     """
     複数画像を一括でOCR解析
+
+    - 画像は並列に解析する（1リクエストあたり最大 ocr_batch_concurrency 件）
+    - 解析は他のユーザーの解析と公平に順番を割り当てる（ユーザーごとの同時実行数・速度の上限あり）
+    - 結果はアップロード順。解析できなかった画像は含まれない
+      （ファイルごとのエラーは /analyze-multiple/stream で確認できる）
     """
-    results = []
+    semaphore = _batch_semaphore()
+    user_id = str(current_user.id)
 
-    for file in files:
-        if not file.content_type or not file.content_type.startswith("image/"):
-            continue
+    async def analyze(file: UploadFile) -> AnalyzeResponse:
+        return await _analyze_batch_contents(await _read_batch_file(file), semaphore, supabase, user_id)
 
-        try:
-            contents = await file.read()
+    tasks = [asyncio.create_task(analyze(file)) for file in files]
+    try:
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    except asyncio.CancelledError:
+        # クライアントの切断などでリクエストが取り消された場合、残りの解析も取り消す
+        await _cancel_tasks(tasks)
+        raise
 
-            # ファイルサイズチェック
-            if len(contents) > MAX_FILE_SIZE:
-                logger.warning(f"ファイルサイズ超過: {len(contents)} bytes")
-                continue
+    results = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, BaseException):
+            # エラーがあってもスキップして続行
+            if isinstance(outcome, SchedulerFullError):
+                logger.warning(f"画像解析スキップ（待ちが上限） ({file.filename}): {str(outcome)}")
+            elif not isinstance(outcome, (HTTPException, OCRPoolUnavailableError)):
+                logger.error(f"画像解析エラー ({file.filename}): {str(outcome)}", exc_info=outcome)
+            continue
+        results.append(outcome)
+    return results
 
-            from ..main import ocr_process_pool
-            loop = asyncio.get_event_loop()
-            ocr = get_ocr_processor(supabase)
-            result = await loop.run_in_executor(ocr_process_pool, ocr.process_image, contents)
-
-            survivors = []
-            for s in result.get("survivors", []):
-                survivors.append(SurvivorData(
-                    character_name=s.get("character"),
-                    position=s.get("position"),
-                    kite_time=s.get("kite_time"),
-                    decode_progress=s.get("decode_progress"),
-                    board_hits=s.get("board_hits") or 0,
-                    rescues=s.get("rescues") or 0,
-                    heals=s.get("heals") or 0
-                ))
-
-            results.append(AnalyzeResponse(
-                result=result.get("result"),
-                map_name=result.get("map_name"),
-                duration=result.get("duration"),
-                hunter_character=result.get("hunter_character"),
-                played_at=result.get("played_at"),
-                survivors=survivors
-            ))
 
+@router.post("/analyze-multiple/stream")
+async def analyze_multiple_images_stream(
+    files: List[UploadFile] = File(...),
+    current_user=Depends(get_current_user),
+    supabase=Depends(get_supabase)
+):
+    """
+    複数画像を一括でOCR解析し、解析が終わった画像から順に返す（NDJSON）
+
+    1行に1画像: {"index": アップロード順の番号, "filename": ..., "result": AnalyzeResponse}
+    解析できなかった画像は {"index": ..., "filename": ..., "error": エラー内容}
+    """
+    # アップロードされたファイルはレスポンスを返すと閉じられるため、先に全て読み込む
+    uploads = []
+    for file in files:
+        try:
+            uploads.append((file.filename, await _read_batch_file(file), None))
+        except HTTPException as e:
+            uploads.append((file.filename, None, e.detail))
+    semaphore = _batch_semaphore()
+    user_id = str(current_user.id)
+
+    async def analyze(index: int, filename: str, contents: Optional[bytes], error: Optional[str]) -> Dict:
+        if error is not None:
+            return {"index": index, "filename": filename, "error": error}
+        try:
+            response = await _analyze_batch_contents(contents, semaphore, supabase, user_id)
+            return {"index": index, "filename": filename, "result": response.model_dump()}
+        except SchedulerFullError as e:
+            logger.warning(f"画像解析スキップ（待ちが上限） ({filename}): {str(e)}")
+            return {"index": index, "filename": filename, "error": "解析の待ちが多いため処理できませんでした"}
+        except OCRPoolUnavailableError as e:
+            return {"index": index, "filename": filename, "error": _ocr_unavailable(e).detail}
         except Exception as e:
-            # エラーがあってもスキップして続行
-            logger.error(f"画像解析エラー: {str(e)}", exc_info=True)
-            continue
+            logger.error(f"画像解析エラー ({filename}): {str(e)}", exc_info=True)
+            return {"index": index, "filename": filename, "error": "画像の解析に失敗しました"}
 
-    return results
+    async def stream():
+        tasks = [asyncio.create_task(analyze(index, *upload)) for index, upload in enumerate(uploads)]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield json.dumps(await completed, ensure_ascii=False) + "\n"
+        finally:
+            # クライアントが切断した場合、未完了の解析は取り消す
+            await _cancel_tasks(tasks)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @router.post("/analyze-with-layout", response_model=AnalyzeResponse)
@@ -174,12 +457,7 @@ async def analyze_image_with_layout(
 
     try:
         # レイアウトをパース
-        try:
-            custom_layout = json.loads(layout)
-            if not isinstance(custom_layout, list) or len(custom_layout) != 5:
-                raise ValueError("レイアウトは5要素の配列である必要があります")
-        except (json.JSONDecodeError, ValueError) as e:
-            raise HTTPException(status_code=400, detail=f"無効なレイアウト形式: {str(e)}")
+        custom_layout = parse_custom_layout(layout)
 
         # 画像データを読み込み
         contents = await file.read()
@@ -192,35 +470,142 @@ async def analyze_image_with_layout(
             )
 
         # OCR処理（カスタムレイアウトを渡す）
-        from ..main import ocr_process_pool
-        loop = asyncio.get_event_loop()
-        ocr = get_ocr_processor(supabase)
-        result = await loop.run_in_executor(ocr_process_pool, ocr.process_image, contents, custom_layout)
-
-        # サバイバーデータを変換
-        survivors = []
-        for s in result.get("survivors", []):
-            survivors.append(SurvivorData(
-                character_name=s.get("character"),
-                position=s.get("position"),
-                kite_time=s.get("kite_time"),
-                decode_progress=s.get("decode_progress"),
-                board_hits=s.get("board_hits") or 0,
-                rescues=s.get("rescues") or 0,
-                heals=s.get("heals") or 0
-            ))
-
-        return AnalyzeResponse(
-            result=result.get("result"),
-            map_name=result.get("map_name"),
-            duration=result.get("duration"),
-            hunter_character=result.get("hunter_character"),
-            played_at=result.get("played_at"),
-            survivors=survivors
-        )
+        result = await run_ocr(contents, supabase, custom_layout, user_id=str(current_user.id))
+
+        return to_analyze_response(result)
 
     except HTTPException:
         raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e.retry_after)
+    except OCRPoolUnavailableError as e:
+        raise _ocr_unavailable(e)
     except Exception as e:
         logger.error(f"OCR処理エラー: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="画像の解析に失敗しました。別の画像をお試しください")
+
+
+@router.post("/analyze/jobs", status_code=202)
+async def submit_analyze_job(
+    file: UploadFile = File(...),
+    layout: Optional[str] = Form(None),
+    current_user=Depends(get_current_user)
+):
+    """
+    画像の解析ジョブを投入（結果を待たずにジョブIDを返す）
+
+    - GET /api/matches/analyze/jobs/{job_id} で状態と結果を取得
+    - GET /api/matches/analyze/jobs/{job_id}/events で状態の変化を受け取る（Server-Sent Events）
+    - layout: カスタムレイアウト（オプション、/analyze-with-layout と同じ形式）
+    - キューが満杯の場合は 429（Retry-After 秒後に再送）
+    - OCRワーカープロセスの起動中は 503（Retry-After 秒後に再送）
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="画像ファイルをアップロードしてください")
+    custom_layout = parse_custom_layout(layout) if layout else None
+
+    contents = await file.read()
+    if len(contents) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="ファイルサイズが大きすぎます（最大10MB）")
+    if _job_queue is None:
+        raise HTTPException(status_code=503, detail="解析ジョブを受け付けていません")
+    from ..main import ocr_worker_processes
+    if ocr_worker_processes is not None:
+        try:
+            ocr_worker_processes.check_ready()
+        except OCRPoolUnavailableError as e:
+            raise _ocr_unavailable(e)
+
+    try:
+        job = _job_queue.submit(contents, str(current_user.id), custom_layout)
+    except QueueFullError as e:
+        raise _too_many_requests(e.retry_after)
+    return _job_response(job)
+
+
+@router.get("/analyze/jobs/{job_id}")
+async def get_analyze_job(job_id: str, current_user=Depends(get_current_user)):
+    """
+    解析ジョブの状態を取得
+
+    - status: queued / running / done / failed
+    - stage: 処理中の段階（decode / ocr / icons / parse）
+    - result: 完了時の解析結果（AnalyzeResponse と同じ形式）
+    """
+    return _job_response(_get_user_job(job_id, current_user))
+
+
+@router.get("/analyze/jobs/{job_id}/events")
+async def stream_analyze_job(job_id: str, current_user=Depends(get_current_user)):
+    """
+    解析ジョブの状態の変化を Server-Sent Events で送る（完了・失敗で終了）
+    """
+    _get_user_job(job_id, current_user)
+
+    async def events():
+        last = None
+        while True:
+            job = _job_queue.get(job_id)
+            if job is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            state = _job_response(job)
+            if state != last:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last = state
+            if job["status"] in FINISHED_STATES:
+                return
+            if not await _job_queue.wait_for_change(JOB_EVENTS_KEEPALIVE):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/analyze/queue")
+async def get_analyze_queue(current_user=Depends(get_current_user)):
+    """
+    解析の順番待ちの状況
+
+    - user: 自分の実行中・待ち件数、残りのトークン（すぐに解析できる件数）、待ち時間（平均・p95）
+    - それ以外: 全体の実行枠・実行中・待ち件数と待ち時間
+    """
+    return get_scheduler().stats(str(current_user.id))
+
+
+@router.post("/analyze/reparse", response_model=AnalyzeResponse)
+async def reparse_image(
+    file: UploadFile = File(...),
+    current_user=Depends(get_current_user)
+):
+    """
+    解析済みの画像を、保存済みのOCR結果から現在の抽出処理で再抽出（OCRは実行しない）
+
+    - 以前に解析した画像と同じファイルをアップロード
+    - 保存済みのOCR結果が無い場合は 404（/analyze で解析してください）
+    - 再抽出で勝敗が変わり、保存済みのアイコン候補が使えない場合は 409（/analyze で再解析してください）
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="画像ファイルをアップロードしてください")
+    contents = await file.read()
+    if len(contents) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="ファイルサイズが大きすぎます（最大10MB）")
+
+    store = get_raw_block_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="この画像の解析データがありません")
+
+    def reparse():
+        # 読み込みと再抽出（初回はOCRプロセッサの初期化も）はイベントループ外で行う
+        record = store.load(raw_block_key(contents))
+        return get_ocr_processor().reparse(record) if record is not None else None
+
+    from ..main import ocr_process_pool
+    outcome = await asyncio.get_event_loop().run_in_executor(ocr_process_pool, reparse)
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="この画像の解析データがありません")
+
+    result, icons_stale = outcome
+    if icons_stale:
+        logger.warning("[WARNING] Reparsed result changed the hunter position - icon candidates are stale")
+        raise HTTPException(status_code=409, detail="保存済みのアイコン照合が使えないため、画像を再解析してください")
+    return to_analyze_response(result)
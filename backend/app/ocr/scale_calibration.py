@@ -0,0 +1,96 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from .template_bank import SCALE_GRID_STEP
+
+logger = logging.getLogger(__name__)
+
+# 学習済み係数の更新に使う指数移動平均の重み
+SMOOTHING = 0.3
+# この回数以上観測したら保存候補にする
+PERSIST_AFTER = 5
+# 保存済みの値からこれ以上変化したら再保存する
+PERSIST_DELTA = 0.02
+# 狭い探索帯の幅（期待スケールに対する割合）
+NARROW_BAND = 0.05
+WIDE_BAND = 0.15
+
+
+class ScaleCalibrator:
+    """端末の種類ごとにテンプレートスケールを学習する
+
+    アイコンサイズ（レイアウトの size_ratio から求めたピクセル数）とテンプレート原寸の比が
+    期待スケールになる。実際に最も一致したスケールとの比（補正係数）を端末の種類ごとに学習し、
+    学習後は1スケールのみで探索する。
+    """
+
+    def __init__(self):
+        self._factors: Dict[str, float] = {}
+        self._observations: Dict[str, int] = {}
+        self._persisted: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def device_key(width: int, height: int) -> str:
+        """端末の種類を表すキー（アスペクト比、レイアウト検索の許容範囲に合わせて小数2桁）"""
+        return f"{width / height:.2f}"
+
+    def factor(self, device_key: str) -> Optional[float]:
+        """学習済みの補正係数（未学習ならNone）"""
+        return self._factors.get(device_key)
+
+    def seed(self, device_key: str, factor: float):
+        """保存済みの補正係数（device_layouts.scale_factor）で初期化"""
+        with self._lock:
+            if device_key not in self._factors:
+                self._factors[device_key] = factor
+                self._observations[device_key] = PERSIST_AFTER
+                self._persisted[device_key] = factor
+
+    def observe(self, device_key: str, factor: float):
+        """認識に成功したときの補正係数を反映"""
+        with self._lock:
+            current = self._factors.get(device_key)
+            self._factors[device_key] = factor if current is None else current + SMOOTHING * (factor - current)
+            self._observations[device_key] = self._observations.get(device_key, 0) + 1
+
+    def pending_persist(self, device_key: str) -> Optional[float]:
+        """保存すべき補正係数があれば返す"""
+        factor = self._factors.get(device_key)
+        if factor is None or self._observations.get(device_key, 0) < PERSIST_AFTER:
+            return None
+        persisted = self._persisted.get(device_key)
+        if persisted is not None and abs(persisted - factor) < PERSIST_DELTA:
+            return None
+        return factor
+
+    def mark_persisted(self, device_key: str, factor: float):
+        with self._lock:
+            self._persisted[device_key] = factor
+
+    def bands(self, device_key: str, icon_size: int, reference_size: float,
+              snap: Callable[[float], float] = lambda scale: round(scale, 2),
+              step: float = SCALE_GRID_STEP) -> List[Optional[Tuple[float, ...]]]:
+        """探索するスケールの候補を狭い順に返す（最後のNoneは既定スケールでの全探索）
+
+        各スケールは snap（TemplateBank.snap）で作成済みの格子に丸める。
+        帯の幅が格子の間隔（step）より狭い場合は丸めると同じ値に潰れるため、
+        格子外のスケール（TemplateBankのLRUで作成）のまま探索する。同じ候補の帯は1回だけ返す。
+        """
+        if icon_size <= 0 or reference_size <= 0:
+            return [None]
+
+        expected = icon_size / reference_size
+        factor = self._factors.get(device_key)
+        bands: List[Optional[Tuple[float, ...]]] = []
+        if factor is not None:
+            # 学習済み: 1スケールのみ
+            bands.append((snap(expected * factor),))
+            expected *= factor
+        for width in (NARROW_BAND, WIDE_BAND):
+            to_scale = snap if expected * width >= step else (lambda scale: round(scale, 2))
+            band = tuple(sorted({to_scale(expected * (1 + d)) for d in (-width, 0.0, width)}))
+            if band not in bands:
+                bands.append(band)
+        bands.append(None)
+        return bands
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 待ち時間の統計に使う直近の件数（ユーザーごと）
+WAIT_HISTORY = 200
+# 何もしていないユーザーの状態を消すまでの時間（秒）
+IDLE_USER_SECONDS = 3600
+
+
+class SchedulerFullError(Exception):
+    """ユーザーの待ちが上限に達している（retry_after 秒後の再送を促す）"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many queued OCR requests (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, future: asyncio.Future, tag: float, enqueued_at: float):
+        self.future = future
+        self.tag = tag
+        self.enqueued_at = enqueued_at
+
+
+class _UserState:
+    def __init__(self, weight: float, burst: float):
+        self.weight = weight
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.last_tag = 0.0
+        self.in_flight = 0
+        self.queued: Deque[_Waiter] = deque()
+        self.waits: Deque[float] = deque(maxlen=WAIT_HISTORY)
+        self.served = 0
+        self.active_at = time.monotonic()
+
+
+class FairScheduler:
+    """ユーザー間の重み付き公平キュー（OCRの実行枠を割り当てる）
+
+    - 実行枠（capacity）が空くと、待っているユーザーの先頭のうち仮想終了時刻が最小のものを実行する
+      （到着時に max(仮想時刻, そのユーザーの前回の時刻) + 1/重み を割り当てる）。
+      大量に投入したユーザーの後ろの要求ほど時刻が先になるため、1枚だけのユーザーはすぐに順番が来る。
+    - ユーザーごとの同時実行数の上限（max_in_flight）
+    - ユーザーごとのトークンバケット（毎分 rate 個、最大 burst 個。rate が0なら無制限）。
+      トークンが無い要求は拒否せず、補充されるまで待たせる（一括アップロードは速度を抑えて処理する）
+    - ユーザーごとの待ち件数の上限（max_queued、超えると SchedulerFullError = 429）
+    """
+
+    def __init__(self, capacity: int, max_in_flight: int, rate_per_minute: float, burst: int,
+                 max_queued: int, weights: Optional[Dict[str, float]] = None):
+        self.capacity = max(1, capacity)
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate = max(rate_per_minute, 0.0) / 60.0
+        self.burst = max(1, burst)
+        self.max_queued = max(1, max_queued)
+        self.weights = weights or {}
+        self._users: Dict[str, _UserState] = {}
+        self._running = 0
+        self._virtual_time = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # 平均処理時間（Retry-After の見積もり用）
+        self._average_seconds = 10.0
+
+    def _user(self, user_id: str) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(self.weights.get(user_id, 1.0), self.burst)
+        state.active_at = time.monotonic()
+        return state
+
+    def _refill(self, state: _UserState, now: float):
+        state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+        state.refilled_at = now
+
+    @asynccontextmanager
+    async def slot(self, user_id: str):
+        """実行枠を確保してから処理する"""
+        await self.acquire(user_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * (time.monotonic() - start)
+            self.release(user_id)
+
+    async def acquire(self, user_id: str):
+        state = self._user(user_id)
+        if len(state.queued) >= self.max_queued:
+            raise SchedulerFullError(self.retry_after(user_id))
+
+        state.last_tag = max(self._virtual_time, state.last_tag) + 1.0 / max(state.weight, 1e-6)
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), state.last_tag, time.monotonic())
+        state.queued.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in state.queued:
+                state.queued.remove(waiter)
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 枠を割り当てられた直後に取り消された（割り当てた枠を返す）
+                self.release(user_id)
+            raise
+        state.waits.append(time.monotonic() - waiter.enqueued_at)
+
+    def release(self, user_id: str):
+        state = self._users[user_id]
+        state.in_flight -= 1
+        state.served += 1
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """空いている実行枠を、実行できるユーザーの先頭の要求に割り当てる"""
+        now = time.monotonic()
+        while self._running < self.capacity:
+            best: Optional[_UserState] = None
+            next_token: Optional[float] = None
+            for state in self._users.values():
+                # 取り消された要求（キャンセル処理がまだ走っていないもの）は割り当てずに捨てる
+                while state.queued and state.queued[0].future.done():
+                    state.queued.popleft()
+                if not state.queued or state.in_flight >= self.max_in_flight:
+                    continue
+                if self.rate > 0:
+                    self._refill(state, now)
+                    if state.tokens < 1.0:
+                        wait = (1.0 - state.tokens) / self.rate
+                        next_token = wait if next_token is None else min(next_token, wait)
+                        continue
+                if best is None or state.queued[0].tag < best.queued[0].tag:
+                    best = state
+
+            if best is None:
+                if next_token is not None and self._timer is None:
+                    # トークンの補充を待っている要求がある
+                    self._timer = asyncio.get_running_loop().call_later(next_token, self._on_timer)
+                break
+
+            waiter = best.queued.popleft()
+            if self.rate > 0:
+                best.tokens -= 1.0
+            best.in_flight += 1
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, waiter.tag - 1.0 / max(best.weight, 1e-6))
+            waiter.future.set_result(None)
+
+        self._forget_idle_users(now)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _forget_idle_users(self, now: float):
+        idle = [user_id for user_id, state in self._users.items()
+                if not state.queued and state.in_flight == 0 and now - state.active_at > IDLE_USER_SECONDS]
+        for user_id in idle:
+            del self._users[user_id]
+
+    def retry_after(self, user_id: str) -> int:
+        """そのユーザーの待ちが掃けるまでの目安（秒）"""
+        state = self._users.get(user_id)
+        queued = len(state.queued) if state else 0
+        per_request = self._average_seconds / min(self.capacity, self.max_in_flight)
+        if self.rate > 0:
+            per_request = max(per_request, 1.0 / self.rate)
+        return max(1, int(queued * per_request))
+
+    @staticmethod
+    def _wait_stats(waits: List[float]) -> Dict:
+        if not waits:
+            return {"count": 0, "mean_seconds": None, "p95_seconds": None, "max_seconds": None}
+        values = np.asarray(waits)
+        return {
+            "count": len(values),
+            "mean_seconds": round(float(values.mean()), 3),
+            "p95_seconds": round(float(np.percentile(values, 95)), 3),
+            "max_seconds": round(float(values.max()), 3),
+        }
+
+    def stats(self, user_id: Optional[str] = None) -> Dict:
+        """待ち時間などの統計（user_id を指定するとそのユーザー分も含める）"""
+        all_waits = [wait for state in self._users.values() for wait in state.waits]
+        result = {
+            "capacity": self.capacity,
+            "running": self._running,
+            "queued": sum(len(state.queued) for state in self._users.values()),
+            "active_users": sum(1 for state in self._users.values() if state.queued or state.in_flight),
+            "queue_wait": self._wait_stats(all_waits),
+        }
+        if user_id is not None:
+            state = self._users.get(user_id)
+            if state is not None and self.rate > 0:
+                self._refill(state, time.monotonic())
+            result["user"] = {
+                "weight": state.weight if state else self.weights.get(user_id, 1.0),
+                "in_flight": state.in_flight if state else 0,
+                "queued": len(state.queued) if state else 0,
+                "tokens": round(state.tokens, 2) if state else float(self.burst),
+                "served": state.served if state else 0,
+                "queue_wait": self._wait_stats(list(state.waits) if state else []),
+            }
+        return result
+
+
+@lru_cache()
+def get_scheduler() -> FairScheduler:
+    """OCRの実行枠のスケジューラー（実行枠はOCRワーカーの総数）"""
+    from ..config import get_settings
+    from .concurrency import get_concurrency_plan
+
+    settings = get_settings()
+    scheduler = FairScheduler(
+        capacity=get_concurrency_plan().workers,
+        max_in_flight=settings.ocr_user_max_in_flight,
+        rate_per_minute=settings.ocr_user_rate_per_minute,
+        burst=settings.ocr_user_burst,
+        max_queued=settings.ocr_user_max_queued,
+        weights=settings.ocr_user_weights,
+    )
+    logger.info(f"[INFO] OCR fair scheduler: {scheduler.capacity} slots, {scheduler.max_in_flight} in flight per user, "
+                f"{settings.ocr_user_rate_per_minute}/min (burst {scheduler.burst}) per user")
+    return scheduler
@@ -0,0 +1,221 @@
+"""
+アイコンテンプレートのコンパイル済みアーティファクト
+
+templates/icons 以下のPNGを事前にデコード・リサイズ・正規化し、1つのバイナリファイルにまとめる。
+OCRProcessorは起動時にこのファイルを np.memmap で読み込むため、
+PNGのデコードが不要になり、複数ワーカー間でページキャッシュを共有できる。
+
+ファイル形式:
+    [マジック 4バイト][バージョン uint32][ヘッダー長 uint64][ヘッダーJSON][パディング][配列データ...]
+    各配列は64バイト境界に配置し、オフセット・形状・型はヘッダーJSONに記録する。
+
+使い方（backendディレクトリで実行）:
+    python -m app.ocr.template_artifact [templates/icons] [templates/icons.bank]
+"""
+import hashlib
+import json
+import logging
+import struct
+import sys
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .template_bank import TemplateBank, ICON_MATCH_SCALES, STRIP_TEMPLATE_SIZE
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_MAGIC = b"IVTB"
+ARTIFACT_VERSION = 1
+ARTIFACT_SUFFIX = ".bank"
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct("<4sIQ")
+
+
+def default_artifact_path(templates_path) -> Path:
+    """テンプレートディレクトリに対応するアーティファクトのパス（templates/icons -> templates/icons.bank）"""
+    return Path(templates_path).with_suffix(ARTIFACT_SUFFIX)
+
+
+def icon_template_files(base_dir: Path) -> List[Tuple[str, str, Path]]:
+    """テンプレートPNGを読み込み順に列挙
+
+    survivors/ → hunters/ → 直下（旧形式、サバイバーとして扱う）の順。
+    同じキャラ名は最初に見つかったものを優先する。
+
+    Returns:
+        [(キャラ名, タイプ, ファイルパス), ...]
+    """
+    files = []
+    seen = {"survivor": set(), "hunter": set()}
+
+    for char_type, sub_dir in (("survivor", "survivors"), ("hunter", "hunters")):
+        directory = base_dir / sub_dir
+        if not directory.exists():
+            continue
+        for pattern in ["*.png", "*.PNG"]:
+            for icon_file in sorted(directory.glob(pattern)):
+                if icon_file.stem in seen[char_type]:
+                    continue
+                seen[char_type].add(icon_file.stem)
+                files.append((icon_file.stem, char_type, icon_file))
+
+    # 旧形式の互換性: templates/icons直下にある場合はサバイバーとして扱う
+    if base_dir.exists():
+        for pattern in ["*.png", "*.PNG"]:
+            for icon_file in sorted(base_dir.glob(pattern)):
+                char_name = icon_file.stem
+                if char_name in seen["survivor"] or char_name in seen["hunter"]:
+                    continue
+                seen["survivor"].add(char_name)
+                files.append((char_name, "survivor", icon_file))
+
+    return files
+
+
+def file_checksum(path: Path) -> str:
+    """ファイル内容のSHA-256"""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def compile_template_artifact(templates_path, output_path=None) -> Path:
+    """テンプレートディレクトリをアーティファクトにコンパイル"""
+    base_dir = Path(templates_path)
+    output_path = Path(output_path) if output_path else default_artifact_path(base_dir)
+
+    survivor_templates: Dict[str, np.ndarray] = {}
+    hunter_templates: Dict[str, np.ndarray] = {}
+    checksums: Dict[Tuple[str, str], str] = {}
+    for char_name, char_type, icon_file in icon_template_files(base_dir):
+        image_data = icon_file.read_bytes()
+        template = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if template is None:
+            logger.warning(f"[WARNING] Failed to load {char_type} {char_name}")
+            continue
+        target = survivor_templates if char_type == "survivor" else hunter_templates
+        target[char_name] = template
+        checksums[(char_type, char_name)] = hashlib.sha256(image_data).hexdigest()
+
+    bank = TemplateBank.build(survivor_templates, hunter_templates)
+
+    # 書き出す配列を列挙
+    arrays: List[Tuple[str, np.ndarray]] = []
+    for idx, original in enumerate(bank.originals):
+        arrays.append((f"original/{idx}", np.ascontiguousarray(original)))
+    stacks_meta = []
+    for k, (char_type, scale_idx, indices, stack) in enumerate(bank.stacks):
+        arrays.append((f"stack/{k}", np.ascontiguousarray(stack, dtype=np.float32)))
+        stacks_meta.append({"type": char_type, "scale_index": scale_idx, "indices": [int(i) for i in indices]})
+    if bank.strip_stack is not None:
+        arrays.append(("strip", np.ascontiguousarray(bank.strip_stack, dtype=np.float32)))
+
+    header = {
+        "version": ARTIFACT_VERSION,
+        "scales": list(bank.scales),
+        "strip_size": STRIP_TEMPLATE_SIZE,
+        "templates": [
+            {"name": name, "type": char_type, "checksum": checksums[(char_type, name)]}
+            for name, char_type in zip(bank.names, bank.types)
+        ],
+        "stacks": stacks_meta,
+        "arrays": [],
+    }
+
+    # データ部のオフセットを計算（データ部先頭からの相対位置）
+    offset = 0
+    for key, array in arrays:
+        offset = (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        header["arrays"].append({"key": key, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = (_PREFIX.size + len(header_bytes) + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for entry, (_, array) in zip(header["arrays"], arrays):
+            f.seek(data_start + entry["offset"])
+            f.write(array.tobytes())
+    tmp_path.replace(output_path)
+
+    logger.info(f"[SUCCESS] Compiled {len(bank)} templates into {output_path} ({output_path.stat().st_size} bytes)")
+    return output_path
+
+
+def _read_header(artifact_path: Path) -> Optional[Tuple[dict, int]]:
+    with open(artifact_path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) != _PREFIX.size:
+            return None
+        magic, version, header_len = _PREFIX.unpack(prefix)
+        if magic != ARTIFACT_MAGIC or version != ARTIFACT_VERSION:
+            return None
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = (_PREFIX.size + header_len + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    return header, data_start
+
+
+def load_template_artifact(artifact_path, templates_path=None, verify: bool = True) -> Optional[TemplateBank]:
+    """アーティファクトをメモリマップで読み込み、TemplateBankを復元
+
+    テンプレートディレクトリが存在し verify=True の場合は、PNGのチェックサムと
+    アーティファクトの索引が一致するときだけ使用する（一致しなければNone）。
+    """
+    artifact_path = Path(artifact_path)
+    if not artifact_path.exists():
+        return None
+
+    try:
+        parsed = _read_header(artifact_path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[WARNING] Failed to read template artifact {artifact_path}: {e}")
+        return None
+    if parsed is None:
+        logger.warning(f"[WARNING] Template artifact {artifact_path} has an unsupported version - rebuild required")
+        return None
+    header, data_start = parsed
+
+    if tuple(header["scales"]) != tuple(ICON_MATCH_SCALES) or header["strip_size"] != STRIP_TEMPLATE_SIZE:
+        logger.warning(f"[WARNING] Template artifact {artifact_path} was built with different settings - rebuild required")
+        return None
+
+    # PNGとの整合性チェック（デコードはせず、内容のハッシュのみ比較）
+    if verify and templates_path is not None and Path(templates_path).exists():
+        current = {(char_type, name): path for name, char_type, path in icon_template_files(Path(templates_path))}
+        indexed = {(t["type"], t["name"]): t["checksum"] for t in header["templates"]}
+        if set(current) != set(indexed) or any(file_checksum(path) != indexed[key] for key, path in current.items()):
+            logger.warning(f"[WARNING] Template artifact {artifact_path} is stale - falling back to PNG templates")
+            return None
+
+    # ファイル全体を読み取り専用でマップし、各配列はそのビューとして参照する
+    mapped = np.memmap(artifact_path, dtype=np.uint8, mode="r")
+    views = {}
+    for entry in header["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"])) if entry["shape"] else 1
+        start = data_start + entry["offset"]
+        raw = mapped[start:start + count * dtype.itemsize]
+        views[entry["key"]] = np.ndarray(shape=tuple(entry["shape"]), dtype=dtype, buffer=raw)
+
+    names = [t["name"] for t in header["templates"]]
+    types = [t["type"] for t in header["templates"]]
+    originals = [views[f"original/{idx}"] for idx in range(len(names))]
+    stacks = [
+        (meta["type"], meta["scale_index"], np.asarray(meta["indices"], dtype=np.intp), views[f"stack/{k}"])
+        for k, meta in enumerate(header["stacks"])
+    ]
+
+    bank = TemplateBank.from_arrays(tuple(header["scales"]), names, types, originals, stacks, views.get("strip"))
+    logger.info(f"[SUCCESS] Memory-mapped {len(bank)} templates from {artifact_path}")
+    return bank
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    source = sys.argv[1] if len(sys.argv) > 1 else "templates/icons"
+    target = sys.argv[2] if len(sys.argv) > 2 else None
+    compile_template_artifact(source, target)
@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# アイコンマッチングで使用するスケール（テンプレート原寸に対する倍率）
+ICON_MATCH_SCALES = (0.5, 0.7, 0.9, 1.0, 1.1, 1.3, 1.5)
+
+# 端末ごとの学習済みスケールを丸める格子の間隔（既定スケールの範囲、起動時に全て作成する）
+SCALE_GRID_STEP = 0.05
+
+# 格子以外の任意スケールのテンプレート行列をキャッシュする最大スケール数（LRU）
+MAX_EXTRA_SCALES = 16
+
+# 帯状領域探索で使うテンプレートサイズ（ピクセル）。帯状領域側をこのサイズに合わせて縮小する
+STRIP_TEMPLATE_SIZE = 48
+
+# リサイズ後のテンプレートとして許容するサイズ範囲（ピクセル）
+MIN_TEMPLATE_SIZE = 30
+MAX_TEMPLATE_SIZE = 150
+
+
+def normalize_template(template: np.ndarray) -> np.ndarray:
+    """テンプレートをゼロ平均・単位ノルムに正規化（float32）
+
+    チャンネルごとに平均を引き、全チャンネル共通のノルムで割る。
+    TM_CCOEFF_NORMEDは平均除去とノルム正規化を内部で行うため、
+    この変換を施してもマッチングスコアは変わらない。
+    """
+    data = template.astype(np.float32)
+    data -= data.reshape(-1, data.shape[-1]).mean(axis=0) if data.ndim == 3 else data.mean()
+    norm = float(np.sqrt((data * data).sum()))
+    if norm > 0:
+        data /= norm
+    return data
+
+
+def coarse_vector(image: np.ndarray, resolution: int) -> np.ndarray:
+    """画像をグレースケール・縮小し、正規化した1次元ベクトルに変換"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (resolution, resolution), interpolation=cv2.INTER_AREA)
+    return normalize_template(small).ravel()
+
+
+def scale_grid(scales: Tuple[float, ...], step: float = SCALE_GRID_STEP) -> Tuple[float, ...]:
+    """既定スケールの範囲を step 間隔で区切った格子（既定スケールも含める）"""
+    if not scales:
+        return ()
+    low, high = min(scales), max(scales)
+    count = int(round((high - low) / step))
+    return tuple(sorted({round(low + i * step, 2) for i in range(count + 1)} | set(scales)))
+
+
+class TemplateBank:
+    """全スケールのリサイズ・正規化済みテンプレートを保持するバンク
+
+    起動時（_load_icon_templates）に1回だけ構築し、
+    リクエスト時にはテンプレートの準備処理を一切行わない。
+    """
+
+    def __init__(self, scales: Tuple[float, ...] = ICON_MATCH_SCALES):
+        self.scales = tuple(scales)
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.originals: List[np.ndarray] = []
+        # テンプレートごとの [(スケール, 正規化済みテンプレート), ...]
+        self.scaled: List[List[Tuple[float, np.ndarray]]] = []
+        # 同一タイプ・同一スケール・同一サイズのテンプレートを積み重ねた行列
+        # [(タイプ, スケール番号, バンク内インデックス配列, (n, h, w, c)の配列), ...]
+        self.stacks: List[Tuple[str, int, np.ndarray, np.ndarray]] = []
+        self._index: Dict[str, int] = {}
+        # 帯状領域探索用の固定サイズテンプレート（テンプレートごと、STRIP_TEMPLATE_SIZE四方）
+        self.strip_templates: List[np.ndarray] = []
+        self.strip_stack: Optional[np.ndarray] = None
+        # スケールの格子（既定スケールを含む）と、既定以外の格子スケールのテンプレート行列
+        # （スケール -> [(タイプ, インデックス配列, 行列), ...]、prepare_grid で作成）
+        self.grid = scale_grid(self.scales)
+        self._grid_stacks: Dict[float, List[Tuple[str, np.ndarray, np.ndarray]]] = {}
+        # 格子以外のスケールのテンプレート行列（最後に使われたのが古いものから削除）
+        self._extra_stacks: "OrderedDict[float, List[Tuple[str, np.ndarray, np.ndarray]]]" = OrderedDict()
+        self._extra_lock = threading.Lock()
+        # 縮小グレースケールベクトル（解像度 -> (テンプレート数, 解像度^2)の配列）
+        self._coarse: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def build(cls, survivor_templates: Dict[str, np.ndarray], hunter_templates: Dict[str, np.ndarray],
+              scales: Tuple[float, ...] = ICON_MATCH_SCALES) -> "TemplateBank":
+        """サバイバー・ハンターのテンプレート辞書からバンクを構築"""
+        bank = cls(scales)
+        for char_name, original in survivor_templates.items():
+            bank.add(char_name, "survivor", original)
+        for char_name, original in hunter_templates.items():
+            bank.add(char_name, "hunter", original)
+        bank.finalize()
+        logger.info(f"[SUCCESS] Template bank built: {len(bank)} templates x {len(bank.scales)} scales")
+        return bank
+
+    def add(self, char_name: str, char_type: str, original: np.ndarray):
+        """テンプレートを全スケールでリサイズ・正規化して登録"""
+        orig_h, orig_w = original.shape[:2]
+        scaled = []
+        for scale in self.scales:
+            new_size = (int(orig_w * scale), int(orig_h * scale))
+            # サイズが適切な範囲かチェック
+            if not (MIN_TEMPLATE_SIZE <= new_size[0] <= MAX_TEMPLATE_SIZE and
+                    MIN_TEMPLATE_SIZE <= new_size[1] <= MAX_TEMPLATE_SIZE):
+                continue
+            try:
+                resized = cv2.resize(original, new_size)
+            except cv2.error:
+                continue
+            scaled.append((scale, normalize_template(resized)))
+
+        self._index[char_name] = len(self.names)
+        self.names.append(char_name)
+        self.types.append(char_type)
+        self.originals.append(original)
+        self.scaled.append(scaled)
+        self.strip_templates.append(normalize_template(
+            cv2.resize(original, (STRIP_TEMPLATE_SIZE, STRIP_TEMPLATE_SIZE), interpolation=cv2.INTER_AREA)
+        ))
+
+    def finalize(self):
+        """同一サイズのテンプレートを行列に積み重ねる（バッチマッチング用）
+
+        各テンプレートのスケール別配列は積み重ねた行列のビューに置き換えるため、
+        メモリ使用量は増えない。
+        """
+        groups: Dict[Tuple, List[int]] = {}
+        for idx, (char_type, scaled) in enumerate(zip(self.types, self.scaled)):
+            for scale, template in scaled:
+                key = (char_type, self.scales.index(scale), template.shape)
+                groups.setdefault(key, []).append(idx)
+
+        self.stacks = []
+        for (char_type, scale_idx, _), indices in groups.items():
+            scale = self.scales[scale_idx]
+            stack = np.stack([dict(self.scaled[i])[scale] for i in indices])
+            for row, i in enumerate(indices):
+                self.scaled[i] = [(s, stack[row] if s == scale else t) for s, t in self.scaled[i]]
+            self.stacks.append((char_type, scale_idx, np.asarray(indices, dtype=np.intp), stack))
+
+        if self.strip_templates:
+            self.strip_stack = np.stack(self.strip_templates)
+            self.strip_templates = list(self.strip_stack)
+
+    @classmethod
+    def from_arrays(cls, scales: Tuple[float, ...], names: List[str], types: List[str],
+                    originals: List[np.ndarray], stacks: List[Tuple[str, int, np.ndarray, np.ndarray]],
+                    strip_stack: Optional[np.ndarray]) -> "TemplateBank":
+        """構築済みの配列（コンパイル済みアーティファクトのビューなど）からバンクを復元
+
+        配列はコピーせずにそのまま参照する。
+        """
+        bank = cls(scales)
+        bank.names = list(names)
+        bank.types = list(types)
+        bank.originals = list(originals)
+        bank._index = {name: idx for idx, name in enumerate(bank.names)}
+        bank.stacks = list(stacks)
+
+        scaled: List[Dict[int, np.ndarray]] = [{} for _ in bank.names]
+        for _, scale_idx, indices, stack in bank.stacks:
+            for row, idx in enumerate(indices):
+                scaled[idx][scale_idx] = stack[row]
+        bank.scaled = [[(bank.scales[k], per_scale[k]) for k in sorted(per_scale)] for per_scale in scaled]
+
+        if strip_stack is not None:
+            bank.strip_stack = strip_stack
+            bank.strip_templates = list(strip_stack)
+        return bank
+
+    @property
+    def reference_size(self) -> float:
+        """テンプレート原寸の代表値（幅の中央値）"""
+        if not self.originals:
+            return 0.0
+        return float(np.median([original.shape[1] for original in self.originals]))
+
+    def snap(self, scale: float) -> float:
+        """スケールを最も近い格子の値に丸める（格子の範囲外は端の値）"""
+        return min(self.grid, key=lambda s: abs(s - scale)) if self.grid else scale
+
+    def prepare_grid(self):
+        """格子上の既定以外のスケールのテンプレート行列を作成（起動時に1回）
+
+        学習済みスケールは snap で格子に丸めるため、リクエスト時にはテンプレートを作成しない
+        （格子の間隔より狭い探索帯のスケールのみ、リクエスト時に作成してLRUで保持する）。
+        """
+        start = time.perf_counter()
+        for scale in self.grid:
+            if scale not in self.scales and scale not in self._grid_stacks:
+                self._grid_stacks[scale] = self._build_stacks_at(scale)
+        size = sum(stack.nbytes for extra in self._grid_stacks.values() for _, _, stack in extra)
+        logger.info(f"[SUCCESS] Template scale grid prepared: {len(self._grid_stacks)} extra scales "
+                    f"(step {SCALE_GRID_STEP}, {size / 1e6:.1f} MB, {time.perf_counter() - start:.2f}s)")
+
+    def stacks_for(self, scales: Tuple[float, ...]) -> List[Tuple[str, int, np.ndarray, np.ndarray]]:
+        """指定スケールのテンプレート行列を取得
+
+        既定スケール・格子のスケールは作成済みの行列をそのまま使い、それ以外のスケールは
+        初回のみオリジナル画像から作成して MAX_EXTRA_SCALES 個までLRUでキャッシュする。
+
+        Returns:
+            [(タイプ, 指定スケール内の番号, バンク内インデックス配列, 行列), ...]
+        """
+        if tuple(scales) == self.scales:
+            return self.stacks
+
+        result = []
+        for col, scale in enumerate(scales):
+            if scale in self.scales:
+                scale_idx = self.scales.index(scale)
+                result.extend((t, col, indices, stack) for t, k, indices, stack in self.stacks if k == scale_idx)
+                continue
+            extra = self._grid_stacks.get(scale)
+            if extra is None:
+                extra = self._extra_stacks_at(scale)
+            result.extend((t, col, indices, stack) for t, indices, stack in extra)
+        return result
+
+    def _extra_stacks_at(self, scale: float) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+        """格子以外のスケールのテンプレート行列（LRUキャッシュ）"""
+        with self._extra_lock:
+            extra = self._extra_stacks.get(scale)
+            if extra is not None:
+                self._extra_stacks.move_to_end(scale)
+                return extra
+
+        extra = self._build_stacks_at(scale)
+        with self._extra_lock:
+            self._extra_stacks[scale] = extra
+            while len(self._extra_stacks) > MAX_EXTRA_SCALES:
+                self._extra_stacks.popitem(last=False)
+        return extra
+
+    def _build_stacks_at(self, scale: float) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+        """オリジナル画像から指定スケールの正規化済みテンプレート行列を作成"""
+        groups: Dict[Tuple, List[Tuple[int, np.ndarray]]] = {}
+        for idx, (char_type, original) in enumerate(zip(self.types, self.originals)):
+            orig_h, orig_w = original.shape[:2]
+            new_size = (int(orig_w * scale), int(orig_h * scale))
+            if not (MIN_TEMPLATE_SIZE <= new_size[0] <= MAX_TEMPLATE_SIZE and
+                    MIN_TEMPLATE_SIZE <= new_size[1] <= MAX_TEMPLATE_SIZE):
+                continue
+            template = normalize_template(cv2.resize(np.asarray(original), new_size))
+            groups.setdefault((char_type, template.shape), []).append((idx, template))
+
+        return [
+            (char_type, np.asarray([idx for idx, _ in members], dtype=np.intp), np.stack([t for _, t in members]))
+            for (char_type, _), members in groups.items()
+        ]
+
+    def coarse_vectors(self, resolution: int) -> np.ndarray:
+        """全テンプレートの縮小グレースケール正規化ベクトルを取得（解像度ごとにキャッシュ）"""
+        vectors = self._coarse.get(resolution)
+        if vectors is None:
+            vectors = np.zeros((len(self.originals), resolution * resolution), dtype=np.float32)
+            for idx, original in enumerate(self.originals):
+                vectors[idx] = coarse_vector(original, resolution)
+            self._coarse[resolution] = vectors
+        return vectors
+
+    def index_of(self, char_name: str) -> Optional[int]:
+        """キャラクターのバンク内インデックス（未登録ならNone）"""
+        return self._index.get(char_name)
+
+    def get(self, char_name: str) -> Optional[List[Tuple[float, np.ndarray]]]:
+        """キャラクターのスケール別テンプレートを取得"""
+        idx = self._index.get(char_name)
+        if idx is None:
+            return None
+        return self.scaled[idx]
+
+    def entries(self, char_type: Optional[str] = None):
+        """(キャラ名, タイプ, スケール別テンプレート) を登録順に列挙"""
+        for char_name, t, scaled in zip(self.names, self.types, self.scaled):
+            if char_type is None or t == char_type:
+                yield char_name, t, scaled
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class OCRWorker(threading.Thread):
+    """1つのイベントループと1つのyomitokuインスタンスを所有するOCRスレッド
+
+    ジョブはプールの共有キューから受け取る。イベントループとアナライザーは
+    スレッドの生存期間中ずっと使い回し、リクエスト毎に作り直さない。
+    """
+
+    def __init__(self, jobs: "queue.Queue", analyzer_factory: Callable[[], Any], name: str,
+                 warmup_image: Optional[np.ndarray] = None):
+        super().__init__(name=name, daemon=True)
+        self._jobs = jobs
+        self._analyzer_factory = analyzer_factory
+        self._warmup_image = warmup_image
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.analyzer = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        # 起動時の読み込み（とウォームアップ）が終わったら（失敗を含めて）セットされる
+        self.started_event = threading.Event()
+
+    def ensure_analyzer(self):
+        if self.analyzer is None:
+            start = time.perf_counter()
+            self.analyzer = self._analyzer_factory()
+            self.load_seconds = time.perf_counter() - start
+        return self.analyzer
+
+    def analyze(self, img: np.ndarray):
+        """このスレッドのイベントループ上でyomitokuを実行（DocumentAnalyzer.__call__ と同じ結果）"""
+        analyzer = self.ensure_analyzer()
+        run = getattr(analyzer, "run", None)
+        if run is not None and asyncio.iscoroutinefunction(run):
+            # __call__ は呼び出し毎に asyncio.run で新しいループを作るため、所有するループで直接実行する
+            analyzer.img = img
+            return self.loop.run_until_complete(run(img))
+        return analyzer(img)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            if self._warmup_image is not None:
+                try:
+                    self.ensure_analyzer()
+                    start = time.perf_counter()
+                    self.analyze(self._warmup_image)
+                    self.warmup_seconds = time.perf_counter() - start
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error(f"[ERROR] {self.name}: warm-up failed: {e}")
+            self.started_event.set()
+
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(self))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            self.started_event.set()
+            self.loop.close()
+
+
+class OCRWorkerPool:
+    """OCRWorkerのプール（共有ジョブキュー）
+
+    スレッドは最初のジョブ投入時（または start の呼び出し時）に起動する。
+    """
+
+    def __init__(self, analyzer_factory: Callable[[], Any], size: int = 1):
+        self._analyzer_factory = analyzer_factory
+        self.size = max(1, size)
+        self._jobs: "queue.Queue" = queue.Queue()
+        self.workers: List[OCRWorker] = []
+        self._lock = threading.Lock()
+
+    def start(self, warmup_image: Optional[np.ndarray] = None) -> List[OCRWorker]:
+        """ワーカーを起動（warmup_imageを指定すると各ワーカーで読み込みとウォームアップを実行）"""
+        with self._lock:
+            if not self.workers:
+                self.workers = [
+                    OCRWorker(self._jobs, self._analyzer_factory, f"ocr-worker-{i}", warmup_image)
+                    for i in range(self.size)
+                ]
+                for worker in self.workers:
+                    worker.start()
+                logger.info(f"[INFO] Started {self.size} OCR worker thread(s)")
+            return self.workers
+
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """全ワーカーの起動処理（読み込み・ウォームアップ）の完了を待つ"""
+        return all(worker.started_event.wait(timeout) for worker in self.start())
+
+    def call(self, fn: Callable[[OCRWorker], Any], timeout: Optional[float] = None) -> Any:
+        """空いているワーカーで fn(worker) を実行して結果を返す"""
+        self.start()
+        future: Future = Future()
+        self._jobs.put((fn, future))
+        return future.result(timeout)
+
+    def analyze(self, img: np.ndarray, timeout: Optional[float] = None):
+        return self.call(lambda worker: worker.analyze(img), timeout)
+
+    def stop(self):
+        with self._lock:
+            for _ in self.workers:
+                self._jobs.put(None)
+            for worker in self.workers:
+                worker.join(timeout=5)
+            self.workers = []
+
+    @property
+    def loaded(self) -> bool:
+        return any(worker.analyzer is not None for worker in self.workers)
+
+    @property
+    def load_seconds(self) -> Optional[float]:
+        times = [w.load_seconds for w in self.workers if w.load_seconds is not None]
+        return max(times) if times else None
+
+    @property
+    def load_timings(self) -> Optional[dict]:
+        """読み込み済みのアナライザーの構築・重みの読み込み時間（create_yomitoku_analyzer が記録）"""
+        for worker in self.workers:
+            timings = getattr(worker.analyzer, "load_timings", None)
+            if timings is not None:
+                return timings
+        return None
@@ -0,0 +1,3 @@
+-- OCRが学習したテンプレートスケールの補正係数を保存するカラムを追加
+-- アイコンサイズ（size_ratio）から求めたスケールに対する倍率（1.0 = 補正なし）
+ALTER TABLE device_layouts ADD COLUMN IF NOT EXISTS scale_factor REAL;
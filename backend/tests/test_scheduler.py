@@ -0,0 +1,92 @@
+import asyncio
+
+from app.ocr.scheduler import FairScheduler
+
+
+def _scheduler(capacity: int = 1) -> FairScheduler:
+    return FairScheduler(capacity=capacity, max_in_flight=2, rate_per_minute=0, burst=10, max_queued=64)
+
+
+async def _hold(scheduler: FairScheduler, user_id: str, seconds: float = 10.0):
+    async with scheduler.slot(user_id):
+        await asyncio.sleep(seconds)
+
+
+async def _quick(scheduler: FairScheduler, user_id: str) -> str:
+    async with scheduler.slot(user_id):
+        return "ok"
+
+
+def test_cancel_running_and_queued_waiters_frees_slot():
+    async def main():
+        scheduler = _scheduler()
+        tasks = [asyncio.create_task(_hold(scheduler, "u1")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(o, asyncio.CancelledError) for o in outcomes)
+        assert scheduler.stats()["running"] == 0
+        assert scheduler.stats()["queued"] == 0
+        assert await asyncio.wait_for(_quick(scheduler, "u2"), 1) == "ok"
+
+    asyncio.run(main())
+
+
+def test_cancel_waiter_granted_before_it_resumes_releases_slot():
+    async def main():
+        scheduler = _scheduler()
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("u1"):
+                await release.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(_hold(scheduler, "u1"))
+        await asyncio.sleep(0.01)
+        # 1件目の終了で2件目に枠が割り当てられ、再開する前に取り消される
+        release.set()
+        await first
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert scheduler.stats()["running"] == 0
+        assert await asyncio.wait_for(_quick(scheduler, "u2"), 1) == "ok"
+
+    asyncio.run(main())
+
+
+
+def test_disconnected_batch_does_not_block_other_users():
+    async def main():
+        scheduler = _scheduler(capacity=2)
+        batch = asyncio.ensure_future(asyncio.gather(*(_hold(scheduler, "u1") for _ in range(8)),
+                                                   return_exceptions=True))
+        await asyncio.sleep(0.01)
+        # クライアントの切断でリクエスト全体が取り消された場合
+        batch.cancel()
+        await asyncio.gather(batch, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert scheduler.stats()["running"] == 0
+        assert await asyncio.wait_for(_quick(scheduler, "u2"), 1) == "ok"
+
+    asyncio.run(main())
+
+
+def test_stream_disconnect_cancels_remaining_waiters():
+    async def main():
+        scheduler = _scheduler(capacity=2)
+        tasks = [asyncio.create_task(_hold(scheduler, "u1", 0.01 if i == 0 else 10.0)) for i in range(6)]
+        # /analyze-multiple/stream と同じく、最初の完了後に切断され残りを取り消す
+        for completed in asyncio.as_completed(tasks):
+            await completed
+            break
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stats = scheduler.stats()
+        assert (stats["running"], stats["queued"]) == (0, 0)
+        assert await asyncio.wait_for(_quick(scheduler, "u2"), 1) == "ok"
+
+    asyncio.run(main())